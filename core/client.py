@@ -0,0 +1,153 @@
+"""
+HTTP 客户端池模块 - 按代理地址复用长连接的 httpx.AsyncClient
+"""
+
+import time
+import asyncio
+import threading
+import importlib.util
+from typing import Dict, Optional, Any
+
+import httpx
+
+class ClientPool:
+    """HTTP客户端池类，每个代理地址对应一个长期存活的客户端"""
+
+    def __init__(self, pool_config: Dict[str, Any] = None, logger=None):
+        """
+        初始化客户端池
+
+        Args:
+            pool_config: 客户端池配置字典，包含http2、idleTimeout等配置
+            logger: 日志记录器
+        """
+        self.logger = logger
+        # 键为代理URL（直连为空字符串），值为 [客户端, 最后使用时间]
+        self.clients: Dict[str, list] = {}
+        self.lock = threading.Lock()
+        self.cleanup_task = None
+        self.set_config(pool_config or {})
+
+    def set_config(self, pool_config: Dict[str, Any]) -> None:
+        """
+        设置或更新客户端池配置，已创建的客户端会在空闲回收后按新配置重建
+
+        Args:
+            pool_config: 新的客户端池配置
+        """
+        self.pool_config = pool_config or {}
+        self.idle_timeout = self.pool_config.get('idleTimeout', 300)
+        self.timeout = self.pool_config.get('timeout', 30.0)
+        self.max_connections = self.pool_config.get('maxConnections', 20)
+        self.max_keepalive = self.pool_config.get('maxKeepalive', 10)
+        self.keepalive_expiry = self.pool_config.get('keepaliveExpiry', 60.0)
+
+        self.http2 = bool(self.pool_config.get('http2', False))
+        if self.http2 and importlib.util.find_spec('h2') is None:
+            self.http2 = False
+            if self.logger:
+                self.logger.warning("未安装 h2 依赖，HTTP/2 已自动关闭")
+
+    def get_client(self, proxy_url: Optional[str] = None) -> httpx.AsyncClient:
+        """
+        获取指定代理对应的客户端，不存在时创建
+
+        Args:
+            proxy_url: 代理URL，为空则返回直连客户端
+
+        Returns:
+            httpx.AsyncClient: 可复用的异步客户端
+        """
+        key = proxy_url or ""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.clients.get(key)
+            if entry is None or entry[0].is_closed:
+                entry = [self._create_client(proxy_url), now]
+                self.clients[key] = entry
+                if self.logger:
+                    self.logger.debug(f"为 {proxy_url or '直连'} 创建新的HTTP客户端")
+            else:
+                entry[1] = now
+            return entry[0]
+
+    def _create_client(self, proxy_url: Optional[str]) -> httpx.AsyncClient:
+        """按当前配置创建客户端"""
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry
+        )
+        client_kwargs = {
+            'timeout': self.timeout,
+            'limits': limits,
+            'http2': self.http2
+        }
+        if proxy_url:
+            client_kwargs['proxy'] = proxy_url
+        return httpx.AsyncClient(**client_kwargs)
+
+    async def evict_idle(self) -> int:
+        """
+        关闭超过空闲时间未使用的客户端
+
+        Returns:
+            int: 被回收的客户端数量
+        """
+        now = time.monotonic()
+        expired = []
+        with self.lock:
+            for key, (client, last_used) in list(self.clients.items()):
+                if now - last_used >= self.idle_timeout:
+                    expired.append((key, client))
+                    del self.clients[key]
+
+        for key, client in expired:
+            try:
+                await client.aclose()
+            except Exception as e:
+                if self.logger:
+                    self.logger.debug(f"关闭 {key or '直连'} 的HTTP客户端时出错: {e}")
+
+        if expired and self.logger:
+            self.logger.debug(f"已回收 {len(expired)} 个空闲HTTP客户端")
+        return len(expired)
+
+    async def _cleanup_loop(self):
+        """定期回收空闲客户端"""
+        try:
+            while True:
+                await asyncio.sleep(max(1, self.idle_timeout / 2))
+                await self.evict_idle()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"HTTP客户端回收任务出错: {e}")
+
+    def start_cleanup_task(self):
+        """启动空闲客户端回收任务"""
+        if self.cleanup_task is None or self.cleanup_task.done():
+            self.cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def close(self):
+        """停止回收任务并关闭所有客户端"""
+        if self.cleanup_task and not self.cleanup_task.done():
+            self.cleanup_task.cancel()
+        self.cleanup_task = None
+
+        with self.lock:
+            clients = [entry[0] for entry in self.clients.values()]
+            self.clients.clear()
+
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception:
+                pass
+
+        if self.logger:
+            self.logger.info(f"已关闭 {len(clients)} 个HTTP客户端")
+
+# 创建全局客户端池实例
+client_pool = ClientPool()
@@ -3,10 +3,63 @@ Cookie 管理模块 - 负责管理多个cookie文件并提供随机选择功能
 """
 
 import os
+import time
 import random
 import datetime
 import asyncio
-from typing import Optional, Dict, Any, List
+import threading
+import importlib.util
+from collections import Counter
+from typing import Optional, Dict, Any, List, Tuple
+
+import httpx
+
+from core.client import client_pool
+from core.proxy import proxy_manager
+
+# 登录状态依赖的 cookie，每组中至少要有一个未过期
+AUTH_COOKIE_GROUPS = (
+    ("SAPISID", "__Secure-3PAPISID"),
+    ("__Secure-3PSID", "SID"),
+)
+# 用于验证登录状态的页面，未登录时会重定向到 accounts.google.com
+VALIDATE_URL = "https://www.youtube.com/account"
+
+def parse_netscape_cookies(content: str) -> List[Dict[str, Any]]:
+    """
+    解析 Netscape 格式的 cookie 文件内容
+
+    Args:
+        content: cookie 文件内容
+
+    Returns:
+        List[Dict[str, Any]]: cookie列表，每项包含 domain、path、secure、expires、name、value
+    """
+    cookies = []
+    for line in content.splitlines():
+        # #HttpOnly_ 前缀表示 HttpOnly cookie，其余 # 开头的行为注释
+        if line.startswith('#HttpOnly_'):
+            line = line[len('#HttpOnly_'):]
+        elif not line.strip() or line.startswith('#'):
+            continue
+        fields = line.rstrip('\r\n').split('\t')
+        if len(fields) != 7:
+            continue
+        domain, _, path, secure, expires, name, value = fields
+        try:
+            expires = int(expires)
+        except ValueError:
+            expires = 0
+        cookies.append({
+            "domain": domain,
+            "path": path,
+            "secure": secure.upper() == 'TRUE',
+            # 0 表示会话 cookie，没有过期时间
+            "expires": expires,
+            "name": name,
+            "value": value,
+        })
+    return cookies
 
 class CookieManager:
     """Cookie管理器类，处理多个cookie文件的管理和随机选择"""
@@ -23,7 +76,24 @@ class CookieManager:
         self.logger = logger
         self.enabled = self.cookie_config.get('enable', False)
         self.cookies_path = self.cookie_config.get('path', '')
+        self._load_refresh_config()
         self.cookie_files = []
+        # 每个cookie文件的健康状态，键为文件路径
+        ## 值为 {"last_success": 时间戳, "last_check": 时间戳, "consecutive_failures": 次数, "latency": 秒, "last_error": 错误信息}
+        self.cookie_health: Dict[str, Dict[str, Any]] = {}
+        # 各录制会话（频道ID）当前使用的cookie文件
+        self.cookie_sessions: Dict[str, str] = {}
+        # 每个cookie文件正在被使用的会话数
+        self.cookie_usage: Counter = Counter()
+        # 每个cookie文件最近一次分配给会话的时间
+        self.cookie_last_used: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        # cookie文件的修改时间，键为文件路径，用于增量更新cookie列表
+        self.file_mtimes: Dict[str, float] = {}
+        # 解析后的cookie文件内容，键为文件路径，值为 (修改时间, cookie列表)
+        self.content_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        ## 监视cookie目录的异步任务
+        self.watch_task = None
         self.reload_cookie_files()
         
         # 定时更新相关的属性
@@ -43,25 +113,102 @@ class CookieManager:
             else:
                 self.logger.info("Cookie管理器已禁用")
     
+    def _load_refresh_config(self):
+        """读取刷新和健康评分相关的配置"""
+        # 同时刷新的最大cookie数
+        self.refresh_concurrency = max(1, self.cookie_config.get('refreshConcurrency', 4))
+        # 单个cookie的刷新超时(秒)
+        self.refresh_timeout = self.cookie_config.get('refreshTimeout', 60)
+        # 连续失败达到次数后不再选择该cookie，除非所有cookie都失败
+        self.max_failures = max(1, self.cookie_config.get('maxFailures', 3))
+        # 为录制分配cookie的方式
+        ## balanced: 选择使用中会话最少的cookie，相同时选择最久未分配的 (默认)
+        ## random: 按健康状态加权随机选择
+        self.selection = self.cookie_config.get('selection', 'balanced')
+        # 每个cookie的最大同时使用会话数，0 为不限制
+        self.max_sessions = self.cookie_config.get('maxSessions', 0)
+        # 检查时是否请求一次 YouTube 确认登录状态，关闭时只检查 cookie 的过期时间
+        self.validate_request = self.cookie_config.get('validateRequest', True)
+        # 定时检查的间隔(秒)，为 0 则只在每天的两个更新时段检查
+        self.validate_interval = self.cookie_config.get('validateInterval', 3600)
+        # 登录 cookie 在该时间(秒)内过期时视为需要刷新
+        self.rotate_before = self.cookie_config.get('rotateBefore', 86400)
+        # 检查不通过时是否使用 yt-dlp 刷新
+        self.ytdlp_fallback = self.cookie_config.get('ytdlpFallback', True)
+        # 是否监视cookie目录，文件增删改时自动更新cookie列表
+        self.watch_enabled = self.cookie_config.get('watch', True)
+        # 未安装 watchfiles 时轮询目录的间隔(秒)
+        self.watch_interval = max(1, self.cookie_config.get('watchInterval', 5))
+
+    def get_cookies_dir(self) -> str:
+        """获取cookie目录，未配置时为当前目录下的 cookies"""
+        return os.path.abspath(self.cookies_path or os.path.join(os.getcwd(), 'cookies'))
+
+    def _scan_cookie_dir(self, cookies_dir: str) -> Dict[str, float]:
+        """扫描目录，返回所有cookie文件及其修改时间"""
+        files = {}
+        with os.scandir(cookies_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.txt') and entry.is_file():
+                    files[entry.path] = entry.stat().st_mtime
+        return files
+
+    def _add_cookie_file(self, cookie_file: str, mtime: float, announce: bool = True):
+        """添加或更新一个cookie文件，announce 为 False 时不记录日志"""
+        if cookie_file not in self.file_mtimes:
+            self.cookie_files.append(cookie_file)
+            if announce and self.logger:
+                self.logger.info(f"新增cookie文件: {os.path.basename(cookie_file)}")
+        elif announce and self.file_mtimes[cookie_file] != mtime and self.logger:
+            self.logger.info(f"cookie文件已更新: {os.path.basename(cookie_file)}")
+        self.file_mtimes[cookie_file] = mtime
+
+    def _remove_cookie_file(self, cookie_file: str, announce: bool = True):
+        """移除一个cookie文件及其缓存和健康状态，announce 为 False 时不记录日志"""
+        if cookie_file not in self.file_mtimes:
+            return
+        del self.file_mtimes[cookie_file]
+        self.cookie_files = [f for f in self.cookie_files if f != cookie_file]
+        self.content_cache.pop(cookie_file, None)
+        with self.lock:
+            self.cookie_health.pop(cookie_file, None)
+        if announce and self.logger:
+            self.logger.info(f"移除cookie文件: {os.path.basename(cookie_file)}")
+
+    def _apply_scan(self, files: Dict[str, float], announce: bool = True):
+        """按扫描结果增量更新cookie列表"""
+        for cookie_file in list(self.file_mtimes):
+            if cookie_file not in files:
+                self._remove_cookie_file(cookie_file, announce)
+        for cookie_file, mtime in files.items():
+            if self.file_mtimes.get(cookie_file) != mtime:
+                self._add_cookie_file(cookie_file, mtime, announce)
+
+    def _update_cookie_file(self, cookie_file: str):
+        """根据文件当前状态添加、更新或移除一个cookie文件"""
+        if not cookie_file.endswith('.txt'):
+            return
+        try:
+            mtime = os.stat(cookie_file).st_mtime
+        except OSError:
+            self._remove_cookie_file(cookie_file)
+            return
+        if os.path.isfile(cookie_file):
+            self._add_cookie_file(cookie_file, mtime)
+
     def reload_cookie_files(self):
-        """重新加载cookie文件列表"""
+        """重新扫描cookie目录，更新cookie文件列表"""
         if not self.enabled:
             self.cookie_files = []
+            self.file_mtimes = {}
+            self.content_cache = {}
             return
             
-        cookies_dir = self.cookies_path
-        if not cookies_dir:
-            cookies_dir = os.path.join(os.getcwd(), 'cookies')
-            
+        cookies_dir = self.get_cookies_dir()
         os.makedirs(cookies_dir, exist_ok=True)
         
-        self.cookie_files = []
         try:
-            for file in os.listdir(cookies_dir):
-                if file.endswith('.txt'):
-                    full_path = os.path.join(cookies_dir, file)
-                    if os.path.isfile(full_path):
-                        self.cookie_files.append(full_path)
+            self._apply_scan(self._scan_cookie_dir(cookies_dir), announce=False)
                         
             if self.logger:
                 if self.cookie_files:
@@ -71,24 +218,167 @@ class CookieManager:
         except Exception as e:
             if self.logger:
                 self.logger.error(f"加载cookie文件时出错: {e}")
+
+    async def _watch_with_watchfiles(self, cookies_dir: str):
+        """使用 watchfiles (inotify 等系统通知) 监视cookie目录"""
+        from watchfiles import awatch
+
+        async for changes in awatch(cookies_dir, recursive=False):
+            for _, path in changes:
+                self._update_cookie_file(path)
+
+    async def _watch_with_polling(self, cookies_dir: str):
+        """定时扫描cookie目录，只在有变化时更新cookie列表"""
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                files = await asyncio.to_thread(self._scan_cookie_dir, cookies_dir)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"扫描cookie目录时出错: {e}")
+                continue
+            if files != self.file_mtimes:
+                self._apply_scan(files)
+
+    async def _watch_loop(self):
+        """监视cookie目录，优先使用 watchfiles，未安装时回退到轮询"""
+        cookies_dir = self.get_cookies_dir()
+        try:
+            # 补上加载列表到开始监视之间的变化
+            self._apply_scan(await asyncio.to_thread(self._scan_cookie_dir, cookies_dir))
+            if importlib.util.find_spec('watchfiles') is not None:
+                if self.logger:
+                    self.logger.info(f"使用 watchfiles 监视cookie目录: {cookies_dir}")
+                await self._watch_with_watchfiles(cookies_dir)
+            else:
+                if self.logger:
+                    self.logger.info(f"未安装 watchfiles，每 {self.watch_interval} 秒轮询cookie目录: {cookies_dir}")
+                await self._watch_with_polling(cookies_dir)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"监视cookie目录时出错，改为轮询: {e}")
+            await self._watch_with_polling(cookies_dir)
+
+    def start_watcher(self):
+        """启动cookie目录监视任务"""
+        if not self.enabled or not self.watch_enabled:
+            return
+        if self.watch_task is None or self.watch_task.done():
+            self.watch_task = asyncio.create_task(self._watch_loop())
+
+    def stop_watcher(self):
+        """停止cookie目录监视任务"""
+        if self.watch_task and not self.watch_task.done():
+            self.watch_task.cancel()
+        self.watch_task = None
+
+    def is_watcher_running(self) -> bool:
+        """检查cookie目录监视任务是否正在运行"""
+        return self.watch_task is not None and not self.watch_task.done()
     
-    def get_random_cookie_file(self) -> Optional[str]:
+    def _cookie_weight(self, cookie_file: str) -> float:
+        """按连续失败次数计算cookie的选择权重，失败越多权重越低"""
+        health = self.cookie_health.get(cookie_file)
+        if not health:
+            return 1.0
+        return 1.0 / (1 + health["consecutive_failures"])
+
+    def is_cookie_healthy(self, cookie_file: str) -> bool:
+        """cookie连续失败次数是否低于上限"""
+        with self.lock:
+            health = self.cookie_health.get(cookie_file)
+            return not health or health["consecutive_failures"] < self.max_failures
+
+    def _healthy_candidates(self) -> List[str]:
+        """获取连续失败次数低于上限的cookie文件，都失败时返回全部，调用方需持有锁"""
+        candidates = [f for f in self.cookie_files
+                      if f not in self.cookie_health or self.cookie_health[f]["consecutive_failures"] < self.max_failures]
+        if not candidates:
+            # 所有cookie都失败时仍然返回一个，避免录制完全无法启动
+            candidates = list(self.cookie_files)
+            if self.logger:
+                self.logger.warning("所有cookie文件都连续失败，仍从中选择一个使用")
+        return candidates
+
+    def _select_least_used(self, candidates: List[str]) -> str:
+        """选择使用中会话最少的cookie，相同时按失败次数和最久未分配选择，调用方需持有锁"""
+        return min(candidates, key=lambda f: (
+            self.cookie_usage[f],
+            self.cookie_health.get(f, {}).get("consecutive_failures", 0),
+            self.cookie_last_used.get(f, 0.0),
+        ))
+
+    def acquire_cookie_file(self, session_id: str) -> Optional[str]:
         """
-        随机选择一个cookie文件
-        
+        为录制会话分配一个cookie文件，会话结束时需要调用 release_cookie_file
+
+        Args:
+            session_id: 会话标识，使用频道ID
+
         Returns:
-            Optional[str]: 随机选择的cookie文件路径，如果没有可用cookie则返回None
+            Optional[str]: 分配的cookie文件路径，没有可用cookie或所有cookie都达到会话上限时返回None
         """
         if not self.enabled or not self.cookie_files:
             return None
-            
-        cookie_file = random.choice(self.cookie_files)
-        
+
+        with self.lock:
+            candidates = self._healthy_candidates()
+            if self.max_sessions > 0:
+                candidates = [f for f in candidates if self.cookie_usage[f] < self.max_sessions]
+            if not candidates:
+                cookie_file = None
+            elif self.selection == 'random':
+                cookie_file = random.choices(candidates, weights=[self._cookie_weight(f) for f in candidates])[0]
+            else:
+                cookie_file = self._select_least_used(candidates)
+        if cookie_file is None:
+            if self.logger:
+                self.logger.warning(f"所有cookie文件都达到最大会话数 {self.max_sessions}，会话 {session_id} 不使用随机cookie")
+            return None
+
+        with self.lock:
+            previous = self.cookie_sessions.pop(session_id, None)
+            if previous:
+                self._release_usage(previous)
+            self.cookie_sessions[session_id] = cookie_file
+            self.cookie_usage[cookie_file] += 1
+            self.cookie_last_used[cookie_file] = time.monotonic()
+            usage = self.cookie_usage[cookie_file]
+
         if self.logger:
-            self.logger.debug(f"随机选择cookie文件: {cookie_file}")
-            
+            self.logger.debug(f"会话 {session_id} 使用cookie文件: {cookie_file}，当前使用数 {usage}")
         return cookie_file
-    
+
+    def _release_usage(self, cookie_file: str):
+        """减少cookie的使用数，调用方需持有锁"""
+        self.cookie_usage[cookie_file] -= 1
+        if self.cookie_usage[cookie_file] <= 0:
+            del self.cookie_usage[cookie_file]
+
+    def release_cookie_file(self, session_id: str):
+        """
+        释放录制会话占用的cookie文件
+
+        Args:
+            session_id: 会话标识，使用频道ID
+        """
+        with self.lock:
+            cookie_file = self.cookie_sessions.pop(session_id, None)
+            if cookie_file:
+                self._release_usage(cookie_file)
+
+    def get_cookie_sessions(self) -> Dict[str, str]:
+        """获取各会话当前使用的cookie文件"""
+        with self.lock:
+            return dict(self.cookie_sessions)
+
+    def get_cookie_usage(self, cookie_file: str) -> int:
+        """获取cookie文件正在被使用的会话数"""
+        with self.lock:
+            return self.cookie_usage[cookie_file]
+
     def set_config(self, cookie_config: Dict[str, Any]):
         """
         设置或更新cookie配置
@@ -99,7 +389,9 @@ class CookieManager:
         self.cookie_config = cookie_config or {}
         self.enabled = self.cookie_config.get('enable', False)
         self.cookies_path = self.cookie_config.get('path', '')
+        self._load_refresh_config()
         self.reload_cookie_files()
+        self._restart_watcher()
         
         if self.logger:
             if self.enabled:
@@ -108,9 +400,190 @@ class CookieManager:
             else:
                 self.logger.info("Cookie管理器已禁用")
     
+    def record_result(self, cookie_file: str, success: bool, latency: Optional[float] = None, error: Optional[str] = None):
+        """
+        记录cookie的检查结果
+
+        Args:
+            cookie_file: cookie文件路径
+            success: 是否成功
+            latency: 检查耗时(秒)
+            error: 失败时的错误信息
+        """
+        now = time.time()
+        with self.lock:
+            health = self.cookie_health.setdefault(cookie_file, {
+                "last_success": None,
+                "last_check": None,
+                "consecutive_failures": 0,
+                "latency": None,
+                "last_error": None,
+            })
+            health["last_check"] = now
+            if latency is not None:
+                health["latency"] = latency
+            if success:
+                health["last_success"] = now
+                health["consecutive_failures"] = 0
+                health["last_error"] = None
+            else:
+                health["consecutive_failures"] += 1
+                health["last_error"] = error
+                failures = health["consecutive_failures"]
+        if not success and failures == self.max_failures and self.logger:
+            self.logger.warning(f"cookie文件 {os.path.basename(cookie_file)} 连续失败 {failures} 次，暂停使用")
+
+    def mark_cookie_failed(self, cookie_file: str, error: str):
+        """
+        将cookie标记为失效，不再分配给新的录制，直到下一次检查通过
+
+        Args:
+            cookie_file: cookie文件路径
+            error: 失效原因
+        """
+        self.record_result(cookie_file, False, error=error)
+        with self.lock:
+            health = self.cookie_health[cookie_file]
+            health["consecutive_failures"] = max(health["consecutive_failures"], self.max_failures)
+
+    def get_cookie_health(self, cookie_file: str) -> Optional[Dict[str, Any]]:
+        """获取cookie文件的健康状态"""
+        with self.lock:
+            health = self.cookie_health.get(cookie_file)
+            if health is None:
+                return None
+            return {**health, "healthy": health["consecutive_failures"] < self.max_failures}
+
+    def read_cookie_file(self, cookie_file: str) -> List[Dict[str, Any]]:
+        """读取并解析cookie文件，文件修改时间不变时直接返回缓存的内容"""
+        mtime = os.stat(cookie_file).st_mtime
+        cached = self.content_cache.get(cookie_file)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(cookie_file, 'r', encoding='utf-8', errors='replace') as f:
+            cookies = parse_netscape_cookies(f.read())
+        self.content_cache[cookie_file] = (mtime, cookies)
+        return cookies
+
+    def _check_auth_cookies(self, cookies: List[Dict[str, Any]]) -> Tuple[bool, str]:
+        """
+        检查登录 cookie 是否齐全且未过期
+
+        Returns:
+            Tuple[bool, str]: 是否有效，以及无效的原因
+        """
+        now = time.time()
+        youtube_cookies = {c["name"]: c for c in cookies if c["domain"].endswith("youtube.com")}
+        for group in AUTH_COOKIE_GROUPS:
+            present = [youtube_cookies[name] for name in group if name in youtube_cookies]
+            if not present:
+                return False, f"缺少登录cookie {'/'.join(group)}"
+            expires = max(c["expires"] or float('inf') for c in present)
+            if expires <= now:
+                return False, f"登录cookie {'/'.join(group)} 已过期"
+            if expires - now < self.rotate_before:
+                return False, f"登录cookie {'/'.join(group)} 即将过期"
+        return True, ""
+
+    async def _request_logged_in(self, cookies: List[Dict[str, Any]]) -> Optional[bool]:
+        """
+        带上cookie经 API 代理请求账号页面，确认登录状态
+
+        使用单独的客户端而不是客户端池中共享的客户端，避免响应中的 Set-Cookie
+        存入共享客户端，被之后匿名的直播检查请求带上
+
+        Returns:
+            Optional[bool]: 是否处于登录状态，请求出错时返回None
+        """
+        cookie_header = '; '.join(f"{c['name']}={c['value']}" for c in cookies if c["domain"].endswith("youtube.com"))
+        api_proxy = proxy_manager.get_api_proxy()
+        client_kwargs = {'timeout': client_pool.timeout}
+        if api_proxy:
+            client_kwargs['proxy'] = api_proxy
+        try:
+            async with httpx.AsyncClient(**client_kwargs) as client:
+                async with client.stream('GET', VALIDATE_URL, headers={'Cookie': cookie_header}) as response:
+                    if response.is_redirect:
+                        return 'accounts.google.com' not in response.headers.get('Location', '')
+                    return response.status_code == 200
+        except Exception as e:
+            if self.logger:
+                self.logger.debug(f"经 {api_proxy or '直连'} 请求账号页面验证cookie时出错: {e}")
+            return None
+
+    async def validate_cookie(self, cookie_file: str) -> Tuple[Optional[bool], str]:
+        """
+        不启动 yt-dlp，直接解析cookie文件检查登录cookie，并可选地请求一次 YouTube 确认登录状态
+
+        Args:
+            cookie_file: cookie文件路径
+
+        Returns:
+            Tuple[Optional[bool], str]: True 有效，False 需要刷新，None 无法判断；以及原因
+        """
+        try:
+            cookies = self.read_cookie_file(cookie_file)
+        except Exception as e:
+            return False, f"读取cookie文件出错: {e}"
+
+        valid, reason = self._check_auth_cookies(cookies)
+        if not valid or not self.validate_request:
+            return valid, reason
+
+        logged_in = await self._request_logged_in(cookies)
+        if logged_in is None:
+            return None, "请求账号页面失败"
+        if not logged_in:
+            return False, "账号页面显示未登录"
+        return True, ""
+
+    async def check_cookie(self, cookie_file: str) -> bool:
+        """
+        检查单个cookie文件，检查不通过时回退到 yt-dlp 刷新，请求出错无法判断时保持原有状态
+
+        Args:
+            cookie_file: cookie文件路径
+
+        Returns:
+            bool: cookie是否可用
+        """
+        start_time = time.monotonic()
+        valid, reason = await self.validate_cookie(cookie_file)
+        latency = time.monotonic() - start_time
+        if valid:
+            if self.logger:
+                self.logger.debug(f"cookie文件 {os.path.basename(cookie_file)} 检查通过，耗时 {latency:.2f} 秒")
+            self.record_result(cookie_file, True, latency)
+            return True
+
+        if valid is None:
+            # 网络问题与cookie本身无关，不计为失败，也不为此启动 yt-dlp
+            if self.logger:
+                self.logger.warning(f"cookie文件 {os.path.basename(cookie_file)} 无法判断是否有效: {reason}")
+            return self.is_cookie_healthy(cookie_file)
+
+        if not self.ytdlp_fallback:
+            if self.logger:
+                self.logger.warning(f"cookie文件 {os.path.basename(cookie_file)} 检查不通过: {reason}")
+            self.record_result(cookie_file, False, latency, reason)
+            return False
+
+        if self.logger:
+            self.logger.info(f"cookie文件 {os.path.basename(cookie_file)} 检查不通过 ({reason})，使用 yt-dlp 刷新")
+        return await self.refresh_cookie(cookie_file)
+
+    def _restart_watcher(self):
+        """配置变化后按新的目录重新启动监视任务，没有运行中的事件循环时等待启动时再开始"""
+        self.stop_watcher()
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.start_watcher()
+
     async def refresh_cookie(self, cookie_file: str) -> bool:
         """
-        使用yt-dlp刷新单个cookie文件
+        使用yt-dlp刷新单个cookie文件，超过 refresh_timeout 时结束进程并记为失败
         
         Args:
             cookie_file: cookie文件路径
@@ -121,8 +594,11 @@ class CookieManager:
         if not os.path.exists(cookie_file):
             if self.logger:
                 self.logger.error(f"cookie文件不存在: {cookie_file}")
+            self.record_result(cookie_file, False, error="cookie文件不存在")
             return False
             
+        start_time = time.monotonic()
+        process = None
         try:
             cmd = ["yt-dlp", "--cookies", cookie_file, "--simulate", "https://youtube.com/watch?v=ODPDaIwVc-U"]
             
@@ -135,25 +611,43 @@ class CookieManager:
                 stderr=asyncio.subprocess.PIPE
             )
             
-            stdout, stderr = await process.communicate()
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.refresh_timeout)
+            latency = time.monotonic() - start_time
             
             if process.returncode == 0:
                 if self.logger:
-                    self.logger.info(f"成功刷新cookie文件: {os.path.basename(cookie_file)}")
+                    self.logger.info(f"成功刷新cookie文件: {os.path.basename(cookie_file)}，耗时 {latency:.1f} 秒")
+                self.record_result(cookie_file, True, latency)
                 return True
             else:
                 error_msg = stderr.decode('utf-8', errors='replace')
                 if self.logger:
                     self.logger.error(f"刷新cookie文件失败: {os.path.basename(cookie_file)}, 错误: {error_msg}")
+                self.record_result(cookie_file, False, latency, error_msg.strip()[-500:])
                 return False
                 
+        except asyncio.TimeoutError:
+            latency = time.monotonic() - start_time
+            if process and process.returncode is None:
+                process.kill()
+                await process.wait()
+            if self.logger:
+                self.logger.error(f"刷新cookie文件超时: {os.path.basename(cookie_file)} ({self.refresh_timeout} 秒)")
+            self.record_result(cookie_file, False, latency, "刷新超时")
+            return False
         except Exception as e:
             if self.logger:
                 self.logger.error(f"刷新cookie文件时出错: {os.path.basename(cookie_file)}, 异常: {e}")
+            self.record_result(cookie_file, False, error=str(e))
             return False
     
-    async def refresh_all_cookies(self):
-        """刷新所有cookie文件"""
+    async def refresh_all_cookies(self, schedule_next: bool = True):
+        """
+        并发检查所有cookie文件，不通过的再用 yt-dlp 刷新，同时进行的数量不超过 refresh_concurrency
+
+        Args:
+            schedule_next: 完成后是否重新安排下一次更新时间
+        """
         if not self.enabled or not self.cookie_files:
             if self.logger:
                 self.logger.warning("Cookie管理器未启用或没有cookie文件，跳过刷新")
@@ -168,23 +662,23 @@ class CookieManager:
         self.last_update_time = datetime.datetime.now()
         
         try:
+            # 没有监视cookie目录时重新加载确保最新状态
+            if not self.is_watcher_running():
+                self.reload_cookie_files()
+            cookie_files = list(self.cookie_files)
+
             if self.logger:
-                self.logger.info(f"开始刷新所有cookie文件，共 {len(self.cookie_files)} 个")
-                
-            # 重新加载确保最新状态
-            self.reload_cookie_files()
-            
-            success_count = 0
-            fail_count = 0
-            
-            for cookie_file in self.cookie_files:
-                success = await self.refresh_cookie(cookie_file)
-                if success:
-                    success_count += 1
-                else:
-                    fail_count += 1
-                # 短暂等待，避免连续请求
-                await asyncio.sleep(2)
+                self.logger.info(f"开始刷新所有cookie文件，共 {len(cookie_files)} 个，并发数 {self.refresh_concurrency}")
+
+            semaphore = asyncio.Semaphore(self.refresh_concurrency)
+
+            async def refresh_with_limit(cookie_file: str) -> bool:
+                async with semaphore:
+                    return await self.check_cookie(cookie_file)
+
+            results = await asyncio.gather(*(refresh_with_limit(f) for f in cookie_files))
+            success_count = sum(1 for result in results if result)
+            fail_count = len(results) - success_count
                 
             if self.logger:
                 self.logger.info(f"所有cookie文件刷新完成: 成功 {success_count} 个, 失败 {fail_count} 个")
@@ -195,7 +689,8 @@ class CookieManager:
         finally:
             self.updating = False
             # 安排下一次更新
-            self._schedule_next_updates()
+            if schedule_next:
+                self._schedule_next_updates()
     
     def _schedule_next_updates(self):
         """安排下一次更新的时间点"""
@@ -258,6 +753,14 @@ class CookieManager:
         # 添加到下次更新时间列表
         self.next_update_times.append(random_time)
     
+    def _validation_due(self, now: datetime.datetime) -> bool:
+        """是否到了定时检查的时间"""
+        if self.validate_interval <= 0:
+            return False
+        if self.last_update_time is None:
+            return True
+        return (now - self.last_update_time).total_seconds() >= self.validate_interval
+
     async def _update_scheduler(self):
         """定时器，负责在指定时间执行cookie更新"""
         try:
@@ -279,6 +782,11 @@ class CookieManager:
                         self.next_update_times.remove(update_time)
                         await self.refresh_all_cookies()
                         break
+                else:
+                    # 距离上次检查超过 validate_interval 时检查一次，不改变已安排的更新时间
+                    if self._validation_due(now):
+                        await self.refresh_all_cookies(schedule_next=False)
+                        now = datetime.datetime.now()
                 
                 # 如果没有安排的更新时间，重新安排
                 if not self.next_update_times:
@@ -296,6 +804,11 @@ class CookieManager:
                     # 如果没有安排的更新时间，等待一小时后重新检查
                     wait_seconds = 3600
                 
+                # 不晚于下一次定时检查
+                if self.validate_interval > 0 and self.last_update_time:
+                    validate_wait = self.validate_interval - (now - self.last_update_time).total_seconds()
+                    wait_seconds = max(1, min(wait_seconds, validate_wait))
+
                 await asyncio.sleep(wait_seconds)
         
         except asyncio.CancelledError:
@@ -0,0 +1,115 @@
+"""
+事件推送模块 - 将频道状态变化和 ytarchive 输出推送给前端订阅者
+"""
+
+import asyncio
+import threading
+from collections import Counter
+from typing import Dict, Optional, Any
+
+class EventBus:
+    """事件总线类，可在任意线程发布事件，在事件循环中分发给订阅者"""
+
+    def __init__(self, queue_size: int = 1000, logger=None):
+        """
+        初始化事件总线
+
+        Args:
+            queue_size: 每个订阅者的事件队列长度，队列满时丢弃新事件
+            logger: 日志记录器
+        """
+        self.queue_size = queue_size
+        self.logger = logger
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # 键为订阅者队列，值为订阅日志的频道ID（为空则不接收日志事件）
+        self.subscribers: Dict[asyncio.Queue, Optional[str]] = {}
+        # 每个频道的日志订阅数，用于在无人订阅时跳过日志事件
+        self.log_channels = Counter()
+        self.lock = threading.Lock()
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """绑定用于分发事件的事件循环，在应用启动时调用"""
+        self.loop = loop
+
+    def subscribe(self, log_channel_id: Optional[str] = None) -> asyncio.Queue:
+        """
+        添加订阅者，需要在事件循环中调用
+
+        Args:
+            log_channel_id: 需要接收日志事件的频道ID
+
+        Returns:
+            asyncio.Queue: 订阅者的事件队列，元素为 (事件类型, 数据)，收到 None 表示总线已关闭
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers[queue] = log_channel_id
+            if log_channel_id:
+                self.log_channels[log_channel_id] += 1
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """移除订阅者"""
+        with self.lock:
+            log_channel_id = self.subscribers.pop(queue, None)
+            if log_channel_id:
+                self.log_channels[log_channel_id] -= 1
+                if self.log_channels[log_channel_id] <= 0:
+                    del self.log_channels[log_channel_id]
+
+    def publish(self, event_type: str, data: Dict[str, Any]):
+        """
+        发布事件，可在读取线程中调用
+
+        Args:
+            event_type: 事件类型，status 或 log
+            data: 事件数据，需包含 channel_id
+        """
+        loop = self.loop
+        if loop is None or loop.is_closed() or not self.subscribers:
+            return
+        if event_type == "log" and data.get("channel_id") not in self.log_channels:
+            return
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is loop:
+            self._dispatch((event_type, data))
+        else:
+            try:
+                loop.call_soon_threadsafe(self._dispatch, (event_type, data))
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    def _dispatch(self, event):
+        """在事件循环中把事件放入订阅者队列"""
+        event_type, data = event
+        with self.lock:
+            subscribers = list(self.subscribers.items())
+        for queue, log_channel_id in subscribers:
+            if event_type == "log" and data.get("channel_id") != log_channel_id:
+                continue
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                if self.logger:
+                    self.logger.debug(f"事件订阅者队列已满，丢弃 {event_type} 事件")
+
+    def close(self):
+        """通知所有订阅者结束，在应用关闭时调用"""
+        with self.lock:
+            queues = list(self.subscribers.keys())
+        for queue in queues:
+            try:
+                queue.put_nowait(None)
+            except asyncio.QueueFull:
+                # 队列已满时清空一个位置放入结束标记
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+# 创建全局事件总线实例
+event_bus = EventBus()
@@ -0,0 +1,196 @@
+"""
+直播历史模块 - 记录每个频道的开播时间，按一周内的时段统计活跃度，用于调整检查间隔
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Dict, List, Optional, Any
+
+# 一周的小时数，时段按 UTC 的星期几和小时划分
+HOURS_PER_WEEK = 168
+WEEK_SECONDS = HOURS_PER_WEEK * 3600
+# 每个频道保留的最大开播记录数
+MAX_RECORDS_PER_CHANNEL = 200
+# 没有视频ID的开播记录（常驻监控时由 ytarchive 开始录制时记录）与上一条记录间隔不足该时间(秒)时视为同一场直播
+SESSION_GAP = 6 * 3600
+
+def hour_of_week(timestamp: float) -> int:
+    """计算时间戳在一周内的小时序号 (0-167)"""
+    t = time.gmtime(timestamp)
+    return t.tm_wday * 24 + t.tm_hour
+
+class LiveHistory:
+    """直播历史类，记录开播时间并计算频道的时段活跃度"""
+
+    def __init__(self, history_config: Dict[str, Any] = None, logger=None):
+        """
+        初始化直播历史
+
+        Args:
+            history_config: 配置字典，包含enable、minInterval、maxInterval、minSamples、historyFile配置
+            logger: 日志记录器
+        """
+        self.logger = logger
+        # 键为频道ID，值为开播记录列表，每条记录为 {"video_id": 视频ID, "time": 首次检测到的时间戳}
+        self.records: Dict[str, List[Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+        self.set_config(history_config or {})
+
+    def set_config(self, history_config: Dict[str, Any]) -> None:
+        """
+        设置或更新配置，历史文件变化时重新加载
+
+        Args:
+            history_config: 新的配置
+        """
+        self.history_config = history_config or {}
+        self.enabled = self.history_config.get('enable', True)
+        self.min_interval = self.history_config.get('minInterval', 60)
+        self.max_interval = max(self.min_interval, self.history_config.get('maxInterval', 900))
+        # 开播记录少于该数量时只缩短检查间隔，不放宽到超过默认间隔
+        self.min_samples = self.history_config.get('minSamples', 5)
+        history_file = self.history_config.get('historyFile', 'data/live_history.json')
+        if getattr(self, 'history_file', None) != history_file:
+            self.history_file = history_file
+            self.load()
+
+    def load(self):
+        """从历史文件加载记录"""
+        try:
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except FileNotFoundError:
+            records = {}
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"读取直播历史文件 {self.history_file} 出错: {e}")
+            records = {}
+        with self.lock:
+            self.records = records
+
+    def save(self):
+        """把记录写入历史文件，先写临时文件再替换"""
+        with self.lock:
+            data = json.dumps(self.records, ensure_ascii=False)
+        try:
+            directory = os.path.dirname(self.history_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_file = f"{self.history_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_file, self.history_file)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"保存直播历史文件 {self.history_file} 出错: {e}")
+
+    def record_live(self, channel_id: str, video_id: Optional[str], timestamp: Optional[float] = None) -> bool:
+        """
+        记录一次开播，同一视频只记录首次检测到的时间
+
+        Args:
+            channel_id: 频道ID
+            video_id: 直播视频ID，常驻监控时 ytarchive 开始录制的视频ID未知，为None
+            timestamp: 检测到直播的时间，默认为当前时间
+
+        Returns:
+            bool: 是否为新的开播记录
+        """
+        timestamp = timestamp or time.time()
+        with self.lock:
+            records = self.records.setdefault(channel_id, [])
+            if video_id and any(record["video_id"] == video_id for record in records[-20:]):
+                return False
+            if records and not (video_id and records[-1]["video_id"]) and timestamp - records[-1]["time"] < SESSION_GAP:
+                return False
+            records.append({"video_id": video_id, "time": timestamp})
+            if len(records) > MAX_RECORDS_PER_CHANNEL:
+                del records[:len(records) - MAX_RECORDS_PER_CHANNEL]
+        self.save()
+        return True
+
+    def get_profile(self, channel_id: str) -> List[int]:
+        """
+        获取频道在一周内各时段的开播次数
+
+        Returns:
+            List[int]: 长度为168的列表，下标为 UTC 星期几*24+小时
+        """
+        profile = [0] * HOURS_PER_WEEK
+        with self.lock:
+            for record in self.records.get(channel_id, []):
+                profile[hour_of_week(record["time"])] += 1
+        return profile
+
+    def get_activity(self, channel_id: str, now: Optional[float] = None) -> Optional[float]:
+        """
+        估计频道在当前及下一个时段开播的可能性
+
+        按历史记录覆盖的周数归一化，相邻时段按一半权重计入，以容忍开播时间的小幅偏移
+
+        Returns:
+            Optional[float]: 0到1之间的活跃度，没有历史记录时返回None
+        """
+        now = now or time.time()
+        with self.lock:
+            records = list(self.records.get(channel_id, []))
+        if not records:
+            return None
+
+        weeks = max(1.0, (now - records[0]["time"]) / WEEK_SECONDS)
+        profile = [0] * HOURS_PER_WEEK
+        for record in records:
+            profile[hour_of_week(record["time"])] += 1
+
+        current = hour_of_week(now)
+        activity = 0.0
+        for hour in (current, (current + 1) % HOURS_PER_WEEK):
+            score = profile[hour] + 0.5 * (profile[hour - 1] + profile[(hour + 1) % HOURS_PER_WEEK])
+            activity = max(activity, score / weeks)
+        return min(1.0, activity)
+
+    def suggest_interval(self, channel_id: str, default_interval: float, now: Optional[float] = None) -> float:
+        """
+        根据活跃度计算检查间隔，活跃时段接近 min_interval，冷门时段接近 max_interval
+
+        开播记录少于 min_samples 时冷门时段的估计不可靠，间隔不超过 default_interval
+
+        Args:
+            channel_id: 频道ID
+            default_interval: 没有历史记录或未启用时使用的间隔
+
+        Returns:
+            float: 检查间隔(秒)
+        """
+        if not self.enabled:
+            return default_interval
+        activity = self.get_activity(channel_id, now)
+        if activity is None:
+            return default_interval
+        interval = self.max_interval - (self.max_interval - self.min_interval) * activity
+        with self.lock:
+            samples = len(self.records.get(channel_id, []))
+        if samples < self.min_samples:
+            return min(interval, default_interval)
+        return interval
+
+    def get_channel_summary(self, channel_id: str) -> Dict[str, Any]:
+        """
+        获取频道的直播历史摘要
+
+        Returns:
+            Dict[str, Any]: 包含 stream_count、last_live_time、activity、profile
+        """
+        with self.lock:
+            records = list(self.records.get(channel_id, []))
+        return {
+            "stream_count": len(records),
+            "last_live_time": records[-1]["time"] if records else None,
+            "activity": self.get_activity(channel_id),
+            "profile": self.get_profile(channel_id),
+        }
+
+# 创建全局直播历史实例
+live_history = LiveHistory()
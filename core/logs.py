@@ -1,12 +1,91 @@
-import logging
+import logging, threading
 from logging.handlers import TimedRotatingFileHandler
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
 # 全局处理器映射
 handlers_cache: Dict[str, logging.Handler] = {}
 loggers_cache: Dict[str, logging.Logger] = {}
 
+class LogBuffer:
+    """定长环形日志缓冲区，每行带有单调递增的序号"""
+
+    def __init__(self, size: int = 1000):
+        """
+        初始化缓冲区
+        
+        Args:
+            size: 保留的最大行数
+        """
+        self.size = max(1, int(size))
+        self.lines: List[Optional[str]] = [None] * self.size
+        # 下一行将使用的序号，序号为 seq 的行存放在 seq % size
+        self.next_seq = 0
+        self.lock = threading.Lock()
+
+    def append(self, line: str) -> int:
+        """
+        追加一行，缓冲区满时覆盖最旧的行
+        
+        Returns:
+            int: 该行的序号
+        """
+        with self.lock:
+            seq = self.next_seq
+            self.lines[seq % self.size] = line
+            self.next_seq = seq + 1
+            return seq
+
+    def __len__(self) -> int:
+        return min(self.next_seq, self.size)
+
+    def _first_seq(self) -> int:
+        """缓冲区中最旧一行的序号"""
+        return max(0, self.next_seq - self.size)
+
+    def _slice(self, start: int, end: int) -> List[str]:
+        """复制序号区间 [start, end) 内的行，调用方需持有锁"""
+        if start >= end:
+            return []
+        start_idx = start % self.size
+        end_idx = end % self.size
+        if start_idx < end_idx:
+            return self.lines[start_idx:end_idx]
+        return self.lines[start_idx:] + self.lines[:end_idx]
+
+    def tail(self, count: Optional[int] = None) -> List[str]:
+        """
+        获取最新的若干行快照
+        
+        Args:
+            count: 行数，为空则返回全部
+            
+        Returns:
+            List[str]: 按时间顺序排列的行
+        """
+        with self.lock:
+            start = self._first_seq()
+            if count is not None:
+                start = max(start, self.next_seq - count)
+            return self._slice(start, self.next_seq)
+
+    def since(self, seq: int, limit: Optional[int] = None) -> Tuple[List[str], int]:
+        """
+        获取序号大于 seq 的行，用于增量拉取
+        
+        Args:
+            seq: 客户端已收到的最后一行序号，传 -1 表示从头开始
+            limit: 最多返回的行数，超出时只返回最新的部分
+            
+        Returns:
+            Tuple[List[str], int]: (行列表, 下一次请求应使用的序号)
+        """
+        with self.lock:
+            start = max(seq + 1, self._first_seq())
+            if limit is not None:
+                start = max(start, self.next_seq - limit)
+            return self._slice(start, self.next_seq), self.next_seq - 1
+
 def setup_logger(logger_name: str, log_file: Path, level=logging.INFO, 
                  when='midnight', backupCount=30, formatter=None) -> logging.Logger:
     """
@@ -95,6 +174,83 @@ def get_ytarchive_logger(channel_name: str) -> logging.Logger:
     log_file = logs_dir / 'ytarchive.log'
     return setup_logger(f'ytarchive_{channel_name}', log_file)
 
+# 反向读取日志文件时每次读取的字节数
+TAIL_BLOCK_SIZE = 8192
+
+def read_log_tail(log_file: Path, max_lines: int = 500, offset: Optional[int] = None) -> Tuple[list, int]:
+    """
+    从文件末尾反向按块读取最后若干行，只读取需要的字节
+    
+    Args:
+        log_file: 日志文件路径
+        max_lines: 返回的最大行数
+        offset: 上次读取返回的字节偏移，指定时只返回该位置之后新写入的行；
+                偏移超过文件大小（日志已轮换）时从头读取
+        
+    Returns:
+        Tuple[list, int]: (日志行列表, 下次读取使用的字节偏移)
+    """
+    if not log_file.exists():
+        return [], 0
+
+    with open(log_file, 'rb') as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+
+        start_limit = 0
+        if offset is not None and 0 <= offset <= file_size:
+            start_limit = offset
+
+        # 只返回完整的行，末尾未写完的行留到下次读取
+        pos = file_size
+        data = b""
+        newline_count = 0
+        while pos > start_limit and newline_count <= max_lines:
+            read_size = min(TAIL_BLOCK_SIZE, pos - start_limit)
+            pos -= read_size
+            f.seek(pos)
+            block = f.read(read_size)
+            newline_count += block.count(b"\n")
+            data = block + data
+
+    last_newline = data.rfind(b"\n")
+    if last_newline < 0:
+        return [], pos
+    new_offset = pos + last_newline + 1
+    data = data[:last_newline + 1]
+
+    lines = [line + '\n' for line in data.decode('utf-8', errors='replace').split('\n')[:-1]]
+    # 若没有读到文件或偏移开头，第一行可能不完整，丢弃
+    if pos > start_limit and lines:
+        lines = lines[1:]
+    if len(lines) > max_lines:
+        lines = lines[-max_lines:]
+    return lines, new_offset
+
+def get_channel_log_file(channel_name: str, log_type: str = 'main') -> Path:
+    """
+    获取频道日志文件路径
+    
+    Args:
+        channel_name: 频道名称
+        log_type: 日志类型，'main'或'ytarchive'
+        
+    Returns:
+        Path: 日志文件路径
+    """
+    if log_type == 'main':
+        return Path(f'logs/{channel_name}/main.log')
+    return Path(f'logs/{channel_name}/ytarchive/ytarchive.log')
+
+def get_main_log_file() -> Path:
+    """
+    获取主程序日志文件路径
+    
+    Returns:
+        Path: 日志文件路径
+    """
+    return Path('logs/main/main.log')
+
 def get_channel_logs(channel_name: str, log_type: str = 'main', max_lines: int = 500) -> list:
     """
     读取频道的日志内容
@@ -107,18 +263,9 @@ def get_channel_logs(channel_name: str, log_type: str = 'main', max_lines: int =
     Returns:
         list: 日志行列表
     """
-    if log_type == 'main':
-        log_file = Path(f'logs/{channel_name}/main.log')
-    else:
-        log_file = Path(f'logs/{channel_name}/ytarchive/ytarchive.log')
-    
-    if not log_file.exists():
-        return []
-    
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            return lines[-max_lines:] if len(lines) > max_lines else lines
+        lines, _ = read_log_tail(get_channel_log_file(channel_name, log_type), max_lines)
+        return lines
     except Exception as e:
         return [f"读取日志文件出错: {str(e)}"]
 
@@ -132,14 +279,8 @@ def get_main_logs(max_lines: int = 500) -> list:
     Returns:
         list: 日志行列表
     """
-    log_file = Path('logs/main/main.log')
-    
-    if not log_file.exists():
-        return []
-    
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            return lines[-max_lines:] if len(lines) > max_lines else lines
+        lines, _ = read_log_tail(get_main_log_file(), max_lines)
+        return lines
     except Exception as e:
-        return [f"读取日志文件出错: {str(e)}"] 
\ No newline at end of file
+        return [f"读取日志文件出错: {str(e)}"]
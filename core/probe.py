@@ -0,0 +1,206 @@
+"""
+直播预检模块 - 在完整的 browse 请求前先用低开销的请求判断频道是否可能在直播
+"""
+
+import re
+import random
+import logging
+import threading
+from typing import Dict, Optional, Any, Callable, Awaitable
+
+from core.client import client_pool
+from core.ratelimit import rate_limiter, ThrottledError, THROTTLE_STATUS_CODES, parse_retry_after
+
+# 频道 /live 页面中的 canonical 链接，直播或预约直播时指向 watch?v=
+CANONICAL_PATTERN = re.compile(rb'<link rel="canonical" href="([^"]+)"')
+# 预检最多读取的字节数，找到 canonical 链接后立即停止读取
+PROBE_MAX_BYTES = 512 * 1024
+
+# 同意 cookie 放在请求头中，避免写入直播检查共用的客户端 cookie
+PROBE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Language': 'zh-CN,zh;q=0.9',
+    'Cookie': 'CONSENT=YES+1'
+}
+
+async def probe_live_page(channel_id: str, api_proxy: Optional[str] = None, logger: Optional[logging.Logger] = None) -> Optional[bool]:
+    """
+    请求频道的 /live 页面，只读取到 canonical 链接为止
+
+    Args:
+        channel_id: YouTube频道ID
+        api_proxy: 代理地址
+        logger: 日志记录器
+
+    Returns:
+        Optional[bool]: True 表示可能在直播，False 表示没有直播，None 表示无法判断
+
+    Raises:
+        ThrottledError: 请求被限流（HTTP 429/403）
+    """
+    url = f'https://www.youtube.com/channel/{channel_id}/live'
+    client = client_pool.get_client(api_proxy)
+    await rate_limiter.acquire(api_proxy)
+
+    try:
+        async with client.stream('GET', url, headers=PROBE_HEADERS) as response:
+            if response.status_code in THROTTLE_STATUS_CODES:
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                rate_limiter.on_throttle(api_proxy, retry_after)
+                raise ThrottledError(response.status_code, retry_after)
+            if response.is_redirect:
+                # 只有跳转到视频页才能判断，同意页、登录页、频道地址规范化等跳转无法判断
+                if '/watch?v=' in response.headers.get('Location', ''):
+                    return True
+                if logger:
+                    logger.debug(f"频道 {channel_id} 的 /live 页面跳转到 {response.headers.get('Location')}，无法判断")
+                return None
+            response.raise_for_status()
+
+            data = b""
+            async for chunk in response.aiter_bytes():
+                data += chunk
+                match = CANONICAL_PATTERN.search(data)
+                if match:
+                    return b'/watch?v=' in match.group(1)
+                if len(data) >= PROBE_MAX_BYTES:
+                    break
+    except ThrottledError:
+        raise
+    except Exception as e:
+        if logger:
+            logger.debug(f"频道 {channel_id} 的 /live 页面预检出错: {e}")
+        return None
+
+    if logger:
+        logger.debug(f"频道 {channel_id} 的 /live 页面中没有找到 canonical 链接")
+    return None
+
+# 可用的预检方式，按配置中的顺序尝试
+PROBES: Dict[str, Callable[..., Awaitable[Optional[bool]]]] = {
+    "live_page": probe_live_page,
+}
+
+class ProbeSelector:
+    """记录每个频道各预检方式的准确率，为频道选择可信的预检方式"""
+
+    def __init__(self, probe_config: Dict[str, Any] = None, logger=None):
+        """
+        初始化预检选择器
+
+        Args:
+            probe_config: 预检配置字典，包含enable、order、verifyRate等配置
+            logger: 日志记录器
+        """
+        self.logger = logger
+        # 键为频道ID，值为 {预检方式: {"samples": 次数, "correct": 正确次数}}
+        self.stats: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self.lock = threading.Lock()
+        self.set_config(probe_config or {})
+
+    def set_config(self, probe_config: Dict[str, Any]) -> None:
+        """
+        设置或更新预检配置
+
+        Args:
+            probe_config: 新的预检配置
+        """
+        self.probe_config = probe_config or {}
+        self.enabled = self.probe_config.get('enable', True)
+        self.order = [name for name in self.probe_config.get('order', list(PROBES)) if name in PROBES]
+        # 预检判断为未直播时仍执行完整检查的比例，用于发现漏报
+        self.verify_rate = self.probe_config.get('verifyRate', 0.1)
+        self.min_accuracy = self.probe_config.get('minAccuracy', 0.9)
+        self.min_samples = self.probe_config.get('minSamples', 10)
+        # 准确率不达标的预检仍按该比例执行并与完整检查对比
+        self.sample_rate = self.probe_config.get('sampleRate', 0.05)
+        # 样本数超过该值时样本数和正确数减半，使准确率跟随频道的近期情况
+        self.max_samples = max(self.min_samples, self.probe_config.get('maxSamples', 50))
+
+    def _accuracy(self, stats: Optional[Dict[str, int]]) -> Optional[float]:
+        """计算准确率，样本不足时返回None"""
+        if not stats or stats["samples"] < self.min_samples:
+            return None
+        return stats["correct"] / stats["samples"]
+
+    def choose(self, channel_id: str) -> Optional[str]:
+        """
+        为频道选择预检方式，样本不足或准确率达标的第一个预检方式会被选中
+
+        Args:
+            channel_id: YouTube频道ID
+
+        Returns:
+            Optional[str]: 预检方式名称，为空表示直接执行完整检查
+        """
+        if not self.enabled:
+            return None
+        with self.lock:
+            channel_stats = self.stats.get(channel_id, {})
+            for name in self.order:
+                accuracy = self._accuracy(channel_stats.get(name))
+                if accuracy is None or accuracy >= self.min_accuracy:
+                    return name
+        return None
+
+    def choose_sample(self, channel_id: str) -> Optional[str]:
+        """
+        按 sample_rate 为频道选择一个准确率不达标的预检方式，只用于采样，不据此跳过完整检查
+
+        Args:
+            channel_id: YouTube频道ID
+
+        Returns:
+            Optional[str]: 预检方式名称，本次不采样时为空
+        """
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        with self.lock:
+            channel_stats = self.stats.get(channel_id, {})
+            for name in self.order:
+                accuracy = self._accuracy(channel_stats.get(name))
+                if accuracy is not None and accuracy < self.min_accuracy:
+                    return name
+        return None
+
+    def should_verify(self) -> bool:
+        """预检判断为未直播时，是否仍执行完整检查以验证预检结果"""
+        return random.random() < self.verify_rate
+
+    def record(self, channel_id: str, probe_name: str, predicted: bool, actual: bool):
+        """
+        记录预检结果与完整检查结果的对比，样本数超过 max_samples 时减半以淡化旧样本
+
+        Args:
+            channel_id: YouTube频道ID
+            probe_name: 预检方式名称
+            predicted: 预检判断是否在直播
+            actual: 完整检查是否有直播或预约直播
+        """
+        with self.lock:
+            stats = self.stats.setdefault(channel_id, {}).setdefault(probe_name, {"samples": 0, "correct": 0})
+            stats["samples"] += 1
+            if predicted == actual:
+                stats["correct"] += 1
+            if stats["samples"] > self.max_samples:
+                stats["samples"] //= 2
+                stats["correct"] //= 2
+        if predicted != actual and self.logger:
+            self.logger.info(f"频道 {channel_id} 的预检 {probe_name} 判断{'有' if predicted else '无'}直播，与完整检查结果不符")
+
+    def get_channel_stats(self, channel_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        获取频道各预检方式的统计
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 键为预检方式，值包含 samples、correct、accuracy
+        """
+        with self.lock:
+            channel_stats = self.stats.get(channel_id, {})
+            return {
+                name: {**stats, "accuracy": stats["correct"] / stats["samples"] if stats["samples"] else None}
+                for name, stats in channel_stats.items()
+            }
+
+# 创建全局预检选择器实例
+probe_selector = ProbeSelector()
@@ -4,8 +4,30 @@
 
 import threading
 import time
+import heapq
+import bisect
+import hashlib
+import random
 import asyncio
-from typing import Dict, Optional, Any
+from collections import Counter
+from typing import Dict, List, Optional, Any, Tuple
+
+from core.ratelimit import ThrottledError
+
+# 代理组选择策略
+## roundrobin: 轮询
+## weighted: 按延迟和成功率加权随机
+## p2c: 随机取两个，选择得分更好的一个
+## leastconn: 选择当前活动录制数最少的代理，达到录制上限的代理不参与选择，最近失败过的代理优先避开
+## sticky: 按频道ID一致性哈希到固定代理，代理不可用或最近失败过时只有映射到它的频道会转移
+PROXY_STRATEGIES = ("roundrobin", "weighted", "p2c", "leastconn", "sticky")
+
+# 一致性哈希环上每个代理的虚拟节点数
+HASH_RING_REPLICAS = 100
+
+def _hash_key(key: str) -> int:
+    """计算一致性哈希使用的64位哈希值"""
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
 
 class ProxyManager:
     """代理管理器类，处理代理选择和轮询"""
@@ -22,16 +44,50 @@ class ProxyManager:
         self.logger = logger
         self.api_counters = {}  # 每个组的API代理计数器
         self.yta_counters = {}  # 每个组的YTA代理计数器
-        self.lock = threading.Lock()  # 用于线程安全的锁
+        self.lock = threading.RLock()  # 用于线程安全的锁
         
-        # 禁用代理相关的属性
+        # 在 set_config 中预先解析的代理组，键为组名，值为组内代理URL列表
+        self.group_index: Dict[str, List[str]] = {}
+        # 每个代理组的一致性哈希环，值为 (排序后的哈希值列表, 对应的代理URL列表)
+        self.hash_rings: Dict[str, Tuple[List[int], List[str]]] = {}
+        
+        # 熔断器相关的属性
+        ## 连续失败达到阈值后熔断(open)，键为代理URL，值为熔断时间戳
+        ## 熔断超过 disable_duration 后进入半开(half-open)状态，每隔 half_open_interval 放行一次真实请求
+        ## 半开状态下请求或探测成功则恢复(closed)，失败则重新熔断
         self.disabled_proxies = {}
-        self.disable_duration = 3600
-        self.test_tasks = {}
+        self.disable_duration = 60
+        self.failure_threshold = 3
+        self.half_open_interval = 10
+        self.proxy_failures: Dict[str, int] = {}
+        # 代理最近一次失败的时间戳，失败后 disable_duration 内 sticky 和 leastconn 策略优先避开该代理
+        self.failure_times: Dict[str, float] = {}
+        # 当前不可选择的代理（熔断中或半开状态下等待下次放行），值为恢复可选的时间戳
+        self.blocked_until: Dict[str, float] = {}
+        # 恢复可选时间的最小堆，元素为 (时间戳, 代理URL)，与 blocked_until 不一致的元素已过期
+        self.expiry_heap: List[Tuple[float, str]] = []
+        
+        # 每个代理上正在进行的 ytarchive 录制数
+        self.active_recordings = Counter()
+        # 每个代理的最大同时录制数，0 表示不限制
+        self.max_recordings = 0
+        self.recording_caps: Dict[str, int] = {}
+        
+        # 后台健康探测相关的属性
+        self.probe_interval = 300
+        self.probe_concurrency = 10
+        self.last_probe_times: Dict[str, float] = {}
+        self.probe_task = None
         
         # 测试用的YouTube频道ID
         self.test_channel_id = "UC7Vl0YiY0rDlovqcCFN4yTA"
         
+        # 代理质量统计，键为代理URL，值包含延迟和成功率的指数加权平均
+        self.proxy_stats: Dict[str, Dict[str, float]] = {}
+        self.ewma_alpha = 0.3
+        # 没有统计数据的代理使用的默认延迟(秒)
+        self.default_latency = 1.0
+        
         if self.logger:
             self.logger.info("代理管理器初始化完成")
     
@@ -43,9 +99,13 @@ class ProxyManager:
             proxy_config: 新的代理配置
         """
         self.proxy_config = proxy_config
-        # 重置计数器
-        self.api_counters = {}
-        self.yta_counters = {}
+        self._build_index(proxy_config)
+        self.ewma_alpha = proxy_config.get('ewmaAlpha', 0.3)
+        self.failure_threshold = max(1, proxy_config.get('failureThreshold', 3))
+        self.disable_duration = proxy_config.get('openDuration', 60)
+        self.half_open_interval = proxy_config.get('halfOpenInterval', 10)
+        self.probe_interval = proxy_config.get('probeInterval', 300)
+        self.probe_concurrency = max(1, proxy_config.get('probeConcurrency', 10))
         
         if self.logger:
             self.logger.info("代理配置已更新")
@@ -59,12 +119,55 @@ class ProxyManager:
                             proxy_names.append(str(p))
                     self.logger.info(f"代理组 '{group_name}' 包含 {len(proxies)} 个代理: {', '.join(proxy_names)}")
     
-    def get_api_proxy(self, group_name: Optional[str] = None) -> Optional[str]:
+    def _build_index(self, proxy_config: Dict[str, Any]) -> None:
+        """
+        解析代理组配置，选择代理时不再重复遍历和解析组配置
+        
+        Args:
+            proxy_config: 代理配置
+        """
+        group_index = {}
+        proxy_names = {}
+        for group_name, proxy_group in (proxy_config.get('groups') or {}).items():
+            proxy_urls = []
+            for proxy_item in proxy_group or []:
+                proxy_url = self._extract_proxy_url(proxy_item)
+                if proxy_url:
+                    proxy_urls.append(proxy_url)
+                    if isinstance(proxy_item, dict):
+                        proxy_names[next(iter(proxy_item.keys()))] = proxy_url
+            group_index[group_name] = proxy_urls
+        
+        hash_rings = {}
+        for group_name, proxy_urls in group_index.items():
+            ring = sorted(
+                (_hash_key(f"{proxy_url}#{replica}"), proxy_url)
+                for proxy_url in dict.fromkeys(proxy_urls)
+                for replica in range(HASH_RING_REPLICAS)
+            )
+            hash_rings[group_name] = ([h for h, _ in ring], [url for _, url in ring])
+        
+        # 录制上限可以用代理名称或URL指定
+        recording_caps = {}
+        for key, cap in (proxy_config.get('recordingCaps') or {}).items():
+            recording_caps[proxy_names.get(key, key)] = int(cap)
+        
+        with self.lock:
+            self.group_index = group_index
+            self.hash_rings = hash_rings
+            self.max_recordings = int(proxy_config.get('maxRecordings', 0) or 0)
+            self.recording_caps = recording_caps
+            # 重置计数器
+            self.api_counters = {}
+            self.yta_counters = {}
+    
+    def get_api_proxy(self, group_name: Optional[str] = None, channel_key: Optional[str] = None) -> Optional[str]:
         """
         获取API代理
         
         Args:
             group_name: 指定的代理组名，如果为None则使用配置中默认的api代理组
+            channel_key: 频道ID，sticky 策略下同一频道总是映射到同一代理
             
         Returns:
             选择的代理URL或None（表示不使用代理）
@@ -78,8 +181,8 @@ class ProxyManager:
             
             # 如果配置中的值看起来像URL（包含://)，直接返回
             if isinstance(config_api, str) and "://" in config_api:
-                # 检查该代理是否被禁用
-                if config_api in self.disabled_proxies:
+                # 检查该代理是否处于熔断状态，半开状态下按间隔放行
+                if not self._try_acquire(config_api):
                     if self.logger:
                         self.logger.warning(f"直接配置的API代理 {config_api} 已被禁用，将不使用代理")
                     return None
@@ -97,17 +200,20 @@ class ProxyManager:
             return None
             
         # 从组中选择代理
-        proxy = self._select_proxy_from_group(group_name, is_api=True)
+        proxy = self._select_proxy_from_group(group_name, is_api=True, channel_key=channel_key)
         if self.logger:
             self.logger.debug(f"为API请求选择代理: {proxy or '无代理'} (来自组 '{group_name}')")
         return proxy
     
-    def get_yta_proxy(self, group_name: Optional[str] = None) -> Optional[str]:
+    def get_yta_proxy(self, group_name: Optional[str] = None, channel_key: Optional[str] = None,
+                      exclude: Optional[str] = None) -> Optional[str]:
         """
         获取YTA代理
         
         Args:
             group_name: 指定的代理组名，如果为None则使用配置中默认的yta代理组
+            channel_key: 频道ID，sticky 策略下同一频道总是映射到同一代理
+            exclude: 本次不选择的代理URL，用于换代理重启，组内没有其他可选代理时仍可能选中
             
         Returns:
             选择的代理URL或None（表示不使用代理）
@@ -121,8 +227,8 @@ class ProxyManager:
             
             # 如果配置中的值看起来像URL（包含://)，直接返回
             if isinstance(config_yta, str) and "://" in config_yta:
-                # 检查该代理是否被禁用
-                if config_yta in self.disabled_proxies:
+                # 检查该代理是否处于熔断状态，半开状态下按间隔放行
+                if not self._try_acquire(config_yta):
                     if self.logger:
                         self.logger.warning(f"直接配置的YTA代理 {config_yta} 已被禁用，将不使用代理")
                     return None
@@ -140,92 +246,345 @@ class ProxyManager:
             return None
             
         # 从组中选择代理
-        proxy = self._select_proxy_from_group(group_name, is_api=False)
+        proxy = self._select_proxy_from_group(group_name, is_api=False, channel_key=channel_key, exclude=exclude)
         if self.logger:
             self.logger.debug(f"为YTA请求选择代理: {proxy or '无代理'} (来自组 '{group_name}')")
         return proxy
     
-    def _select_proxy_from_group(self, group_name: str, is_api: bool = True) -> Optional[str]:
+    def _select_proxy_from_group(self, group_name: str, is_api: bool = True, channel_key: Optional[str] = None,
+                                 exclude: Optional[str] = None) -> Optional[str]:
         """
-        从指定的代理组中选择一个代理，会跳过被禁用的代理
+        从指定的代理组中选择一个代理，会跳过熔断中的代理，半开状态的代理按间隔放行
         
         Args:
             group_name: 代理组名
             is_api: 是否为API代理（影响使用哪个计数器）
+            channel_key: 频道ID，用于 sticky 策略，为空时 sticky 退化为轮询
+            exclude: 优先避开的代理URL，组内没有其他可选代理时不生效
             
         Returns:
             选择的代理URL或None
         """
-        if not group_name or not self.proxy_config:
+        if not group_name:
             return None
             
-        groups = self.proxy_config.get('groups', {})
-        proxy_group = groups.get(group_name, [])
-        
-        if not proxy_group:
-            return None
+        now = time.time()
+        half_open = False
+        with self.lock:
+            proxy_urls = self.group_index.get(group_name)
+            if not proxy_urls:
+                return None
+                
+            self._release_expired(now)
+            strategy = self.get_group_strategy(group_name)
+            if strategy == "sticky" and not channel_key:
+                strategy = "roundrobin"
+            # 录制时优先避开已达到录制上限的代理
+            if not is_api and strategy != "leastconn" and (self.max_recordings or self.recording_caps):
+                proxy_urls = [url for url in proxy_urls if self._has_recording_slot(url)] or proxy_urls
+            if exclude:
+                proxy_urls = self._prefer_available([url for url in proxy_urls if url != exclude], proxy_urls)
+            if strategy in ("sticky", "leastconn"):
+                # 未达到熔断阈值的失败代理仍然可选，sticky 会一直固定在失败的代理上，
+                # leastconn 下失败代理的录制结束后录制数最少，又会被优先选中
+                proxy_urls = self._prefer_available(self._recently_ok(proxy_urls, now), proxy_urls)
+            if strategy == "sticky":
+                proxy_url = self._select_sticky(group_name, proxy_urls, channel_key)
+            elif strategy == "roundrobin":
+                proxy_url = self._select_round_robin(group_name, proxy_urls, is_api)
+            elif strategy == "leastconn":
+                proxy_url = self._select_least_recordings(proxy_urls)
+            else:
+                proxy_url = self._select_by_stats(proxy_urls, strategy)
             
-        # 获取所有可用的代理（排除被禁用的）
-        available_proxies = []
-        disabled_proxies = []
-        
-        for idx, proxy_item in enumerate(proxy_group):
-            proxy_url = self._extract_proxy_url(proxy_item)
-            if proxy_url:
-                if proxy_url in self.disabled_proxies:
-                    # 检查是否已经过了禁用期
-                    disable_time = self.disabled_proxies[proxy_url]
-                    if time.time() - disable_time >= self.disable_duration:
-                        # 禁用期已过，开始测试该代理
-                        if self.logger:
-                            self.logger.info(f"代理 {proxy_url} 禁用期已过，将进行测试")
-                        self._schedule_proxy_test(proxy_url)
-                        # 仍然记为禁用状态，直到测试通过
-                        disabled_proxies.append((idx, proxy_url))
-                    else:
-                        disabled_proxies.append((idx, proxy_url))
-                else:
-                    available_proxies.append((idx, proxy_url))
-        
-        # 如果没有可用代理，且有禁用代理，记录警告并返回None
-        if not available_proxies:
-            if disabled_proxies:
-                if self.logger:
-                    self.logger.warning(f"代理组 '{group_name}' 中所有代理({len(disabled_proxies)}个)都被禁用，无法提供代理")
-            return None
+            # 半开状态的代理放行这一次后，等待 half_open_interval 再放行下一次
+            if proxy_url and proxy_url in self.disabled_proxies:
+                self._block(proxy_url, now + self.half_open_interval)
+                half_open = True
+        
+        if self.logger:
+            if proxy_url is None:
+                self.logger.warning(f"代理组 '{group_name}' 中所有代理({len(proxy_urls)}个)都被禁用，无法提供代理")
+            elif half_open:
+                self.logger.info(f"代理 {proxy_url} 处于半开状态，放行一次请求进行验证")
+        return proxy_url
+    
+    def _prefer_available(self, preferred: List[str], proxy_urls: List[str]) -> List[str]:
+        """preferred 中有未被禁用的代理时返回 preferred，否则返回完整列表，调用方需持有锁"""
+        if any(url not in self.blocked_until for url in preferred):
+            return preferred
+        return proxy_urls
+    
+    def _recently_ok(self, proxy_urls: List[str], now: float) -> List[str]:
+        """过滤掉 disable_duration 内失败过且尚未恢复的代理，调用方需持有锁"""
+        return [url for url in proxy_urls
+                if url not in self.proxy_failures or now - self.failure_times.get(url, 0) >= self.disable_duration]
+    
+    def _select_round_robin(self, group_name: str, proxy_urls: List[str], is_api: bool) -> Optional[str]:
+        """
+        从计数器位置开始轮询，返回第一个可选的代理，调用方需持有锁
+        
+        Args:
+            group_name: 代理组名
+            proxy_urls: 组内代理URL列表
+            is_api: 是否为API代理（影响使用哪个计数器）
             
-        # 选择计数器
+        Returns:
+            选择的代理URL或None
+        """
         counters = self.api_counters if is_api else self.yta_counters
+        size = len(proxy_urls)
+        start = counters.get(group_name, 0) % size
+        for offset in range(size):
+            idx = (start + offset) % size
+            proxy_url = proxy_urls[idx]
+            if proxy_url not in self.blocked_until:
+                counters[group_name] = (idx + 1) % size
+                return proxy_url
+        return None
+    
+    def _select_sticky(self, group_name: str, proxy_urls: List[str], channel_key: str) -> Optional[str]:
+        """
+        在一致性哈希环上从频道ID的位置顺时针查找第一个可选的代理，调用方需持有锁
         
-        # 线程安全地获取和更新计数器
-        with self.lock:
-            # 初始化计数器（如果不存在）
-            if group_name not in counters:
-                counters[group_name] = 0
-                
-            # 获取当前计数并递增
-            current_counter = counters[group_name]
+        Args:
+            group_name: 代理组名
+            proxy_urls: 可参与选择的代理URL列表
+            channel_key: 频道ID
             
-            # 在可用代理中找到合适的代理
-            proxy_idx = None
-            proxy_url = None
+        Returns:
+            选择的代理URL或None
+        """
+        ring_hashes, ring_urls = self.hash_rings[group_name]
+        if not ring_hashes:
+            return None
+        # 代理列表被录制上限过滤过时，只在剩余的代理中选择
+        allowed = set(proxy_urls) if len(proxy_urls) < len(self.group_index[group_name]) else None
+        ring_size = len(ring_hashes)
+        start = bisect.bisect(ring_hashes, _hash_key(channel_key))
+        skipped = set()
+        for offset in range(ring_size):
+            proxy_url = ring_urls[(start + offset) % ring_size]
+            if proxy_url in skipped:
+                continue
+            if proxy_url not in self.blocked_until and (allowed is None or proxy_url in allowed):
+                return proxy_url
+            skipped.add(proxy_url)
+            # 所有代理都已检查过
+            if len(skipped) * HASH_RING_REPLICAS >= ring_size:
+                break
+        return None
+    
+    def _select_least_recordings(self, proxy_urls: List[str]) -> Optional[str]:
+        """
+        选择活动录制数最少的代理，录制数相同时选择得分更好的，调用方需持有锁
+        
+        优先在未达到录制上限的代理中选择，全部达到上限时仍返回录制数最少的代理
+        
+        Args:
+            proxy_urls: 组内代理URL列表
             
-            # 尝试找到一个当前计数之后的可用代理
-            for idx, url in available_proxies:
-                if idx >= current_counter:
-                    proxy_idx = idx
-                    proxy_url = url
-                    break
+        Returns:
+            选择的代理URL或None
+        """
+        available = [url for url in proxy_urls if url not in self.blocked_until]
+        if not available:
+            return None
+        under_cap = [url for url in available if self._has_recording_slot(url)]
+        return min(under_cap or available, key=lambda url: (self.active_recordings[url], self._proxy_score(url)))
+    
+    def _block(self, proxy_url: str, until: float) -> None:
+        """将代理设为不可选择直到指定时间，调用方需持有锁"""
+        self.blocked_until[proxy_url] = until
+        heapq.heappush(self.expiry_heap, (until, proxy_url))
+    
+    def _unblock(self, proxy_url: str) -> None:
+        """立即恢复代理为可选择，堆中对应的元素在弹出时忽略，调用方需持有锁"""
+        self.blocked_until.pop(proxy_url, None)
+    
+    def _release_expired(self, now: float) -> None:
+        """弹出所有已到期的元素，恢复对应代理为可选择，调用方需持有锁"""
+        heap = self.expiry_heap
+        while heap and heap[0][0] <= now:
+            until, proxy_url = heapq.heappop(heap)
+            if self.blocked_until.get(proxy_url) == until:
+                del self.blocked_until[proxy_url]
+    
+    def get_group_strategy(self, group_name: str) -> str:
+        """
+        获取代理组的选择策略，优先使用 strategies 中的组配置，其次使用全局 strategy
+        
+        Args:
+            group_name: 代理组名
             
-            # 如果没找到，取第一个可用代理
-            if proxy_idx is None and available_proxies:
-                proxy_idx, proxy_url = available_proxies[0]
+        Returns:
+            str: 选择策略
+        """
+        strategy = (self.proxy_config.get('strategies') or {}).get(group_name) or self.proxy_config.get('strategy', 'roundrobin')
+        if strategy not in PROXY_STRATEGIES:
+            if self.logger:
+                self.logger.warning(f"未知的代理选择策略 '{strategy}'，将使用轮询")
+            return "roundrobin"
+        return strategy
+    
+    def _proxy_score(self, proxy_url: str) -> float:
+        """
+        计算代理的预期开销，越小越好，调用方需持有锁
+        
+        以平均延迟除以成功率估算，没有统计数据的代理按默认延迟和全部成功处理
+        """
+        stats = self.proxy_stats.get(proxy_url)
+        if not stats:
+            return self.default_latency
+        return stats["latency"] / max(stats["success_rate"], 0.05)
+    
+    def _select_by_stats(self, proxy_urls: List[str], strategy: str) -> Optional[str]:
+        """
+        根据代理统计数据选择代理，跳过不可选择的代理，调用方需持有锁
+        
+        Args:
+            proxy_urls: 组内代理URL列表
+            strategy: weighted 或 p2c
             
-            # 更新计数器
-            if proxy_idx is not None:
-                counters[group_name] = (proxy_idx + 1) % len(proxy_group)
+        Returns:
+            选择的代理URL或None
+        """
+        blocked = self.blocked_until
+        if strategy == "p2c":
+            # 先随机抽样，只有抽到的大多不可用时才过滤整个组
+            candidates = []
+            for _ in range(4):
+                proxy_url = random.choice(proxy_urls)
+                if proxy_url not in blocked and proxy_url not in candidates:
+                    candidates.append(proxy_url)
+                    if len(candidates) == 2:
+                        break
+            if len(candidates) < 2:
+                available = [url for url in proxy_urls if url not in blocked]
+                if len(available) <= 1:
+                    return available[0] if available else None
+                candidates = random.sample(available, 2)
+            first, second = candidates
+            return first if self._proxy_score(first) <= self._proxy_score(second) else second
+        
+        available = [url for url in proxy_urls if url not in blocked]
+        if len(available) <= 1:
+            return available[0] if available else None
+        weights = [1.0 / max(self._proxy_score(url), 0.001) for url in available]
+        return random.choices(available, weights=weights, k=1)[0]
+    
+    def record_result(self, proxy_url: Optional[str], success: bool, latency: Optional[float] = None) -> None:
+        """
+        记录一次代理请求的结果，更新延迟和成功率的指数加权平均
+        
+        Args:
+            proxy_url: 使用的代理URL，为空时不记录
+            success: 请求是否成功
+            latency: 请求耗时(秒)，仅在成功时计入延迟
+        """
+        if not proxy_url:
+            return
             
-        return proxy_url
+        alpha = self.ewma_alpha
+        with self.lock:
+            stats = self.proxy_stats.get(proxy_url)
+            if stats is None:
+                stats = {
+                    "latency": latency if (success and latency is not None) else self.default_latency,
+                    "success_rate": 1.0 if success else 0.0,
+                    "samples": 0,
+                }
+                self.proxy_stats[proxy_url] = stats
+            else:
+                if success and latency is not None:
+                    stats["latency"] = alpha * latency + (1 - alpha) * stats["latency"]
+                stats["success_rate"] = alpha * (1.0 if success else 0.0) + (1 - alpha) * stats["success_rate"]
+            stats["samples"] += 1
+            stats["last_time"] = time.time()
+        
+        # 成功的真实请求同时关闭熔断，半开状态下放行的请求由此恢复代理
+        if success:
+            self.mark_proxy_success(proxy_url)
+    
+    def get_recording_cap(self, proxy_url: str) -> int:
+        """获取代理的最大同时录制数，0 表示不限制"""
+        return self.recording_caps.get(proxy_url, self.max_recordings)
+    
+    def _has_recording_slot(self, proxy_url: str) -> bool:
+        """代理是否还能承担新的录制，调用方需持有锁"""
+        cap = self.get_recording_cap(proxy_url)
+        return cap <= 0 or self.active_recordings[proxy_url] < cap
+    
+    def acquire_recording(self, proxy_url: Optional[str]) -> None:
+        """
+        记录代理上开始了一个录制，进程退出时需要调用 release_recording
+        
+        Args:
+            proxy_url: ytarchive 使用的代理URL，为空时不记录
+        """
+        if not proxy_url:
+            return
+        with self.lock:
+            self.active_recordings[proxy_url] += 1
+    
+    def release_recording(self, proxy_url: Optional[str]) -> None:
+        """
+        记录代理上的一个录制已结束
+        
+        Args:
+            proxy_url: ytarchive 使用的代理URL，为空时不记录
+        """
+        if not proxy_url:
+            return
+        with self.lock:
+            self.active_recordings[proxy_url] -= 1
+            if self.active_recordings[proxy_url] <= 0:
+                del self.active_recordings[proxy_url]
+    
+    def get_active_recordings(self) -> Dict[str, int]:
+        """
+        获取每个代理上正在进行的录制数
+        
+        Returns:
+            Dict[str, int]: 键为代理URL，值为录制数
+        """
+        with self.lock:
+            return dict(self.active_recordings)
+    
+    def has_yta_capacity(self) -> bool:
+        """
+        检查YTA代理是否还能承担新的录制
+        
+        所有可用的YTA代理都达到录制上限时返回 False，调用方应等待已有录制结束后再启动；
+        没有配置YTA代理或没有可用代理时返回 True，由 get_yta_proxy 决定是否使用代理
+        
+        Returns:
+            bool: 是否可以启动新的录制
+        """
+        config_yta = self.proxy_config.get('yta')
+        if not config_yta:
+            return True
+        now = time.time()
+        with self.lock:
+            if not self.max_recordings and not self.recording_caps:
+                return True
+            self._release_expired(now)
+            if isinstance(config_yta, str) and "://" in config_yta:
+                proxy_urls = [config_yta]
+            else:
+                proxy_urls = self.group_index.get(config_yta) or []
+            available = [url for url in proxy_urls if url not in self.blocked_until]
+            return not available or any(self._has_recording_slot(url) for url in available)
+    
+    def get_proxy_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        获取所有代理的统计数据
+        
+        Returns:
+            Dict[str, Dict[str, float]]: 键为代理URL，值包含 latency、success_rate、samples、last_time
+        """
+        with self.lock:
+            return {url: stats.copy() for url, stats in self.proxy_stats.items()}
     
     def _extract_proxy_url(self, proxy_item: Any) -> Optional[str]:
         """
@@ -257,54 +616,223 @@ class ProxyManager:
             
         return proxy
     
-    def mark_proxy_failed(self, proxy_url: str, error_message: str = "") -> None:
+    def _circuit_state(self, proxy_url: str, now: Optional[float] = None) -> str:
+        """
+        获取代理的熔断状态，调用方需持有锁
+        
+        Returns:
+            str: closed、open 或 half_open
+        """
+        disable_time = self.disabled_proxies.get(proxy_url)
+        if disable_time is None:
+            return "closed"
+        if (now or time.time()) - disable_time >= self.disable_duration:
+            return "half_open"
+        return "open"
+    
+    def get_circuit_state(self, proxy_url: str) -> str:
         """
-        标记代理为失败状态，禁用该代理一段时间
+        获取代理的熔断状态
+        
+        Args:
+            proxy_url: 代理URL
+            
+        Returns:
+            str: closed（正常）、open（熔断）或 half_open（半开，按间隔放行请求）
+        """
+        with self.lock:
+            return self._circuit_state(proxy_url)
+    
+    def get_proxy_failures(self, proxy_url: str) -> int:
+        """获取代理当前的连续失败次数"""
+        with self.lock:
+            return self.proxy_failures.get(proxy_url, 0)
+    
+    def _try_acquire(self, proxy_url: str) -> bool:
+        """
+        判断代理当前是否可以使用，半开状态的代理在放行间隔到达时占用一次放行机会
+        
+        Args:
+            proxy_url: 代理URL
+            
+        Returns:
+            bool: 是否可以使用
+        """
+        now = time.time()
+        with self.lock:
+            self._release_expired(now)
+            if proxy_url in self.blocked_until:
+                return False
+            if proxy_url not in self.disabled_proxies:
+                return True
+            self._block(proxy_url, now + self.half_open_interval)
+        if self.logger:
+            self.logger.info(f"代理 {proxy_url} 处于半开状态，放行一次请求进行验证")
+        return True
+    
+    def mark_proxy_failed(self, proxy_url: str, error_message: str = "", force: bool = False) -> None:
+        """
+        记录代理的一次失败，连续失败达到阈值或半开状态下失败时熔断该代理
         
         Args:
             proxy_url: 失败的代理URL
             error_message: 错误信息
+            force: 是否立即熔断，用于手动禁用等场景
         """
         if not proxy_url:
             return
             
         with self.lock:
             current_time = time.time()
-            self.disabled_proxies[proxy_url] = current_time
+            failures = self.proxy_failures.get(proxy_url, 0) + 1
+            self.proxy_failures[proxy_url] = failures
+            self.failure_times[proxy_url] = current_time
+            opened = force or proxy_url in self.disabled_proxies or failures >= self.failure_threshold
+            if opened:
+                self.disabled_proxies[proxy_url] = current_time
+                self._block(proxy_url, current_time + self.disable_duration)
         
         if self.logger:
-            disable_time_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(current_time))
-            expiry_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(current_time + self.disable_duration))
             error_info = f" ({error_message})" if error_message else ""
-            self.logger.warning(f"代理 {proxy_url} 已标记为失败{error_info}，禁用至 {expiry_time}")
+            if opened:
+                expiry_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(current_time + self.disable_duration))
+                self.logger.warning(f"代理 {proxy_url} 已标记为失败{error_info}，连续失败 {failures} 次，熔断至 {expiry_time}")
+            else:
+                self.logger.warning(f"代理 {proxy_url} 请求失败{error_info}，连续失败 {failures}/{self.failure_threshold} 次")
     
-    def _schedule_proxy_test(self, proxy_url: str) -> None:
+    def mark_proxy_success(self, proxy_url: str) -> None:
         """
-        安排一个异步任务来测试代理
+        记录代理的一次成功，清零连续失败次数并关闭熔断
         
         Args:
-            proxy_url: 要测试的代理URL
+            proxy_url: 成功的代理URL
         """
-        # 如果已经有测试任务在运行，不再创建新任务
-        if proxy_url in self.test_tasks and not self.test_tasks[proxy_url].done():
+        if not proxy_url:
             return
             
-        # 创建一个新的测试任务
-        try:
-            loop = asyncio.get_event_loop()
-            task = loop.create_task(self._test_proxy(proxy_url))
-            self.test_tasks[proxy_url] = task
-        except RuntimeError:
-            # 如果没有运行中的事件循环，使用线程执行测试
+        with self.lock:
+            self.proxy_failures.pop(proxy_url, None)
+            self.failure_times.pop(proxy_url, None)
+            self._unblock(proxy_url)
+            recovered = self.disabled_proxies.pop(proxy_url, None) is not None
+        
+        if recovered and self.logger:
+            self.logger.info(f"代理 {proxy_url} 请求成功，已重新启用")
+    
+    def enable_proxy(self, proxy_url: str) -> bool:
+        """
+        手动启用代理，清除熔断状态
+        
+        Args:
+            proxy_url: 代理URL
+            
+        Returns:
+            bool: 代理之前是否处于禁用状态
+        """
+        with self.lock:
+            self.proxy_failures.pop(proxy_url, None)
+            self.failure_times.pop(proxy_url, None)
+            self._unblock(proxy_url)
+            return self.disabled_proxies.pop(proxy_url, None) is not None
+    
+    def get_all_proxy_urls(self) -> List[str]:
+        """
+        获取配置中的所有代理URL，包括各代理组和直接配置的代理
+        
+        Returns:
+            List[str]: 去重后的代理URL列表
+        """
+        proxy_urls = []
+        for key in ('api', 'yta'):
+            value = self.proxy_config.get(key)
+            if isinstance(value, str) and "://" in value:
+                proxy_urls.append(value)
+        with self.lock:
+            for group_urls in self.group_index.values():
+                proxy_urls.extend(group_urls)
+        return list(dict.fromkeys(proxy_urls))
+    
+    def _probe_due(self, proxy_url: str, now: float) -> bool:
+        """
+        判断代理是否需要探测，调用方需持有锁
+        
+        半开状态的代理每隔 half_open_interval 探测一次，正常代理每隔 probe_interval 探测一次，熔断中的代理不探测
+        """
+        state = self._circuit_state(proxy_url, now)
+        if state == "open":
+            return False
+        interval = self.half_open_interval if state == "half_open" else self.probe_interval
+        if interval <= 0:
+            return False
+        return now - self.last_probe_times.get(proxy_url, 0) >= interval
+    
+    async def probe_proxies(self) -> Dict[str, bool]:
+        """
+        并发探测所有到期的代理，更新熔断状态
+        
+        Returns:
+            Dict[str, bool]: 键为探测的代理URL，值为是否可用
+        """
+        proxy_urls = self.get_all_proxy_urls()
+        now = time.time()
+        with self.lock:
+            targets = [url for url in proxy_urls if self._probe_due(url, now)]
+            for url in targets:
+                self.last_probe_times[url] = now
+        
+        if not targets:
+            return {}
+            
+        semaphore = asyncio.Semaphore(self.probe_concurrency)
+        
+        async def probe(proxy_url):
+            async with semaphore:
+                return await self._test_proxy(proxy_url)
+        
+        results = await asyncio.gather(*(probe(url) for url in targets), return_exceptions=True)
+        return {url: result is True for url, result in zip(targets, results)}
+    
+    async def _probe_loop(self):
+        """后台代理健康探测循环"""
+        while True:
+            try:
+                await self.probe_proxies()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"代理健康探测出错: {e}")
+            # 以半开探测间隔为步长检查，保证熔断到期的代理能在几秒内恢复
+            await asyncio.sleep(max(1, min(self.half_open_interval, self.probe_interval or self.half_open_interval)))
+    
+    def start_health_prober(self):
+        """启动后台代理健康探测任务"""
+        if self.probe_task is None or self.probe_task.done():
+            self.probe_task = asyncio.create_task(self._probe_loop())
+            if self.logger:
+                self.logger.info("已启动代理健康探测任务")
+    
+    def stop_health_prober(self):
+        """停止后台代理健康探测任务"""
+        if self.probe_task and not self.probe_task.done():
+            self.probe_task.cancel()
             if self.logger:
-                self.logger.debug(f"无法在当前线程创建异步任务，将在下次代理请求时测试代理 {proxy_url}")
+                self.logger.info("已停止代理健康探测任务")
+        self.probe_task = None
+    
+    def is_health_prober_running(self) -> bool:
+        """检查代理健康探测任务是否在运行"""
+        return self.probe_task is not None and not self.probe_task.done()
     
-    async def _test_proxy(self, proxy_url: str) -> None:
+    async def _test_proxy(self, proxy_url: str) -> bool:
         """
         测试代理是否可用，使用YouTube频道检查功能进行实际测试
         
         Args:
             proxy_url: 要测试的代理URL
+            
+        Returns:
+            bool: 代理是否可用
         """
         if self.logger:
             self.logger.debug(f"开始使用YouTube API测试代理 {proxy_url}")
@@ -320,33 +848,21 @@ class ProxyManager:
                 logger=self.logger
             )
             
-            # 检查结果
-            if result is not None:  # 即使没有直播，只要能成功请求到数据就算成功
-                # 测试成功，移除禁用状态
-                with self.lock:
-                    if proxy_url in self.disabled_proxies:
-                        del self.disabled_proxies[proxy_url]
-                if self.logger:
-                    self.logger.info(f"代理 {proxy_url} 通过YouTube API测试成功，已重新启用")
+            # 即使没有直播，只要能成功请求到数据就算成功
+            if result is not None:
+                self.mark_proxy_success(proxy_url)
                 return True
-            else:
-                # 测试失败，更新禁用时间
-                current_time = time.time()
-                with self.lock:
-                    self.disabled_proxies[proxy_url] = current_time
-                if self.logger:
-                    expiry_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(current_time + self.disable_duration))
-                    self.logger.warning(f"代理 {proxy_url} 无法获取YouTube数据，继续禁用至 {expiry_time}")
-                return False
+            self.mark_proxy_failed(proxy_url, "健康探测无法获取YouTube数据")
+            return False
+        
+        except ThrottledError:
+            # 被限流说明代理可以连通，交给限速器处理，不改变熔断状态
+            if self.logger:
+                self.logger.info(f"代理 {proxy_url} 健康探测被限流，跳过本次探测")
+            return True
                 
         except Exception as e:
-            # 测试出错，更新禁用时间
-            current_time = time.time()
-            with self.lock:
-                self.disabled_proxies[proxy_url] = current_time
-            if self.logger:
-                expiry_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(current_time + self.disable_duration))
-                self.logger.warning(f"代理 {proxy_url} 测试YouTube API失败 (错误: {e})，继续禁用至 {expiry_time}")
+            self.mark_proxy_failed(proxy_url, f"健康探测出错: {e}")
             return False
     
     async def test_proxy_with_youtube(self, proxy_url: str) -> Dict[str, Any]:
@@ -381,9 +897,7 @@ class ProxyManager:
             
             # 检查结果
             if result is not None:  # 即使没有直播，只要能成功请求到数据就算成功
-                with self.lock:
-                    if proxy_url in self.disabled_proxies:
-                        del self.disabled_proxies[proxy_url]
+                self.mark_proxy_success(proxy_url)
                 
                 self.logger.info(f"代理 {proxy_url} 通过YouTube API测试成功，响应时间: {elapsed:.2f}秒")
                 return {
@@ -399,6 +913,13 @@ class ProxyManager:
                     "message": "代理无法获取YouTube数据，请求失败",
                     "response_time": elapsed
                 }
+        except ThrottledError as e:
+            self.logger.warning(f"使用YouTube API测试代理 {proxy_url} 时{e}")
+            return {
+                "status": "throttled",
+                "message": f"代理可以连通，但{e}",
+                "error": str(e)
+            }
         except Exception as e:
             self.logger.error(f"使用YouTube API测试代理 {proxy_url} 时出错: {e}")
             return {
@@ -409,10 +930,10 @@ class ProxyManager:
     
     def get_disabled_proxies(self) -> Dict[str, float]:
         """
-        获取当前被禁用的代理列表
+        获取当前被禁用的代理列表，包括熔断和半开状态的代理
         
         Returns:
-            Dict[str, float]: 键为代理URL，值为禁用时间戳
+            Dict[str, float]: 键为代理URL，值为熔断时间戳
         """
         with self.lock:
             return self.disabled_proxies.copy()
@@ -423,6 +944,10 @@ class ProxyManager:
         """
         with self.lock:
             self.disabled_proxies.clear()
+            self.proxy_failures.clear()
+            self.failure_times.clear()
+            self.blocked_until.clear()
+            self.expiry_heap.clear()
         if self.logger:
             self.logger.info("已清除所有被禁用的代理")
 
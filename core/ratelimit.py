@@ -0,0 +1,184 @@
+"""
+请求限速模块 - 为每个代理（以及直连出口）维护令牌桶，遇到 429/403 时按 AIMD 调整速率
+"""
+
+import time
+import asyncio
+import threading
+from typing import Dict, Optional, Any
+
+# 视为被限流的HTTP状态码
+THROTTLE_STATUS_CODES = (429, 403)
+
+class ThrottledError(Exception):
+    """请求被YouTube限流，代理本身可用，不应计为代理失败"""
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"请求被限流 (HTTP {status_code})")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """令牌桶，速率可动态调整"""
+
+    def __init__(self, rate: float, burst: float):
+        """
+        初始化令牌桶
+
+        Args:
+            rate: 每秒补充的令牌数
+            burst: 桶容量
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        # 被限流后暂停发放令牌直到该时间
+        self.paused_until = 0.0
+        self.throttle_count = 0
+        self.last_throttle_time = None
+
+    def _refill(self, now: float):
+        """按经过的时间补充令牌"""
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def reserve(self) -> float:
+        """
+        预订一个令牌，令牌不足时记为欠账，由调用方等待欠账还清
+
+        Returns:
+            float: 需要等待的秒数，0 表示可以立即请求
+        """
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 0:
+            wait = max(wait, -self.tokens / self.rate)
+        return wait
+
+class RateLimiter:
+    """按出口（代理URL，直连为空字符串）管理令牌桶的限速器"""
+
+    def __init__(self, limit_config: Dict[str, Any] = None, logger=None):
+        """
+        初始化限速器
+
+        Args:
+            limit_config: 限速配置字典，包含rate、burst、minRate、maxRate等配置
+            logger: 日志记录器
+        """
+        self.logger = logger
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+        self.set_config(limit_config or {})
+
+    def set_config(self, limit_config: Dict[str, Any]) -> None:
+        """
+        设置或更新限速配置，已有令牌桶的速率会被限制在新的范围内
+
+        Args:
+            limit_config: 新的限速配置
+        """
+        self.limit_config = limit_config or {}
+        self.enabled = self.limit_config.get('enable', True)
+        self.initial_rate = self.limit_config.get('rate', 1.0)
+        self.burst = max(1, self.limit_config.get('burst', 5))
+        self.min_rate = self.limit_config.get('minRate', 0.05)
+        self.max_rate = max(self.min_rate, self.limit_config.get('maxRate', 5.0))
+        # AIMD: 每次成功增加的速率，每次被限流乘以的系数
+        self.increase_step = self.limit_config.get('increaseStep', 0.05)
+        self.decrease_factor = self.limit_config.get('decreaseFactor', 0.5)
+        # 没有 Retry-After 时被限流后的暂停时间(秒)
+        self.throttle_pause = self.limit_config.get('throttlePause', 10)
+
+        with self.lock:
+            for bucket in self.buckets.values():
+                bucket.rate = min(self.max_rate, max(self.min_rate, bucket.rate))
+                bucket.burst = self.burst
+
+    def _get_bucket(self, key: str) -> TokenBucket:
+        """获取出口对应的令牌桶，不存在时创建，调用方需持有锁"""
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(min(self.max_rate, max(self.min_rate, self.initial_rate)), self.burst)
+            self.buckets[key] = bucket
+        return bucket
+
+    async def acquire(self, proxy_url: Optional[str] = None):
+        """
+        等待直到该出口可以发出下一个请求
+
+        Args:
+            proxy_url: 代理URL，为空表示直连
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            wait = self._get_bucket(proxy_url or "").reserve()
+        if wait > 0:
+            if self.logger:
+                self.logger.debug(f"出口 {proxy_url or '直连'} 请求限速，等待 {wait:.2f} 秒")
+            await asyncio.sleep(wait)
+
+    def on_success(self, proxy_url: Optional[str] = None):
+        """请求成功，速率加性增加"""
+        if not self.enabled:
+            return
+        with self.lock:
+            bucket = self._get_bucket(proxy_url or "")
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase_step)
+
+    def on_throttle(self, proxy_url: Optional[str] = None, retry_after: Optional[float] = None):
+        """
+        请求被限流，速率乘性减少并暂停该出口
+
+        Args:
+            proxy_url: 代理URL，为空表示直连
+            retry_after: 响应中 Retry-After 指定的秒数
+        """
+        if not self.enabled:
+            return
+        pause = retry_after if retry_after is not None else self.throttle_pause
+        with self.lock:
+            bucket = self._get_bucket(proxy_url or "")
+            bucket.rate = max(self.min_rate, bucket.rate * self.decrease_factor)
+            bucket.paused_until = max(bucket.paused_until, time.monotonic() + pause)
+            bucket.throttle_count += 1
+            bucket.last_throttle_time = time.time()
+            rate = bucket.rate
+        if self.logger:
+            self.logger.warning(f"出口 {proxy_url or '直连'} 被限流，速率降至 {rate:.2f} 次/秒，暂停 {pause:.0f} 秒")
+
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取所有出口的限速状态
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 键为代理URL（直连为空字符串），值包含 rate、tokens、paused、throttle_count
+        """
+        now = time.monotonic()
+        with self.lock:
+            return {
+                key: {
+                    "rate": bucket.rate,
+                    "tokens": bucket.tokens,
+                    "paused": max(0.0, bucket.paused_until - now),
+                    "throttle_count": bucket.throttle_count,
+                    "last_throttle_time": bucket.last_throttle_time,
+                }
+                for key, bucket in self.buckets.items()
+            }
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头中的秒数，无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+# 创建全局限速器实例
+rate_limiter = RateLimiter()
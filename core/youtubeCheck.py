@@ -1,8 +1,159 @@
-import httpx, logging
-from typing import List, Dict, Optional, Any
+import re, json, time, asyncio, logging
+from typing import List, Dict, Optional, Any, Callable, Awaitable, Tuple
 from core.proxy import proxy_manager
+from core.client import client_pool
+from core.ratelimit import rate_limiter, ThrottledError, THROTTLE_STATUS_CODES, parse_retry_after
+from core.probe import probe_selector, PROBES
 
-async def youtubeCheck(channel_id: str, api_proxy: Optional[str] = None, logger: Optional[logging.Logger] = None, retry_count: int = 2) -> Optional[List[Dict[str, Any]]]:
+# 直播标签页的标题，请求时使用 hl=zh-CN
+LIVE_TAB_TITLE_PATTERN = re.compile(r'"title"\s*:\s*"直播"')
+VIDEO_RENDERER_PATTERN = re.compile(r'"videoWithContextRenderer"\s*:\s*')
+TAB_RENDERER_KEY = '"tabRenderer"'
+_json_decoder = json.JSONDecoder()
+
+# 最近一次完整检查得到的预约直播，键为频道ID
+upcoming_streams: Dict[str, List[Dict[str, Any]]] = {}
+
+def get_upcoming_streams(channel_id: str) -> List[Dict[str, Any]]:
+    """获取频道最近一次检查到的预约直播列表，每项包含 scheduled_start（Unix时间戳）"""
+    return upcoming_streams.get(channel_id, [])
+
+def parse_streams(content: bytes) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """从 browse 响应中提取正在直播和预约中的视频
+    
+    只解码直播标签页内的 videoWithContextRenderer 对象，不构建整个响应的对象树
+    
+    Args:
+        content: browse 接口的响应内容
+        
+    Returns:
+        Tuple[List[Dict], List[Dict]]: (直播信息列表, 预约直播信息列表)
+    """
+    text = content.decode('utf-8', errors='replace')
+    tab_match = LIVE_TAB_TITLE_PATTERN.search(text)
+    if not tab_match:
+        return [], []
+    
+    live_streams = []
+    upcoming = []
+    # 只扫描直播标签所在的 tabRenderer，tabRenderer 中 content 可能出现在 title 之前
+    pos = text.rfind(TAB_RENDERER_KEY, 0, tab_match.start())
+    if pos == -1:
+        pos = tab_match.end()
+    end = text.find(TAB_RENDERER_KEY, tab_match.end())
+    if end == -1:
+        end = len(text)
+    while True:
+        match = VIDEO_RENDERER_PATTERN.search(text, pos, end)
+        if not match:
+            break
+        try:
+            video, pos = _json_decoder.raw_decode(text, match.end())
+        except ValueError:
+            pos = match.end()
+            continue
+        if not isinstance(video, dict):
+            continue
+        
+        styles = {
+            overlay.get("thumbnailOverlayTimeStatusRenderer", {}).get("style")
+            for overlay in video.get("thumbnailOverlays", [])
+        }
+        info = {
+            "title": video.get("headline", {}).get("runs", [{}])[0].get("text"),
+            "video_id": video.get("videoId"),
+            "thumbnail": video.get("thumbnail", {}).get("thumbnails", [{}])[-1].get("url")
+        }
+        if "LIVE" in styles:
+            info["viewers"] = video.get("shortViewCountText", {}).get("runs", [{}])[0].get("text")
+            live_streams.append(info)
+        elif "UPCOMING" in styles or "upcomingEventData" in video:
+            start_time = video.get("upcomingEventData", {}).get("startTime")
+            info["scheduled_start"] = int(start_time) if start_time and str(start_time).isdigit() else None
+            upcoming.append(info)
+    return live_streams, upcoming
+
+class CheckCache:
+    """直播检查结果缓存，同一频道的并发检查共享一次请求"""
+
+    def __init__(self, cache_config: Dict[str, Any] = None):
+        """
+        初始化检查缓存
+
+        Args:
+            cache_config: 缓存配置字典，包含liveTtl、offlineTtl配置
+        """
+        # 键为频道ID，值为 (过期时间, 检查结果)
+        self.results: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        # 正在进行的检查，键为频道ID
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.set_config(cache_config or {})
+
+    def set_config(self, cache_config: Dict[str, Any]) -> None:
+        """
+        设置或更新缓存配置
+
+        Args:
+            cache_config: 新的缓存配置
+        """
+        self.cache_config = cache_config or {}
+        # 正在直播的结果缓存更久，未直播的结果很快过期以免错过开播
+        self.live_ttl = self.cache_config.get('liveTtl', 60)
+        self.offline_ttl = self.cache_config.get('offlineTtl', 15)
+
+    async def get_or_check(self, channel_id: str, check_func: Callable[[], Awaitable[Optional[List[Dict[str, Any]]]]],
+                           logger: Optional[logging.Logger] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        返回未过期的缓存结果；已有同一频道的检查在进行时等待其结果；否则执行检查并缓存
+
+        Args:
+            channel_id: YouTube频道ID
+            check_func: 执行实际检查的协程函数
+            logger: 日志记录器
+
+        Returns:
+            检查结果，失败返回None（失败结果不缓存）
+        """
+        entry = self.results.get(channel_id)
+        if entry and entry[0] > time.monotonic():
+            if logger:
+                logger.info(f"使用频道 {channel_id} 的缓存检查结果")
+            return entry[1]
+
+        future = self.inflight.get(channel_id)
+        if future is not None:
+            if logger:
+                logger.info(f"频道 {channel_id} 已有进行中的检查，等待其结果")
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[channel_id] = future
+        result = None
+        try:
+            result = await check_func()
+            if result is not None:
+                ttl = self.live_ttl if result else self.offline_ttl
+                if ttl > 0:
+                    self.results[channel_id] = (time.monotonic() + ttl, result)
+            return result
+        finally:
+            # 发起者被取消或出错时，等待者得到失败结果
+            future.set_result(result)
+            if self.inflight.get(channel_id) is future:
+                del self.inflight[channel_id]
+            self._evict_expired()
+
+    def _evict_expired(self):
+        """删除已过期的缓存结果"""
+        now = time.monotonic()
+        for channel_id in [cid for cid, (expires, _) in self.results.items() if expires <= now]:
+            del self.results[channel_id]
+
+# 创建全局检查缓存实例
+check_cache = CheckCache()
+
+async def youtubeCheck(channel_id: str, api_proxy: Optional[str] = None, logger: Optional[logging.Logger] = None, retry_count: int = 2,
+                       use_cache: bool = True) -> Optional[List[Dict[str, Any]]]:
     """检测YouTube频道直播状态
     
     Args:
@@ -10,11 +161,22 @@ async def youtubeCheck(channel_id: str, api_proxy: Optional[str] = None, logger:
         api_proxy: API请求代理地址，为空则不使用代理
         logger: 日志记录器，为空则不记录日志
         retry_count: 代理失败时的重试次数，默认为2
+        use_cache: 是否使用检查缓存，并发检查同一频道时共享一次请求
         
     Returns:
         List[Dict]: 直播信息列表，每个字典包含标题、视频ID等信息，无直播时返回空列表，请求失败时返回None
     """
-    
+    if not use_cache:
+        return await _youtube_check_with_retry(channel_id, api_proxy, logger, retry_count)
+    return await check_cache.get_or_check(
+        channel_id,
+        lambda: _youtube_check_with_retry(channel_id, api_proxy, logger, retry_count),
+        logger
+    )
+
+async def _youtube_check_with_retry(channel_id: str, api_proxy: Optional[str], logger: Optional[logging.Logger],
+                                    retry_count: int) -> Optional[List[Dict[str, Any]]]:
+    """检测频道直播状态，代理失败时更换代理重试"""
     if logger:
         logger.info(f"开始检查频道 {channel_id} 的直播状态")
     
@@ -26,29 +188,36 @@ async def youtubeCheck(channel_id: str, api_proxy: Optional[str] = None, logger:
         if attempt > 0 and logger:
             logger.warning(f"第 {attempt} 次重试检查频道 {channel_id} 的直播状态")
         
-        result = await _do_youtube_check(channel_id, api_proxy, logger)
-        
-        # 请求成功，返回结果
-        if result is not None:
-            return result
-            
-        # 请求失败，检查是否是代理问题
-        if api_proxy:
-            # 标记代理失败
-            proxy_manager.mark_proxy_failed(api_proxy, f"检查频道 {channel_id} 直播状态失败")
-            
+        try:
+            result = await _probe_and_check(channel_id, api_proxy, logger)
+        except ThrottledError as e:
+            # 被限流说明代理本身可用，不记为代理失败，换一个出口重试
             if logger:
-                logger.warning(f"代理 {api_proxy} 请求失败，已标记为禁用")
-            
-            # 获取新的代理
-            api_proxy = proxy_manager.get_api_proxy()
-            
+                logger.warning(f"检查频道 {channel_id} 时{e}，出口: {api_proxy or '直连'}")
             if api_proxy:
+                api_proxy = proxy_manager.get_api_proxy()
+        else:
+            # 请求成功，返回结果
+            if result is not None:
+                return result
+                
+            # 请求失败，检查是否是代理问题
+            if api_proxy:
+                # 记录代理失败，连续失败达到阈值时代理会被熔断
+                proxy_manager.mark_proxy_failed(api_proxy, f"检查频道 {channel_id} 直播状态失败")
+                
                 if logger:
-                    logger.info(f"切换到新代理 {api_proxy} 重试请求")
-            else:
-                if logger:
-                    logger.warning("无可用代理，将不使用代理重试请求")
+                    logger.warning(f"代理 {api_proxy} 请求失败，已记录失败次数")
+                
+                # 获取新的代理，不传频道ID，避免 sticky 策略再次选中同一代理
+                api_proxy = proxy_manager.get_api_proxy()
+                
+                if api_proxy:
+                    if logger:
+                        logger.info(f"切换到新代理 {api_proxy} 重试请求")
+                else:
+                    if logger:
+                        logger.warning("无可用代理，将不使用代理重试请求")
         
         # 如果是最后一次尝试，且依然失败，记录错误
         if attempt == retry_count and logger:
@@ -60,6 +229,43 @@ async def youtubeCheck(channel_id: str, api_proxy: Optional[str] = None, logger:
     # 所有尝试都失败，返回None
     return None
 
+async def _probe_and_check(channel_id: str, api_proxy: Optional[str] = None, logger: Optional[logging.Logger] = None) -> Optional[List[Dict[str, Any]]]:
+    """先执行低开销的预检，预检判断可能在直播或无法判断时再执行完整检查
+    
+    Args:
+        channel_id: YouTube频道ID
+        api_proxy: API请求代理地址
+        logger: 日志记录器
+        
+    Returns:
+        检查结果，失败返回None
+        
+    Raises:
+        ThrottledError: 请求被限流（HTTP 429/403）
+    """
+    probe_name = probe_selector.choose(channel_id)
+    # 准确率不达标的预检仍按低比例执行并与完整检查对比，使频道有机会恢复使用预检
+    sampling = False
+    if probe_name is None:
+        probe_name = probe_selector.choose_sample(channel_id)
+        sampling = probe_name is not None
+    predicted = None
+    if probe_name:
+        predicted = await PROBES[probe_name](channel_id, api_proxy, logger)
+        if predicted is False and not sampling and not probe_selector.should_verify():
+            # 有预约直播时 /live 页面也会指向视频，预检为否说明预约已不存在
+            upcoming_streams.pop(channel_id, None)
+            if logger:
+                logger.info(f"频道 {channel_id} 当前没有直播 (预检: {probe_name})")
+            return []
+    
+    result = await _do_youtube_check(channel_id, api_proxy, logger)
+    if predicted is not None and result is not None:
+        # /live 页面在有直播或预约直播时都会指向视频
+        actual = bool(result) or bool(upcoming_streams.get(channel_id))
+        probe_selector.record(channel_id, probe_name, predicted, actual)
+    return result
+
 async def _do_youtube_check(channel_id: str, api_proxy: Optional[str] = None, logger: Optional[logging.Logger] = None) -> Optional[List[Dict[str, Any]]]:
     """执行实际的YouTube检查请求
     
@@ -70,6 +276,9 @@ async def _do_youtube_check(channel_id: str, api_proxy: Optional[str] = None, lo
         
     Returns:
         检查结果，失败返回None
+        
+    Raises:
+        ThrottledError: 请求被限流（HTTP 429/403）
     """
     url = 'https://www.youtube.com/youtubei/v1/browse'
     
@@ -95,59 +304,53 @@ async def _do_youtube_check(channel_id: str, api_proxy: Optional[str] = None, lo
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
 
-    client_kwargs = {
-        'headers': headers,
-        'timeout': 30.0
-    }
-    
-    if api_proxy:
-        client_kwargs['proxy'] = api_proxy
-        if logger:
-            logger.info(f"使用代理 {api_proxy}")
+    if api_proxy and logger:
+        logger.info(f"使用代理 {api_proxy}")
 
-    async with httpx.AsyncClient(**client_kwargs) as client:
-        try:
-            response = await client.post(url, params=params, json=data)
-            response.raise_for_status()
-            result = response.json()
-            live_streams = []
-            
-            tabs = result.get("contents", {}).get("singleColumnBrowseResultsRenderer", {}).get("tabs", [])
-            
-            for tab in tabs:
-                tab_renderer = tab.get("tabRenderer", {})
-                if tab_renderer.get("title") == "直播":
-                    content = tab_renderer.get("content", {}).get("richGridRenderer", {}).get("contents", [])
-                    
-                    for item in content:
-                        video = item.get("richItemRenderer", {}).get("content", {}).get("videoWithContextRenderer", {})
-                        overlays = video.get("thumbnailOverlays", [])
-                        is_live = any(
-                            overlay.get("thumbnailOverlayTimeStatusRenderer", {}).get("style") == "LIVE"
-                            for overlay in overlays
-                        )
-                        
-                        if is_live:
-                            live_info = {
-                                "title": video.get("headline", {}).get("runs", [{}])[0].get("text"),
-                                "video_id": video.get("videoId"),
-                                "viewers": video.get("shortViewCountText", {}).get("runs", [{}])[0].get("text"),
-                                "thumbnail": video.get("thumbnail", {}).get("thumbnails", [{}])[-1].get("url")
-                            }
-                            live_streams.append(live_info)
-                            
-                            if logger:
-                                logger.info(f"检测到直播：{live_info['title']} ({live_info['video_id']})")
-            
-            if not live_streams and logger:
-                logger.info(f"频道 {channel_id} 当前没有直播")
-                
-            return live_streams
+    # 复用代理对应的长连接客户端，避免每次请求重新握手
+    client = client_pool.get_client(api_proxy)
+
+    # 按出口限速，避免触发YouTube的限流
+    await rate_limiter.acquire(api_proxy)
+
+    start_time = time.monotonic()
+    try:
+        response = await client.post(url, params=params, json=data, headers=headers)
+        if response.status_code in THROTTLE_STATUS_CODES:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            rate_limiter.on_throttle(api_proxy, retry_after)
+            raise ThrottledError(response.status_code, retry_after)
+        response.raise_for_status()
+        # 记录代理的延迟和成功情况，供代理选择策略使用
+        proxy_manager.record_result(api_proxy, True, time.monotonic() - start_time)
+        rate_limiter.on_success(api_proxy)
+        # 在工作线程中解析，避免大响应阻塞事件循环
+        live_streams, upcoming = await asyncio.to_thread(parse_streams, response.content)
+        if upcoming:
+            upcoming_streams[channel_id] = upcoming
+        else:
+            upcoming_streams.pop(channel_id, None)
+        
+        if logger:
+            for live_info in live_streams:
+                logger.info(f"检测到直播：{live_info['title']} ({live_info['video_id']})")
+            for upcoming_info in upcoming:
+                if upcoming_info["scheduled_start"]:
+                    start_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(upcoming_info["scheduled_start"]))
+                    logger.info(f"检测到预约直播：{upcoming_info['title']} ({upcoming_info['video_id']})，计划开始时间 {start_str}")
+        
+        if not live_streams and logger:
+            logger.info(f"频道 {channel_id} 当前没有直播")
             
-        except Exception as e:
-            if logger:
-                error_info = f"检查频道 {channel_id} 直播状态时出错: {e}"
-                if api_proxy:
-                    error_info += f" (使用代理: {api_proxy})"
-                logger.error(error_info)
-            return None 
\ No newline at end of file
+        return live_streams
+        
+    except ThrottledError:
+        raise
+    except Exception as e:
+        proxy_manager.record_result(api_proxy, False)
+        if logger:
+            error_info = f"检查频道 {channel_id} 直播状态时出错: {e}"
+            if api_proxy:
+                error_info += f" (使用代理: {api_proxy})"
+            logger.error(error_info)
+        return None 
\ No newline at end of file
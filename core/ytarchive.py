@@ -1,10 +1,12 @@
-import re, os, subprocess, threading, logging
-from typing import Dict, List, Any, Optional
-from pathlib import Path
+import re, os, time, codecs, signal, asyncio, subprocess, threading, logging
+from typing import Dict, List, Any, Optional, Tuple
 
-from core.logs import get_ytarchive_logger, get_channel_logger
+from core.logs import get_ytarchive_logger, get_channel_logger, LogBuffer
 from core.proxy import proxy_manager
 from core.cookie import cookie_manager
+from core.ratelimit import rate_limiter
+from core.events import event_bus
+from core.history import live_history
 
 class ChannelConfig:
     """频道配置，存储每个频道的配置信息"""
@@ -18,11 +20,172 @@ class ChannelConfig:
         self.autoCheck = autoCheck
         self.options = options or {}
 
+RECORDING_PATTERN = re.compile(r"Video Fragments:\s*\d+;\s*Audio Fragments:\s*\d+;\s*Total Downloaded:\s*(\S+)")
+MONITOR_PATTERN = re.compile(r"Retries:\s*(\d+).+Total time waited:\s*(\d+)\s*seconds")
+TITLE_PATTERN = re.compile(r"Video Title:\s*(.+)$")
+QUALITY_PATTERN = re.compile(r"Selected quality:\s*(.+)$")
+START_TIME_PATTERN = re.compile(r"Stream started at time\s*(.+)$")
+SIZE_PATTERN = re.compile(r"^([\d.]+)\s*([KMGT]?i?B)$", re.IGNORECASE)
+
+# ytarchive 输出的错误分类表，按顺序匹配第一个命中的分类，匹配时不区分大小写
+## cookie: cookie失效或需要登录，标记cookie失效并换一个cookie重启
+## proxy: 代理无法访问，标记代理失败并换一个代理重启
+## members: 会员限定直播，账号未加入会员时换cookie也无法录制，只记录
+## private: 视频为私享视频，只记录
+## throttle: 被YouTube限流，降低该出口的请求速率，由 ytarchive 自行重试
+ERROR_RULES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("proxy", ("video details not found, video is likely private or does not exist", "proxyconnect")),
+    ("members", ("members only", "members-only")),
+    ("cookie", ("sign in to confirm", "login required", "login_required", "cookies are no longer valid")),
+    ("private", ("this video is private", "private video")),
+    ("throttle", ("too many requests", "http error 429", "status code 429")),
+]
+
+# 同一分类的错误处理后，在该时间(秒)内再次出现时不重复处理
+ERROR_COOLDOWN = 60
+
+# 因错误自动重启的限制
+## 同一频道的同一视频（常驻监控时为同一频道）在 RESTART_WINDOW 秒内最多自动重启 RESTART_LIMIT 次
+## 第 n 次重启前等待 RESTART_BACKOFF * 2^(n-2) 秒，第一次立即重启
+RESTART_LIMIT = 3
+RESTART_BACKOFF = 10
+RESTART_WINDOW = 3600
+
+def classify_error(line: str) -> Optional[str]:
+    """
+    按错误分类表判断一行 ytarchive 输出是否为需要处理的错误
+
+    Returns:
+        Optional[str]: 错误分类，不是错误时返回None
+    """
+    # 录制和监控中的进度行占绝大多数，直接跳过
+    if "Total Downloaded" in line or "Total time waited" in line:
+        return None
+    lowered = line.lower()
+    for category, patterns in ERROR_RULES:
+        if any(pattern in lowered for pattern in patterns):
+            return category
+    return None
+
+# 停止录制时先发送的中断信号，让 ytarchive 合并已下载的片段
+## Windows 不能向子进程发送 SIGINT，子进程放入新的进程组后发送 CTRL_BREAK_EVENT，Go 程序会按 os.Interrupt 处理
+if os.name == 'nt':
+    SPAWN_KWARGS = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    INTERRUPT_SIGNAL = signal.CTRL_BREAK_EVENT
+    INTERRUPT_SIGNAL_NAME = "CTRL_BREAK_EVENT"
+else:
+    SPAWN_KWARGS = {}
+    INTERRUPT_SIGNAL = signal.SIGINT
+    INTERRUPT_SIGNAL_NAME = "SIGINT"
+
+# 录制进度变化时推送状态的最小间隔(秒)，录制状态等其他变化立即推送
+PROGRESS_PUBLISH_INTERVAL = 1.5
+
+SIZE_UNITS = {
+    "b": 1,
+    "kb": 1000, "mb": 1000 ** 2, "gb": 1000 ** 3, "tb": 1000 ** 4,
+    "kib": 1024, "mib": 1024 ** 2, "gib": 1024 ** 3, "tib": 1024 ** 4,
+}
+
+def parse_size(size_text: str) -> Optional[int]:
+    """将 ytarchive 输出的大小文本（如 12.34MiB）转换为字节数"""
+    match = SIZE_PATTERN.match(size_text)
+    if not match:
+        return None
+    unit = SIZE_UNITS.get(match.group(2).lower())
+    if unit is None:
+        return None
+    try:
+        return int(float(match.group(1)) * unit)
+    except ValueError:
+        return None
+
+class ChannelStatus:
+    """频道录制状态，由 ytarchive 输出逐行增量更新"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清空状态，在进程启动时调用"""
+        with self.lock:
+            self.recording_state = None
+            self.video_title = None
+            self.quality = None
+            self.start_time = None
+            self.file_size = None
+            self.bytes_downloaded = None
+            self.last_progress_time = None
+
+    def update(self, line: str) -> bool:
+        """
+        解析一行 ytarchive 输出并更新状态
+        
+        Args:
+            line: 单行输出
+            
+        Returns:
+            bool: 状态是否发生变化，只更新录制进度时返回 False
+        """
+        # 先用子串判断过滤掉绝大多数无关行，只有命中时才执行正则
+        if "Total Downloaded" in line:
+            match = RECORDING_PATTERN.search(line)
+            if match:
+                with self.lock:
+                    changed = self.recording_state != "录制中"
+                    self.recording_state = "录制中"
+                    self.file_size = match.group(1)
+                    self.bytes_downloaded = parse_size(self.file_size)
+                    self.last_progress_time = time.time()
+                return changed
+        elif "Total time waited" in line:
+            if MONITOR_PATTERN.search(line):
+                with self.lock:
+                    changed = self.recording_state != "监控中"
+                    self.recording_state = "监控中"
+                return changed
+        elif "Video Title:" in line:
+            match = TITLE_PATTERN.search(line)
+            if match:
+                with self.lock:
+                    changed = self.video_title != match.group(1).strip()
+                    self.video_title = match.group(1).strip()
+                return changed
+        elif "Selected quality:" in line:
+            match = QUALITY_PATTERN.search(line)
+            if match:
+                with self.lock:
+                    changed = self.quality != match.group(1).strip()
+                    self.quality = match.group(1).strip()
+                return changed
+        elif "Stream started at time" in line:
+            match = START_TIME_PATTERN.search(line)
+            if match:
+                with self.lock:
+                    changed = self.start_time != match.group(1).strip()
+                    self.start_time = match.group(1).strip()
+                return changed
+        return False
+
+    def to_dict(self) -> dict:
+        """返回当前状态的快照"""
+        with self.lock:
+            return {
+                "recording_state": self.recording_state,
+                "video_title": self.video_title,
+                "quality": self.quality,
+                "start_time": self.start_time,
+                "file_size": self.file_size,
+                "bytes_downloaded": self.bytes_downloaded,
+                "last_progress_time": self.last_progress_time,
+            }
+
 class ChannelProcess:
     """频道进程类，管理每个频道的 ytarchive 进程"""
     def __init__(self, config: ChannelConfig, ytarchive_path: str, global_proxy: Optional[str] = None, 
                  global_output: Optional[str] = None, global_output_file: Optional[str] = None,
-                 global_options: Dict[str, Any] = None, logger: logging.Logger = None):
+                 global_options: Dict[str, Any] = None, logger: logging.Logger = None,
+                 log_buffer_size: int = 1000):
         """
         初始化频道进程
         
@@ -34,6 +197,7 @@ class ChannelProcess:
             global_output_file: 全局输出文件名模板
             global_options: 全局 ytarchive 选项
             logger: 日志记录器
+            log_buffer_size: 内存中保留的 ytarchive 输出行数
         """
         self.config = config
         self.ytarchive_path = ytarchive_path
@@ -48,20 +212,38 @@ class ChannelProcess:
         self.pid = None
         self.thread = None
         self.running = False
-        self.logs = []
-        self.log_lock = threading.Lock()
+        self.stopping = False
+        self.log_buffer = LogBuffer(log_buffer_size)
+        self.status = ChannelStatus()
         self.current_proxy = None  # 当前使用的代理URL
+        self.recording_proxy = None  # 已计入代理活动录制数的代理URL，进程退出时释放
+        self.cookie_file = None  # 从cookie管理器分配的cookie文件，进程退出时释放
+        self.video_id = None  # 按需录制时的直播视频ID
+        self.excluded_proxy = None  # 下次启动时避开的代理URL，换代理重启时设置
+        self.on_exit = None  # 进程退出后的回调，参数为本对象
+        self.last_publish_time = 0.0  # 上次推送状态的时间，用于限制录制进度的推送频率
+        self.on_error = None  # 输出中识别到错误时的回调，参数为本对象、错误分类和输出行
+        # 本次运行中各分类最近一次报告的错误，键为错误分类，值为 {"category", "line", "time", "handled"}
+        self.last_errors: Dict[str, Dict[str, Any]] = {}
 
-    def start(self):
-        """启动 ytarchive 进程"""
+    def start(self, video_id: Optional[str] = None):
+        """启动 ytarchive 进程
+        
+        Args:
+            video_id: 直播视频ID，指定时直接录制该视频，否则录制频道的 /live 地址
+        """
+        self.video_id = video_id
+        self.status.reset()
+        self.last_errors = {}
         cmd = self.build_command()
         self.setup_logging()
         try:
-            self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding='utf-8')
+            self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding='utf-8', **SPAWN_KWARGS)
             self.pid = self.process.pid
             self.running = True
             self.thread = threading.Thread(target=self.read_output, daemon=True)
             self.thread.start()
+            self.publish_status()
             if self.logger:
                 self.logger.info(f"已启动频道 {self.config.name} ({self.config.id}) 的监控，PID: {self.pid}")
             
@@ -71,22 +253,117 @@ class ChannelProcess:
             if self.logger:
                 self.logger.error(error_msg)
             self.channel_logger.error(error_msg)
+            self.release_proxy()
+            self.release_cookie()
 
-    def stop(self):
-        """停止 ytarchive 进程"""
+    def stop(self, timeout: float = 10):
+        """停止 ytarchive 进程（阻塞），仅在没有事件循环时使用
+        
+        Args:
+            timeout: 等待进程退出的秒数，超时后强制结束
+        """
         if self.process and self.running:
             self.process.terminate()
-            self.process.wait()
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
             self.pid = None
             self.running = False
             if self.thread and self.thread.is_alive():
-                self.thread.join()
+                self.thread.join(timeout=timeout)
+            self.publish_status()
                 
             if self.logger:
                 self.logger.info(f"已停止频道 {self.config.name} ({self.config.id}) 的监控")
             
             self.channel_logger.info(f"已停止 ytarchive 进程监控")
 
+    async def stop_async(self, interrupt_timeout: float = 30, terminate_timeout: float = 10) -> bool:
+        """
+        异步停止 ytarchive 进程，依次发送中断信号 (Windows 下为 CTRL_BREAK_EVENT)、SIGTERM、SIGKILL
+        
+        中断信号让 ytarchive 有机会合并已下载的片段，超时后再逐级升级
+        
+        Args:
+            interrupt_timeout: 发送中断信号后等待退出的秒数
+            terminate_timeout: 发送 SIGTERM 后等待退出的秒数
+            
+        Returns:
+            bool: 是否执行了停止
+        """
+        if not self.process or not self.running:
+            self.stopping = False
+            return False
+
+        self.stopping = True
+        self.publish_status()
+        try:
+            steps = [
+                (INTERRUPT_SIGNAL, interrupt_timeout, INTERRUPT_SIGNAL_NAME),
+                (signal.SIGTERM, terminate_timeout, "SIGTERM"),
+            ]
+
+            exited = False
+            for sig, timeout, sig_name in steps:
+                self.send_signal(sig)
+                if await self.wait_exit(timeout):
+                    exited = True
+                    break
+                self.channel_logger.warning(f"ytarchive 进程在 {timeout} 秒内未响应 {sig_name}，继续升级停止信号")
+
+            if not exited:
+                try:
+                    self.process.kill()
+                except ProcessLookupError:
+                    pass
+                await self.wait_exit(terminate_timeout)
+                self.channel_logger.warning("已强制结束 ytarchive 进程")
+
+            self.pid = None
+            self.running = False
+            # 等待读取输出的收尾（释放代理和cookie）完成，否则重启后旧的收尾会释放新进程占用的资源
+            await self.wait_reader(terminate_timeout)
+
+            if self.logger:
+                self.logger.info(f"已停止频道 {self.config.name} ({self.config.id}) 的监控")
+            self.channel_logger.info(f"已停止 ytarchive 进程监控")
+            return True
+        finally:
+            self.stopping = False
+            self.publish_status()
+
+    def send_signal(self, sig: int):
+        """向进程发送信号，进程已退出时忽略"""
+        try:
+            self.process.send_signal(sig)
+        except (ProcessLookupError, OSError):
+            pass
+
+    async def wait_exit(self, timeout: float) -> bool:
+        """
+        在不阻塞事件循环的情况下等待进程退出
+        
+        Args:
+            timeout: 最长等待秒数
+            
+        Returns:
+            bool: 进程是否已退出
+        """
+        deadline = time.monotonic() + timeout
+        while self.process.poll() is None:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.2)
+        return True
+
+    async def wait_reader(self, timeout: float):
+        """在不阻塞事件循环的情况下等待读取线程结束"""
+        thread = self.thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            await asyncio.to_thread(thread.join, timeout)
+
     def build_command(self) -> List[str]:
         """构建 ytarchive 命令行参数"""
         cmd = [self.ytarchive_path]
@@ -94,8 +371,14 @@ class ChannelProcess:
         combined_options = self.global_options.copy()
         combined_options.update(self.config.options)
 
+        # 直接录制指定视频时不需要 ytarchive 自行监控频道，直播结束后进程即退出
+        if self.video_id:
+            combined_options.pop('--monitor-channel', None)
+
         # 处理随机cookie
-        random_cookie_file = cookie_manager.get_random_cookie_file()
+        self.release_cookie()
+        random_cookie_file = cookie_manager.acquire_cookie_file(self.config.id)
+        self.cookie_file = random_cookie_file
         if random_cookie_file:
             # 如果options里已经有-c选项，移除它
             if '-c' in combined_options:
@@ -137,13 +420,20 @@ class ChannelProcess:
         proxy = self.config.proxy
         if not proxy:
             # 如果频道没有指定代理，则使用代理管理器获取YTA代理
-            proxy = proxy_manager.get_yta_proxy()
+            proxy = proxy_manager.get_yta_proxy(channel_key=self.config.id, exclude=self.excluded_proxy)
+        self.excluded_proxy = None
             
         if proxy:
             self.current_proxy = proxy  # 记录当前使用的代理
             cmd.extend(['--proxy', proxy])
+            self.release_proxy()
+            self.recording_proxy = proxy
+            proxy_manager.acquire_recording(proxy)
 
-        channel_url = f'https://www.youtube.com/channel/{self.config.id}/live'
+        if self.video_id:
+            channel_url = f'https://www.youtube.com/watch?v={self.video_id}'
+        else:
+            channel_url = f'https://www.youtube.com/channel/{self.config.id}/live'
         cmd.append(channel_url)
         cmd.append('best')
 
@@ -155,104 +445,302 @@ class ChannelProcess:
 
     def read_output(self):
         """读取 ytarchive 进程的输出"""
-        while self.running and self.process.poll() is None:
-            line = self.process.stdout.readline()
+        process = self.process
+        while self.running and process.poll() is None:
+            line = process.stdout.readline()
             if line:
-                with self.log_lock:
-                    self.ytarchive_logger.info(line.strip())
-                    self.logs.append(line.strip())
-                    if len(self.logs) > 1000:
-                        self.logs = self.logs[-500:]
+                self.handle_line(line)
+        if self.process is not process:
+            # 等待读取线程超时后进程已重启，收尾由新的读取线程负责
+            return
         self.running = False
         self.channel_logger.info("ytarchive 进程已退出")
+        self.publish_status()
+        self.finish()
 
-    def parse_latest_status(self) -> dict:
-        """解析最近日志，获取录制状态、直播标题、清晰度、开播时间、文件大小等信息"""
-        status_info = {
-            "recording_state": None,
-            "video_title": None,
-            "quality": None,
-            "start_time": None,
-            "file_size": None,
-        }
-        
-        if self.logs:
-            for line in reversed(self.logs):
-                self._parse_log_line(line, status_info)
-                if all(status_info.values()):
-                    break
-        
-        if not any(status_info.values()):
-            log_file = Path(f'logs/{self.config.name}/ytarchive/ytarchive.log')
-            if log_file.exists():
+    def finish(self):
+        """进程退出后释放占用的代理和cookie并通知管理器"""
+        self.release_proxy()
+        self.release_cookie()
+        if self.on_exit:
+            try:
+                self.on_exit(self)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"处理频道 {self.config.name} ({self.config.id}) 进程退出时出错: {e}")
+
+    def release_proxy(self):
+        """释放计入代理活动录制数的代理"""
+        proxy, self.recording_proxy = self.recording_proxy, None
+        if proxy:
+            proxy_manager.release_recording(proxy)
+
+    def release_cookie(self):
+        """释放从cookie管理器分配的cookie文件"""
+        cookie_file, self.cookie_file = self.cookie_file, None
+        if cookie_file:
+            cookie_manager.release_cookie_file(self.config.id)
+
+    def handle_line(self, line: str):
+        """处理 ytarchive 输出的一行内容"""
+        line = line.strip()
+        changed = self.status.update(line)
+        self.ytarchive_logger.info(line)
+        seq = self.log_buffer.append(line)
+        event_bus.publish("log", {"channel_id": self.config.id, "seq": seq, "line": line})
+        if changed:
+            if "Total Downloaded" in line:
+                # 开始录制，记录开播历史，直播检查器在录制期间不再检查该频道
+                live_history.record_live(self.config.id, self.video_id)
+            self.publish_status()
+        elif "Total Downloaded" in line and time.monotonic() - self.last_publish_time >= PROGRESS_PUBLISH_INTERVAL:
+            self.publish_status()
+
+        category = classify_error(line)
+        if category and self._should_report_error(category):
+            self.last_errors[category] = {"category": category, "line": line, "time": time.time(), "handled": False}
+            if self.on_error:
                 try:
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                    
-                    for line in reversed(lines):
-                        self._parse_log_line(line, status_info)
-                        if all(status_info.values()):
-                            break
+                    self.on_error(self, category, line)
                 except Exception as e:
                     if self.logger:
-                        self.logger.error(f"读取日志文件出错: {e}")
-        
-        return status_info
-    
-    def _parse_log_line(self, line: str, status_info: dict):
-        """从单行日志中解析信息"""
-        match_recording = re.search(r"Video Fragments:\s*\d+;\s*Audio Fragments:\s*\d+;\s*Total Downloaded:\s*(\S+)", line)
-        if match_recording:
-            status_info["recording_state"] = "录制中"
-            status_info["file_size"] = match_recording.group(1)
-                
-        match_monitor = re.search(r"Retries:\s*(\d+).+Total time waited:\s*(\d+)\s*seconds", line)
-        if match_monitor and status_info["recording_state"] is None:
-            status_info["recording_state"] = "监控中"
+                        self.logger.error(f"处理频道 {self.config.name} ({self.config.id}) 的错误输出时出错: {e}")
+
+    def _should_report_error(self, category: str) -> bool:
+        """
+        该分类的错误是否需要报告，ytarchive 重试时会重复输出同样的错误
 
-        match_title = re.search(r"Video Title:\s*(.+)$", line)
-        if match_title and not status_info["video_title"]:
-            status_info["video_title"] = match_title.group(1).strip()
+        同一分类尚未处理或处理后不足 ERROR_COOLDOWN 秒时不重复报告，不同分类互不影响
+        """
+        error = self.last_errors.get(category)
+        if error is None:
+            return True
+        return error["handled"] and time.time() - error["time"] >= ERROR_COOLDOWN
+
+    def get_status(self) -> dict:
+        """获取进程和录制状态"""
+        if not self.running:
+            return {
+                "running": False,
+                "stopping": False,
+                "pid": None,
+                "video_id": None,
+                "is_live": False,
+                "recording_state": None,
+                "video_title": None,
+                "quality": None,
+                "start_time": None,
+                "file_size": None,
+                "bytes_downloaded": None,
+                "last_progress_time": None,
+            }
+
+        status_info = self.parse_latest_status()
+        recording_state = "停止中" if self.stopping else status_info.get("recording_state")
+        return {
+            "running": True,
+            "stopping": self.stopping,
+            "pid": self.pid,
+            "video_id": self.video_id,
+            "is_live": recording_state == "录制中",
+            "recording_state": recording_state,
+            "video_title": status_info.get("video_title"),
+            "quality": status_info.get("quality"),
+            "start_time": status_info.get("start_time"),
+            "file_size": status_info.get("file_size"),
+            "bytes_downloaded": status_info.get("bytes_downloaded"),
+            "last_progress_time": status_info.get("last_progress_time"),
+        }
 
-        match_quality = re.search(r"Selected quality:\s*(.+)$", line)
-        if match_quality and not status_info["quality"]:
-            status_info["quality"] = match_quality.group(1).strip()
+    def publish_status(self):
+        """推送当前状态给事件订阅者"""
+        self.last_publish_time = time.monotonic()
+        event_bus.publish("status", {"channel_id": self.config.id, **self.get_status()})
 
-        match_start_time = re.search(r"Stream started at time\s*(.+)$", line)
-        if match_start_time and not status_info["start_time"]:
-            status_info["start_time"] = match_start_time.group(1).strip()
+    @property
+    def logs(self) -> List[str]:
+        """内存中 ytarchive 输出的快照"""
+        return self.log_buffer.tail()
 
-    def check_ytarchive_errors(self) -> Optional[str]:
-        """检查ytarchive进程的最新日志中是否存在错误
+    def parse_latest_status(self) -> dict:
+        """获取录制状态、直播标题、清晰度、开播时间、文件大小等信息
+        
+        状态已在 read_output 中逐行增量解析，这里只返回快照
+        """
+        return self.status.to_dict()
+
+    def check_ytarchive_errors(self) -> List[Dict[str, Any]]:
+        """检查ytarchive进程输出中是否有尚未处理的错误
         
         Returns:
-            Optional[str]: 如果发现错误，返回错误信息；否则返回None
+            List[Dict[str, Any]]: 尚未处理的错误列表，每个元素包含 category 和 line
         """
-        if not self.logs:
-            return None
-            
-        # 检查最新的几条日志
-        for line in reversed(self.logs[-10:]):  # 只检查最新的10条日志
-            if "Video Details not found, video is likely private or does not exist" in line:
-                return line.strip()
-                
-        return None
+        return [error for error in list(self.last_errors.values()) if not error["handled"]]
 
     def get_current_proxy(self) -> Optional[str]:
         """获取当前使用的代理URL"""
         return self.current_proxy
 
+class AsyncChannelProcess(ChannelProcess):
+    """基于 asyncio 子进程的频道进程类，输出在事件循环中读取，不占用额外线程"""
+
+    # 每次从管道读取的最大字节数
+    READ_CHUNK_SIZE = 65536
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.task = None
+
+    def start(self, video_id: Optional[str] = None):
+        """启动 ytarchive 进程，需要在事件循环中调用
+        
+        Args:
+            video_id: 直播视频ID，指定时直接录制该视频，否则录制频道的 /live 地址
+        """
+        self.video_id = video_id
+        self.status.reset()
+        self.last_errors = {}
+        cmd = self.build_command()
+        self.setup_logging()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError as e:
+            error_msg = f"启动频道 {self.config.name} ({self.config.id}) 的进程时出错：{e}"
+            if self.logger:
+                self.logger.error(error_msg)
+            self.channel_logger.error(error_msg)
+            self.release_proxy()
+            self.release_cookie()
+            return
+        # 进程创建前先标记为运行中，避免重复启动
+        self.running = True
+        self.task = loop.create_task(self.run_process(cmd))
+
+    async def run_process(self, cmd: List[str]):
+        """创建子进程并读取其输出直到退出"""
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                **SPAWN_KWARGS
+            )
+        except Exception as e:
+            self.running = False
+            error_msg = f"启动频道 {self.config.name} ({self.config.id}) 的进程时出错：{e}"
+            if self.logger:
+                self.logger.error(error_msg)
+            self.channel_logger.error(error_msg)
+            self.publish_status()
+            self.finish()
+            return
+
+        self.pid = self.process.pid
+        if self.logger:
+            self.logger.info(f"已启动频道 {self.config.name} ({self.config.id}) 的监控，PID: {self.pid}")
+        self.channel_logger.info(f"已启动 ytarchive 进程监控，PID: {self.pid}")
+        self.publish_status()
+
+        try:
+            await self.read_output_async()
+            await self.process.wait()
+        finally:
+            self.pid = None
+            self.running = False
+            self.channel_logger.info("ytarchive 进程已退出")
+            self.publish_status()
+            self.finish()
+
+    async def read_output_async(self):
+        """按块读取输出，增量解码并切分为行"""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        buffer = ""
+        while True:
+            chunk = await self.process.stdout.read(self.READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer += decoder.decode(chunk)
+            # ytarchive 的进度行以 \r 结尾，统一按换行处理
+            buffer = buffer.replace('\r\n', '\n').replace('\r', '\n')
+            lines = buffer.split('\n')
+            buffer = lines.pop()
+            for line in lines:
+                if line:
+                    self.handle_line(line)
+        buffer += decoder.decode(b'', final=True)
+        if buffer.strip():
+            self.handle_line(buffer)
+
+    async def wait_reader(self, timeout: float):
+        """等待读取任务结束"""
+        task = self.task
+        if task and not task.done() and task is not asyncio.current_task():
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait_exit(self, timeout: float) -> bool:
+        """等待子进程退出"""
+        try:
+            await asyncio.wait_for(asyncio.shield(self.process.wait()), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def stop(self, timeout: float = 10):
+        """停止 ytarchive 进程，进程退出由读取任务负责收尾"""
+        if self.process and self.running:
+            try:
+                self.process.terminate()
+            except ProcessLookupError:
+                pass
+            self.running = False
+
+            if self.logger:
+                self.logger.info(f"已停止频道 {self.config.name} ({self.config.id}) 的监控")
+
+            self.channel_logger.info(f"已停止 ytarchive 进程监控")
+            self.publish_status()
+
 class ChannelManager:
     """频道管理器，管理多个频道的 ytarchive 进程"""
-    def __init__(self, logger: logging.Logger = None):
+    def __init__(self, logger: logging.Logger = None, record_mode: str = "monitor", engine: str = "thread"):
         """
         初始化频道管理器
         
         Args:
             logger: 日志记录器
+            record_mode: 录制模式，monitor 为 ytarchive 常驻监控频道，
+                         ondemand 为检测到直播后才启动 ytarchive 录制对应视频
+            engine: 进程管理方式，thread 为每个进程一个读取线程，asyncio 为在事件循环中统一读取
         """
         self.logger = logger
+        self.record_mode = record_mode
+        self.engine = engine
+        self.process_class = AsyncChannelProcess if engine == "asyncio" else ChannelProcess
+        # 停止进程时 SIGINT 和 SIGTERM 后的等待时间
+        self.stop_interrupt_timeout = 30
+        self.stop_terminate_timeout = 10
+        self.stop_tasks: Dict[str, asyncio.Task] = {}
+        # 每个频道内存中保留的日志行数
+        self.log_buffer_size = 1000
         self.channels: Dict[str, ChannelProcess] = {}
+        # 所有YTA代理都达到录制上限时等待启动的频道，键为频道ID，值为视频ID，按加入顺序启动
+        self.pending_starts: Dict[str, Optional[str]] = {}
+        self.pending_lock = threading.RLock()
+        # 处理进程错误输出的事件循环，读取线程中识别到的错误会提交到该循环处理
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # 因错误自动重启的时间记录，键为 (频道ID, 视频ID)
+        self.restart_times: Dict[Tuple[str, Optional[str]], List[float]] = {}
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """绑定用于处理进程错误的事件循环，在应用启动时调用"""
+        self.loop = loop
+
+    def is_ondemand(self) -> bool:
+        """是否为按需录制模式"""
+        return self.record_mode == "ondemand"
 
     def initialize_channels(self, channels: List[ChannelConfig], ytarchive_path: str, 
                            global_output: Optional[str] = None,
@@ -270,15 +758,18 @@ class ChannelManager:
             auto_record: 是否自动启动录制
         """
         for channel_config in channels:
-            channel_process = ChannelProcess(
+            channel_process = self.process_class(
                 config=channel_config, 
                 ytarchive_path=ytarchive_path,
                 global_proxy=None,  # 不再使用global_proxy，而是通过proxy_manager获取
                 global_output=global_output,
                 global_output_file=global_output_file,
                 global_options=global_options,
-                logger=self.logger
+                logger=self.logger,
+                log_buffer_size=self.log_buffer_size
             )
+            channel_process.on_exit = self._on_process_exit
+            channel_process.on_error = self._on_process_error
             self.channels[channel_config.id] = channel_process
             
             if self.logger:
@@ -287,46 +778,186 @@ class ChannelManager:
             channel_logger = get_channel_logger(channel_config.name)
             channel_logger.info(f"频道初始化完成，ID: {channel_config.id}")
 
-    def start_channel(self, channel_id: str) -> bool:
+    def start_channel(self, channel_id: str, video_id: Optional[str] = None) -> bool:
         """
-        启动指定频道的监控
+        启动指定频道的监控，所有YTA代理都达到录制上限时加入等待队列
         
         Args:
             channel_id: 频道ID
+            video_id: 直播视频ID，按需录制模式下由直播检查结果传入
             
         Returns:
-            bool: 是否成功启动
+            bool: 是否成功启动，加入等待队列或按需录制模式下没有视频ID时返回 False
         """
         channel_process = self.channels.get(channel_id)
-        if channel_process and not channel_process.running:
-            channel_process.start()
+        if not channel_process or channel_process.running:
+            return False
+        if self.is_ondemand() and not video_id:
+            # 按需录制模式下不启动常驻监控进程，否则直播检查器会因进程已存在而跳过该频道
+            if self.logger:
+                self.logger.warning(f"按需录制模式下启动频道 {channel_process.config.name} ({channel_id}) 需要指定视频ID")
+            return False
             
-            channel_logger = get_channel_logger(channel_process.config.name)
+        video_id = video_id if self.is_ondemand() else None
+        with self.pending_lock:
+            # 频道指定了代理时不受代理组录制上限限制
+            if not channel_process.config.proxy and (self.pending_starts or not proxy_manager.has_yta_capacity()):
+                if channel_id not in self.pending_starts:
+                    get_channel_logger(channel_process.config.name).info("所有YTA代理的录制数都已达到上限，等待空闲后启动录制")
+                    if self.logger:
+                        self.logger.info(f"频道 {channel_process.config.name} ({channel_id}) 加入录制等待队列")
+                self.pending_starts[channel_id] = video_id
+                self.start_pending_channels()
+                return channel_process.running
+        
+        self._spawn(channel_process, video_id)
+        return True
+    
+    def _spawn(self, channel_process: ChannelProcess, video_id: Optional[str]):
+        """启动频道的 ytarchive 进程"""
+        channel_process.start(video_id)
+        
+        channel_logger = get_channel_logger(channel_process.config.name)
+        if channel_process.video_id:
+            channel_logger.info(f"已启动频道录制，视频ID: {channel_process.video_id}")
+        else:
             channel_logger.info(f"已启动频道录制")
-            
-            return True
-        return False
+    
+    def is_queued(self, channel_id: str) -> bool:
+        """频道是否在录制等待队列中"""
+        return channel_id in self.pending_starts
+    
+    def start_pending_channels(self) -> int:
+        """
+        按加入顺序启动等待队列中的频道，直到YTA代理再次达到录制上限
+        
+        Returns:
+            int: 启动的频道数
+        """
+        started = 0
+        with self.pending_lock:
+            while self.pending_starts and proxy_manager.has_yta_capacity():
+                channel_id = next(iter(self.pending_starts))
+                video_id = self.pending_starts.pop(channel_id)
+                channel_process = self.channels.get(channel_id)
+                if not channel_process or channel_process.running:
+                    continue
+                if self.logger:
+                    self.logger.info(f"代理有空闲，启动等待中的频道 {channel_process.config.name} ({channel_id})")
+                self._spawn(channel_process, video_id)
+                started += 1
+        return started
+    
+    def _on_process_error(self, channel_process: ChannelProcess, category: str, line: str):
+        """进程输出中识别到错误，提交到事件循环立即处理，没有事件循环时留给定期检查处理"""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        coro = self.handle_channel_error(channel_process.config.id, category, line)
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is loop:
+            loop.create_task(coro)
+        else:
+            try:
+                asyncio.run_coroutine_threadsafe(coro, loop)
+            except RuntimeError:
+                # 事件循环已关闭
+                coro.close()
+
+    def _on_process_exit(self, channel_process: ChannelProcess):
+        """进程退出后代理释放了录制名额，尝试启动等待中的频道"""
+        if self.pending_starts:
+            self.start_pending_channels()
 
     def stop_channel(self, channel_id: str) -> bool:
         """
-        停止指定频道的监控
+        停止指定频道的监控，在事件循环中调用时立即返回，停止过程在后台进行
         
         Args:
             channel_id: 频道ID
             
         Returns:
-            bool: 是否成功停止
+            bool: 是否已开始停止
         """
         channel_process = self.channels.get(channel_id)
         if channel_process and channel_process.running:
-            channel_process.stop()
-            
+            self._start_stop_task(channel_id, channel_process)
+            return True
+        # 取消等待中的启动
+        with self.pending_lock:
+            if channel_id in self.pending_starts:
+                del self.pending_starts[channel_id]
+                return True
+        return False
+
+    def _start_stop_task(self, channel_id: str, channel_process: ChannelProcess) -> Optional[asyncio.Task]:
+        """为频道创建后台停止任务，已有停止任务时直接复用"""
+        task = self.stop_tasks.get(channel_id)
+        if task and not task.done():
+            return task
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有事件循环时退回阻塞停止
+            channel_process.stop(self.stop_terminate_timeout)
+            get_channel_logger(channel_process.config.name).info(f"已停止频道录制")
+            return None
+
+        channel_process.stopping = True
+        channel_process.publish_status()
+        task = loop.create_task(self._stop_process(channel_process))
+        self.stop_tasks[channel_id] = task
+        task.add_done_callback(lambda t: self.stop_tasks.pop(channel_id, None) if self.stop_tasks.get(channel_id) is t else None)
+        return task
+
+    async def _stop_process(self, channel_process: ChannelProcess) -> bool:
+        """停止单个进程并记录日志"""
+        try:
+            success = await channel_process.stop_async(self.stop_interrupt_timeout, self.stop_terminate_timeout)
+        except Exception as e:
+            channel_process.stopping = False
+            if self.logger:
+                self.logger.error(f"停止频道 {channel_process.config.name} ({channel_process.config.id}) 时出错: {e}")
+            return False
+
+        if success:
             # 记录到频道专用日志
             channel_logger = get_channel_logger(channel_process.config.name)
             channel_logger.info(f"已停止频道录制")
+        return success
+
+    async def stop_channel_async(self, channel_id: str) -> bool:
+        """
+        停止指定频道的监控并等待进程退出
+        
+        Args:
+            channel_id: 频道ID
             
+        Returns:
+            bool: 是否成功停止
+        """
+        channel_process = self.channels.get(channel_id)
+        if not channel_process or not channel_process.running:
+            return False
+        task = self._start_stop_task(channel_id, channel_process)
+        if task is None:
             return True
-        return False
+        return await task
+
+    async def stop_all_channels(self):
+        """并发停止所有正在运行的频道"""
+        # 先清空等待队列，避免进程退出时启动等待中的频道
+        with self.pending_lock:
+            self.pending_starts.clear()
+        tasks = [self.stop_channel_async(channel_id) for channel_id, channel_process in self.channels.items()
+                 if channel_process.running]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     def add_channel(self, channel_config: ChannelConfig, ytarchive_path: str, 
                     global_output: Optional[str] = None,
@@ -349,15 +980,18 @@ class ChannelManager:
         if channel_config.id in self.channels:
             return False
             
-        channel_process = ChannelProcess(
+        channel_process = self.process_class(
             config=channel_config, 
             ytarchive_path=ytarchive_path,
             global_proxy=None,  # 不再使用global_proxy，而是通过proxy_manager获取
             global_output=global_output,
             global_output_file=global_output_file,
             global_options=global_options,
-            logger=self.logger
+            logger=self.logger,
+            log_buffer_size=self.log_buffer_size
         )
+        channel_process.on_exit = self._on_process_exit
+        channel_process.on_error = self._on_process_error
         self.channels[channel_config.id] = channel_process
         
         # 记录到频道专用日志
@@ -366,8 +1000,9 @@ class ChannelManager:
         
         # 检查是否需要自动录制
         should_record = channel_config.autoRecord if channel_config.autoRecord is not None else auto_record
-        if should_record:
-            channel_process.start()
+        # 按需录制模式下由直播检查器在开播时启动进程
+        if should_record and not self.is_ondemand():
+            self.start_channel(channel_config.id)
             channel_logger.info("根据配置自动启动录制")
             
         return True
@@ -383,13 +1018,16 @@ class ChannelManager:
             bool: 是否成功删除
         """
         channel_process = self.channels.pop(channel_id, None)
+        with self.pending_lock:
+            self.pending_starts.pop(channel_id, None)
         if channel_process:
             # 记录到频道日志
             channel_logger = get_channel_logger(channel_process.config.name)
             channel_logger.info(f"频道已被删除")
             
             # 停止进程
-            channel_process.stop()
+            if channel_process.running:
+                self._start_stop_task(channel_id, channel_process)
             return True
         return False
         
@@ -406,28 +1044,7 @@ class ChannelManager:
         channel_process = self.channels.get(channel_id)
         if not channel_process:
             return None
-            
-        if not channel_process.running:
-            return {
-                "running": False,
-                "pid": None,
-                "recording_state": None,
-                "video_title": None,
-                "quality": None,
-                "start_time": None,
-                "file_size": None,
-            }
-            
-        status_info = channel_process.parse_latest_status()
-        return {
-            "running": True,
-            "pid": channel_process.pid,
-            "recording_state": status_info.get("recording_state"),
-            "video_title": status_info.get("video_title"),
-            "quality": status_info.get("quality"),
-            "start_time": status_info.get("start_time"),
-            "file_size": status_info.get("file_size"),
-        }
+        return channel_process.get_status()
         
     def get_channel_logs(self, channel_id: str) -> List[str]:
         """
@@ -441,8 +1058,25 @@ class ChannelManager:
         """
         channel_process = self.channels.get(channel_id)
         if channel_process:
-            return channel_process.logs
+            return channel_process.log_buffer.tail()
         return []
+
+    def get_channel_logs_since(self, channel_id: str, seq: int, limit: Optional[int] = None) -> Optional[Tuple[List[str], int]]:
+        """
+        获取频道序号大于 seq 的内存日志
+        
+        Args:
+            channel_id: 频道ID
+            seq: 已收到的最后一行序号
+            limit: 最多返回的行数
+            
+        Returns:
+            Optional[Tuple[List[str], int]]: (日志列表, 最后一行序号)，频道不存在时返回None
+        """
+        channel_process = self.channels.get(channel_id)
+        if channel_process:
+            return channel_process.log_buffer.since(seq, limit)
+        return None
         
     def get_all_channels_status(self) -> List[Dict[str, Any]]:
         """
@@ -457,6 +1091,7 @@ class ChannelManager:
                 "id": channel_process.config.id,
                 "name": channel_process.config.name,
                 "running": channel_process.running,
+                "stopping": channel_process.stopping,
                 "pid": channel_process.pid,
                 "is_live": False,
                 "recording_state": None,
@@ -465,15 +1100,15 @@ class ChannelManager:
             
             if channel_process.running:
                 detailed_status = channel_process.parse_latest_status()
-                status["recording_state"] = detailed_status.get("recording_state")
+                status["recording_state"] = "停止中" if channel_process.stopping else detailed_status.get("recording_state")
                 status["video_title"] = detailed_status.get("video_title")
-                status["is_live"] = detailed_status.get("recording_state") == "录制中"
+                status["is_live"] = status["recording_state"] == "录制中"
                 
             channels_status.append(status)
         
         return channels_status 
 
-    def restart_channel_with_new_proxy(self, channel_id: str) -> bool:
+    async def restart_channel_with_new_proxy(self, channel_id: str) -> bool:
         """重启频道并更换代理
         
         Args:
@@ -497,11 +1132,13 @@ class ChannelManager:
             channel_logger = get_channel_logger(channel_process.config.name)
             channel_logger.warning(f"代理 {current_proxy} 已标记为失败")
         
-        # 停止当前进程
-        self.stop_channel(channel_id)
+        # 停止当前进程并等待退出，按需录制模式下重启后继续录制同一视频
+        video_id = channel_process.video_id
+        await self.stop_channel_async(channel_id)
         
-        # 重新启动进程（会自动获取新的代理）
-        success = self.start_channel(channel_id)
+        # 重新启动进程，失败的代理未达到熔断阈值时仍可选，本次启动避开它
+        channel_process.excluded_proxy = current_proxy
+        success = self.start_channel(channel_id, video_id)
         
         if success:
             if self.logger:
@@ -512,23 +1149,132 @@ class ChannelManager:
             
         return False
 
+    async def restart_channel_with_new_cookie(self, channel_id: str) -> bool:
+        """标记当前cookie失效，重启频道并更换cookie
+        
+        Args:
+            channel_id: 频道ID
+            
+        Returns:
+            bool: 是否成功重启
+        """
+        channel_process = self.channels.get(channel_id)
+        if not channel_process:
+            return False
+
+        channel_logger = get_channel_logger(channel_process.config.name)
+        cookie_file = channel_process.cookie_file
+        if not cookie_file:
+            # 没有从cookie管理器分配cookie，无法更换
+            channel_logger.warning("cookie失效，但未使用cookie管理器分配的cookie，无法更换")
+            return False
+
+        cookie_manager.mark_cookie_failed(cookie_file, "ytarchive进程报告cookie失效")
+        if self.logger:
+            self.logger.warning(f"频道 {channel_process.config.name} ({channel_id}) 的cookie {os.path.basename(cookie_file)} 已标记为失效")
+        channel_logger.warning(f"cookie {os.path.basename(cookie_file)} 已标记为失效")
+
+        video_id = channel_process.video_id
+        await self.stop_channel_async(channel_id)
+        success = self.start_channel(channel_id, video_id)
+
+        if success:
+            if self.logger:
+                self.logger.info(f"频道 {channel_process.config.name} ({channel_id}) 已使用新cookie重启")
+            channel_logger.info("已使用新cookie重启录制")
+        return success
+
+    def _restart_delay(self, channel_id: str, video_id: Optional[str]) -> Optional[float]:
+        """
+        记录一次因错误的自动重启并计算重启前的等待时间
+
+        Returns:
+            Optional[float]: 等待秒数，达到重启次数上限时返回None
+        """
+        now = time.time()
+        # 清理窗口外的记录
+        for key in list(self.restart_times):
+            self.restart_times[key] = [t for t in self.restart_times[key] if now - t < RESTART_WINDOW]
+            if not self.restart_times[key]:
+                del self.restart_times[key]
+        times = self.restart_times.setdefault((channel_id, video_id), [])
+        if len(times) >= RESTART_LIMIT:
+            return None
+        times.append(now)
+        return RESTART_BACKOFF * 2 ** (len(times) - 2) if len(times) > 1 else 0
+
+    async def handle_channel_error(self, channel_id: str, category: str, line: str) -> bool:
+        """按错误分类处理频道 ytarchive 输出中的错误
+        
+        Args:
+            channel_id: 频道ID
+            category: 错误分类，见 ERROR_RULES
+            line: 错误输出行
+            
+        Returns:
+            bool: 是否重启了频道
+        """
+        channel_process = self.channels.get(channel_id)
+        if not channel_process or not channel_process.running:
+            return False
+        error = channel_process.last_errors.get(category)
+        if error:
+            if error["handled"]:
+                return False
+            error["handled"] = True
+
+        channel_name = channel_process.config.name
+        channel_logger = get_channel_logger(channel_name)
+        if self.logger:
+            self.logger.warning(f"频道 {channel_name} ({channel_id}) 检测到ytarchive错误 ({category}): {line}")
+        channel_logger.warning(f"检测到ytarchive错误 ({category}): {line}")
+
+        if category in ("cookie", "proxy"):
+            video_id = channel_process.video_id
+            delay = self._restart_delay(channel_id, video_id)
+            if delay is None:
+                if self.logger:
+                    self.logger.error(f"频道 {channel_name} ({channel_id}) 在 {RESTART_WINDOW} 秒内已自动重启 {RESTART_LIMIT} 次，不再自动重启")
+                channel_logger.error("自动重启次数已达上限，不再自动重启")
+                return False
+            if delay:
+                channel_logger.info(f"{delay} 秒后重启录制")
+                await asyncio.sleep(delay)
+                # 等待期间频道被停止或已开始录制其他视频
+                if not channel_process.running or channel_process.video_id != video_id:
+                    return False
+
+        if category == "cookie":
+            return await self.restart_channel_with_new_cookie(channel_id)
+        if category == "proxy":
+            success = await self.restart_channel_with_new_proxy(channel_id)
+            if not success:
+                if self.logger:
+                    self.logger.error(f"频道 {channel_name} ({channel_id}) 重启失败")
+                channel_logger.error("重启失败")
+            return success
+        if category == "throttle":
+            # 与直播检查共用出口的限速，ytarchive 会自行重试
+            rate_limiter.on_throttle(channel_process.get_current_proxy())
+        return False
+
     def check_all_channels_errors(self) -> List[Dict[str, Any]]:
         """检查所有频道的ytarchive错误
         
         Returns:
-            List[Dict[str, Any]]: 错误信息列表，每个元素包含channel_id和error_message
+            List[Dict[str, Any]]: 错误信息列表，每个元素包含channel_id、error_message和category
         """
         errors = []
         for channel_id, channel_process in self.channels.items():
             if not channel_process.running:
                 continue
                 
-            error_message = channel_process.check_ytarchive_errors()
-            if error_message:
+            for error in channel_process.check_ytarchive_errors():
                 errors.append({
                     "channel_id": channel_id,
                     "channel_name": channel_process.config.name,
-                    "error_message": error_message,
+                    "error_message": error["line"],
+                    "category": error["category"],
                     "current_proxy": channel_process.get_current_proxy()
                 })
                 
@@ -1,18 +1,23 @@
 # main.py
 
-import re, uvicorn, asyncio, time, os
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
+import re, uvicorn, asyncio, time, os, heapq, json
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
 from typing import Dict, List, Any, Optional
 from pydantic import BaseModel
 from ruamel.yaml import YAML
 from ruamel.yaml.scalarstring import DoubleQuotedScalarString
 
 from core.ytarchive import ChannelConfig, ChannelManager
-from core.youtubeCheck import youtubeCheck
-from core.logs import get_main_logger, get_channel_logger, get_main_logs, get_channel_logs
+from core.youtubeCheck import youtubeCheck, check_cache, get_upcoming_streams
+from core.logs import get_main_logger, get_channel_logger, get_channel_logs, get_channel_log_file, get_main_log_file, read_log_tail
 from core.proxy import proxy_manager
 from core.cookie import cookie_manager
+from core.client import client_pool
+from core.events import event_bus
+from core.ratelimit import rate_limiter
+from core.probe import probe_selector
+from core.history import live_history
 
 #---------------------------------------------
 # 日志
@@ -20,6 +25,11 @@ from core.cookie import cookie_manager
 main_logger = get_main_logger()
 
 proxy_manager.logger = main_logger
+client_pool.logger = main_logger
+event_bus.logger = main_logger
+rate_limiter.logger = main_logger
+probe_selector.logger = main_logger
+live_history.logger = main_logger
 
 #---------------------------------------------
 # 模型定义
@@ -42,20 +52,26 @@ class ChannelStatusModel(BaseModel):
 
 class LogResponseModel(BaseModel):
     logs: List[str]
+    last_seq: Optional[int] = None
+    offset: Optional[int] = None
 
 class DetailedStatusModel(BaseModel):
     running: bool
+    stopping: bool = False
     checking: bool
     recording_state: Optional[str] = None
     video_title: Optional[str] = None
     quality: Optional[str] = None
     start_time: Optional[str] = None
     file_size: Optional[str] = None
+    bytes_downloaded: Optional[int] = None
+    last_progress_time: Optional[float] = None
 
 class ChannelFullStatusModel(BaseModel):
     id: str
     name: str
     running: bool
+    stopping: bool = False
     checking: bool
     pid: Optional[int] = None
     is_live: bool = False
@@ -81,26 +97,55 @@ def load_config():
         "port": config_dict.get("port", 45678),
         "auto_check": config_dict.get("autoCheck", False),
         "check_interval": config_dict.get("checkInterval", 300),
+        "check_concurrency": config_dict.get("checkConcurrency", 5),
+        "upcoming_check": config_dict.get("upcomingCheck", {}),
         "auto_record": config_dict.get("autoRecord", False),
     }
     
+    http_config = config_dict.get("http", {})
+    config["http_config"] = http_config
+    client_pool.set_config(http_config)
+    
+    rate_limit_config = config_dict.get("rateLimit", {})
+    config["rate_limit_config"] = rate_limit_config
+    rate_limiter.set_config(rate_limit_config)
+    
+    check_cache_config = config_dict.get("checkCache", {})
+    config["check_cache_config"] = check_cache_config
+    check_cache.set_config(check_cache_config)
+    
+    probe_config = config_dict.get("probe", {})
+    config["probe_config"] = probe_config
+    probe_selector.set_config(probe_config)
+    
+    adaptive_check_config = config_dict.get("adaptiveCheck", {})
+    config["adaptive_check_config"] = adaptive_check_config
+    live_history.set_config(adaptive_check_config)
+    
     proxy_config = config_dict.get("proxy", {})
     config["proxy_config"] = proxy_config
     proxy_manager.set_config(proxy_config)
     config["api_proxy"] = proxy_manager.get_api_proxy()
     
-    cookie_config = config_dict.get("cookie", {})
+    ytarchive_config = config_dict.get('ytarchive', {})
+    
+    # cookie 配置位于 ytarchive 下，兼容放在顶层的旧配置
+    cookie_config = ytarchive_config.get("cookie") or config_dict.get("cookie") or {}
     config["cookie_config"] = cookie_config
     
-    cookie_manager.set_config(cookie_config)
     cookie_manager.logger = main_logger
+    cookie_manager.set_config(cookie_config)
     
-    ytarchive_config = config_dict.get('ytarchive', {})
     config["ytarchive_path"] = ytarchive_config.get('ytaPath')
     config["ytarchive_proxy"] = proxy_manager.get_yta_proxy()
     config["ytarchive_output"] = ytarchive_config.get('output')
     config["ytarchive_output_file"] = ytarchive_config.get('output_file')
     config["ytarchive_options"] = ytarchive_config.get('options', {})
+    config["record_mode"] = ytarchive_config.get('recordMode', 'monitor')
+    config["ytarchive_engine"] = ytarchive_config.get('engine', 'thread')
+    config["stop_interrupt_timeout"] = ytarchive_config.get('stopInterruptTimeout', 30)
+    config["stop_terminate_timeout"] = ytarchive_config.get('stopTerminateTimeout', 10)
+    config["log_buffer_size"] = ytarchive_config.get('logBufferSize', 1000)
     
     config["channels"] = []
     for user in config_dict.get('user', []):
@@ -136,6 +181,7 @@ def save_config(config):
     config_dict["port"] = config.get("port", 45678)
     config_dict["autoCheck"] = config.get("auto_check", False)
     config_dict["checkInterval"] = config.get("check_interval", 300)
+    config_dict["checkConcurrency"] = config.get("check_concurrency", 5)
     config_dict["autoRecord"] = config.get("auto_record", False)
 
     if config.get("proxy_config"):
@@ -155,19 +201,21 @@ def save_config(config):
             for group_name, proxies in proxy_config["groups"].items():
                 config_dict["proxy"]["groups"][group_name] = proxies
     
+    if 'ytarchive' not in config_dict:
+        config_dict['ytarchive'] = {}
+    ytarchive_config = config_dict['ytarchive']
+
     if config.get("cookie_config"):
         cookie_config = config["cookie_config"]
         
-        if "cookie" not in config_dict:
-            config_dict["cookie"] = {}
+        # 写回读取时所在的位置，旧配置的 cookie 在顶层
+        cookie_section = config_dict if "cookie" in config_dict else ytarchive_config
+        if "cookie" not in cookie_section:
+            cookie_section["cookie"] = {}
             
-        config_dict["cookie"]["enable"] = cookie_config.get("enable", False)
+        cookie_section["cookie"]["enable"] = cookie_config.get("enable", False)
         if "path" in cookie_config:
-            config_dict["cookie"]["path"] = cookie_config["path"]
-
-    if 'ytarchive' not in config_dict:
-        config_dict['ytarchive'] = {}
-    ytarchive_config = config_dict['ytarchive']
+            cookie_section["cookie"]["path"] = cookie_config["path"]
     if config.get("ytarchive_path"):
         ytarchive_config['ytaPath'] = DoubleQuotedScalarString(config["ytarchive_path"])
     if config.get("ytarchive_proxy"):
@@ -179,6 +227,11 @@ def save_config(config):
     else:
         ytarchive_config.pop('output_file', None)
     ytarchive_config['options'] = config.get("ytarchive_options", {})
+    ytarchive_config['recordMode'] = config.get("record_mode", "monitor")
+    ytarchive_config['engine'] = config.get("ytarchive_engine", "thread")
+    ytarchive_config['stopInterruptTimeout'] = config.get("stop_interrupt_timeout", 30)
+    ytarchive_config['stopTerminateTimeout'] = config.get("stop_terminate_timeout", 10)
+    ytarchive_config['logBufferSize'] = config.get("log_buffer_size", 1000)
     
     user_list = []
     for channel in config.get("channels", []):
@@ -231,11 +284,28 @@ class LiveStatusChecker:
         self.checking_channels = set()
         self.check_tasks = {}
         self.check_interval = config.get("check_interval", 300)
+        self.check_concurrency = max(1, config.get("check_concurrency", 5))
+        self.check_semaphore = asyncio.Semaphore(self.check_concurrency)
+        # 预约直播的密集检查: 计划开始前 pre_window 秒到开始后 post_window 秒内每 interval 秒检查一次
+        upcoming_check = config.get("upcoming_check") or {}
+        self.upcoming_pre_window = upcoming_check.get("preWindow", 120)
+        self.upcoming_post_window = upcoming_check.get("postWindow", 1800)
+        self.upcoming_interval = upcoming_check.get("interval", 20)
+        # 已知有预约直播时，窗口外的检查间隔可以放宽到检查间隔的倍数
+        self.upcoming_backoff = upcoming_check.get("backoffFactor", 2)
+        # 调度队列，元素为 (到期时间, 频道ID)
+        self.check_queue = []
+        self.next_check_times = {}
+        self.queue_event = asyncio.Event()
+        self.scheduler_task = None
+        self.spread_index = 0
+        # 最近一次检查到的直播信息
+        self.live_streams = {}
         self.error_check_interval = 60
         self.error_check_tasks = {}
         
         if self.logger:
-            self.logger.info(f"创建直播状态检查器，检查间隔为 {self.check_interval}秒")
+            self.logger.info(f"创建直播状态检查器，检查间隔为 {self.check_interval}秒，最大并发检查数为 {self.check_concurrency}")
             self.logger.info(f"ytarchive错误检查间隔为 {self.error_check_interval}秒")
     
     async def check_channel_live_status(self, channel_id: str) -> bool:
@@ -252,7 +322,8 @@ class LiveStatusChecker:
             channel_status = self.manager.get_channel_status(channel_id)
             if channel_status and channel_status.get("running"):
                 is_recording = channel_status.get("recording_state") == "录制中"
-                if is_recording:
+                # 按需录制模式下进程只在录制直播时存在
+                if is_recording or self.manager.is_ondemand():
                     if self.logger:
                         self.logger.info(f"频道 {channel.name} ({channel_id}) 已经在录制中")
                     channel_logger.info("频道已经在录制中，跳过检查")
@@ -261,10 +332,13 @@ class LiveStatusChecker:
             if self.logger:
                 self.logger.info(f"正在检查频道 {channel.name} ({channel_id}) 的直播状态")
                 
-            api_proxy = proxy_manager.get_api_proxy()
+            api_proxy = proxy_manager.get_api_proxy(channel_key=channel_id)
             result = await youtubeCheck(channel_id, api_proxy, channel_logger)
+            self.live_streams[channel_id] = result or []
             
             if result:
+                for stream in result:
+                    live_history.record_live(channel_id, stream.get("video_id"))
                 title = result[0].get('title', 'Unknown Title')
                 if self.logger:
                     self.logger.info(f"检测到频道 {channel.name} ({channel_id}) 正在直播: {title}")
@@ -315,54 +389,157 @@ class LiveStatusChecker:
             return False
 
     async def run_channel_check(self, channel_id: str):
-        """运行单个频道的定期检查"""
+        """执行单个频道的一次定期检查，结束后重新排入调度队列"""
         channel = next((c for c in self.config["channels"] if c.id == channel_id), None)
         if not channel:
             if self.logger:
                 self.logger.error(f"找不到频道 {channel_id}")
+            self.checking_channels.discard(channel_id)
+            self.next_check_times.pop(channel_id, None)
+            self.check_tasks.pop(channel_id, None)
             return
 
         channel_logger = get_channel_logger(channel.name)
 
         try:
-            self.checking_channels.add(channel_id)
-            if self.logger:
-                self.logger.info(f"开始定期检查频道 {channel.name} ({channel_id}) 的直播状态")
-            channel_logger.info("开始定期检查直播状态")
+            is_live = await self.check_channel_live_status(channel_id)
             
-            while channel_id in self.checking_channels:
-                is_live = await self.check_channel_live_status(channel_id)
-                
-                if is_live:
-                    should_record = channel.autoRecord if channel.autoRecord is not None else self.config.get('auto_record', False)
-                    if should_record:
-                        success = self.manager.start_channel(channel_id)
-                        if success:
-                            if self.logger:
-                                self.logger.info(f"已自动启动频道 {channel.name} ({channel_id}) 的录制")
-                            channel_logger.info("已自动启动录制")
-                        else:
-                            channel_logger.warning("尝试自动启动录制失败")
-                
-                if self.logger:
-                    self.logger.info(f"频道 {channel.name} 将在 {self.check_interval} 秒后再次检查")
-                channel_logger.info(f"将在 {self.check_interval} 秒后再次检查")
-                await asyncio.sleep(self.check_interval)
+            if is_live:
+                should_record = channel.autoRecord if channel.autoRecord is not None else self.config.get('auto_record', False)
+                if should_record:
+                    live_streams = self.live_streams.get(channel_id) or [{}]
+                    success = self.manager.start_channel(channel_id, video_id=live_streams[0].get("video_id"))
+                    if success:
+                        if self.logger:
+                            self.logger.info(f"已自动启动频道 {channel.name} ({channel_id}) 的录制")
+                        channel_logger.info("已自动启动录制")
+                    elif self.manager.is_queued(channel_id):
+                        channel_logger.info("代理录制数已满，录制已加入等待队列")
+                    else:
+                        channel_logger.warning("尝试自动启动录制失败")
         
         except asyncio.CancelledError:
             if self.logger:
                 self.logger.info(f"停止频道 {channel.name} ({channel_id}) 的定期检查")
             channel_logger.info("停止定期检查")
-            self.checking_channels.discard(channel_id)
+            raise
         except Exception as e:
             error_msg = f"频道 {channel_id} 的定期检查任务出错: {e}"
             if self.logger:
                 self.logger.error(error_msg)
             channel_logger.error(f"定期检查任务出错: {e}")
-            self.checking_channels.discard(channel_id)
+        finally:
+            if self.check_tasks.get(channel_id) is asyncio.current_task():
+                self.check_tasks.pop(channel_id)
+
+        if channel_id in self.checking_channels:
+            delay = self._next_check_delay(channel_id)
+            self._schedule_check(channel_id, time.monotonic() + delay)
+            if self.logger:
+                self.logger.info(f"频道 {channel.name} 将在 {delay:.0f} 秒后再次检查")
+            channel_logger.info(f"将在 {delay:.0f} 秒后再次检查")
+
+    def _next_check_delay(self, channel_id: str) -> float:
+        """计算频道下一次检查的延迟
+        
+        基础间隔由频道的开播历史决定，有预约直播时在计划开始时间附近密集检查
+        """
+        interval = live_history.suggest_interval(channel_id, self.check_interval)
+        upcoming = [stream["scheduled_start"] for stream in get_upcoming_streams(channel_id) if stream.get("scheduled_start")]
+        if not upcoming:
+            return interval
+
+        now = time.time()
+        delay = None
+        for scheduled_start in upcoming:
+            window_start = scheduled_start - self.upcoming_pre_window
+            window_end = scheduled_start + self.upcoming_post_window
+            if now >= window_end:
+                continue
+            candidate = self.upcoming_interval if now >= window_start else window_start - now
+            delay = candidate if delay is None else min(delay, candidate)
+
+        if delay is None:
+            # 预约的时间都已过去，按正常间隔检查
+            return interval
+        return max(1, min(delay, interval * self.upcoming_backoff))
+
+    def get_check_schedule(self, channel_id: str) -> dict:
+        """获取频道的检查计划，包括当前间隔、下次检查时间和开播历史"""
+        next_check_in = None
+        due_time = self.next_check_times.get(channel_id)
+        if due_time is not None:
+            next_check_in = max(0, round(due_time - time.monotonic()))
+        return {
+            "interval": round(self._next_check_delay(channel_id)),
+            "next_check_in": next_check_in,
+            "history": live_history.get_channel_summary(channel_id),
+        }
+
+    def _schedule_check(self, channel_id: str, due_time: float):
+        """将频道的下一次检查排入优先队列"""
+        self.next_check_times[channel_id] = due_time
+        heapq.heappush(self.check_queue, (due_time, channel_id))
+        self.queue_event.set()
 
-    def start_channel_check(self, channel_id: str) -> bool:
-        """开始检查特定频道的直播状态"""
+    async def run_scheduler(self):
+        """调度循环，按到期时间依次派发检查，并发数受 check_concurrency 限制"""
+        try:
+            while True:
+                if not self.check_queue:
+                    self.queue_event.clear()
+                    await self.queue_event.wait()
+                    continue
+
+                due_time, channel_id = self.check_queue[0]
+                delay = due_time - time.monotonic()
+                if delay > 0:
+                    self.queue_event.clear()
+                    try:
+                        await asyncio.wait_for(self.queue_event.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                heapq.heappop(self.check_queue)
+                # 已停止检查或已被重新安排的过期条目直接丢弃
+                if channel_id not in self.checking_channels or self.next_check_times.get(channel_id) != due_time:
+                    continue
+                if channel_id in self.check_tasks:
+                    continue
+
+                await self.check_semaphore.acquire()
+                if channel_id not in self.checking_channels:
+                    self.check_semaphore.release()
+                    continue
+                self.next_check_times.pop(channel_id, None)
+                task = asyncio.create_task(self.run_channel_check(channel_id))
+                # 在任务结束时释放并发名额，任务在开始执行前被取消时也会释放
+                task.add_done_callback(lambda _: self.check_semaphore.release())
+                self.check_tasks[channel_id] = task
+        except asyncio.CancelledError:
+            if self.logger:
+                self.logger.info("直播状态检查调度器已停止")
+            raise
+
+    def _ensure_scheduler(self):
+        """确保调度循环在运行"""
+        if self.scheduler_task is None or self.scheduler_task.done():
+            self.scheduler_task = asyncio.create_task(self.run_scheduler())
+
+    def _spread_offset(self) -> float:
+        """计算新加入频道的首次检查偏移，使用黄金分割序列把频道均匀分布在检查间隔内"""
+        offset = (self.spread_index * 0.6180339887498949) % 1.0
+        self.spread_index += 1
+        return offset * self.check_interval
+
+    def start_channel_check(self, channel_id: str, immediate: bool = False) -> bool:
+        """开始检查特定频道的直播状态
+        
+        Args:
+            channel_id: 频道ID
+            immediate: 是否立即执行首次检查，否则首次检查时间在检查间隔内错开
+        """
         if channel_id in self.checking_channels:
             return False
             
@@ -374,11 +551,14 @@ class LiveStatusChecker:
             
         channel_logger = get_channel_logger(channel.name)
         
-        task = asyncio.create_task(self.run_channel_check(channel_id))
-        self.check_tasks[channel_id] = task
+        self.checking_channels.add(channel_id)
+        event_bus.publish("status", {"channel_id": channel_id, "checking": True})
+        offset = 0 if immediate else self._spread_offset()
+        self._schedule_check(channel_id, time.monotonic() + offset)
+        self._ensure_scheduler()
         
         if self.logger:
-            self.logger.info(f"已启动频道 {channel.name} ({channel_id}) 的直播状态检查")
+            self.logger.info(f"已启动频道 {channel.name} ({channel_id}) 的直播状态检查，首次检查将在 {offset:.0f} 秒后进行")
         channel_logger.info("已启动直播状态检查")
         return True
 
@@ -392,11 +572,13 @@ class LiveStatusChecker:
         if channel:
             channel_logger = get_channel_logger(channel.name)
             
+        self.checking_channels.discard(channel_id)
+        self.next_check_times.pop(channel_id, None)
+        event_bus.publish("status", {"channel_id": channel_id, "checking": False})
+        
         if channel_id in self.check_tasks:
             task = self.check_tasks.pop(channel_id)
             task.cancel()
-            
-        self.checking_channels.discard(channel_id)
         
         if channel:
             if self.logger:
@@ -404,6 +586,12 @@ class LiveStatusChecker:
             channel_logger.info("已停止直播状态检查")
         return True
 
+    def stop_scheduler(self):
+        """停止调度循环"""
+        if self.scheduler_task and not self.scheduler_task.done():
+            self.scheduler_task.cancel()
+        self.scheduler_task = None
+
     def is_checking(self, channel_id: str) -> bool:
         """检查是否正在监控指定频道的状态"""
         return channel_id in self.checking_channels
@@ -413,7 +601,7 @@ class LiveStatusChecker:
         return list(self.checking_channels)
 
     async def check_ytarchive_errors(self):
-        """定期检查所有频道的ytarchive错误"""
+        """定期检查所有频道未被及时处理的ytarchive错误，错误通常在输出时已由频道管理器处理"""
         while True:
             try:
                 errors = self.manager.check_all_channels_errors()
@@ -424,25 +612,12 @@ class LiveStatusChecker:
                     error_message = error["error_message"]
                     current_proxy = error["current_proxy"]
                     
-                    if self.logger:
-                        self.logger.warning(f"频道 {channel_name} ({channel_id}) 检测到ytarchive错误: {error_message}")
-                        if current_proxy:
-                            self.logger.warning(f"当前使用的代理: {current_proxy}")
-                    
-                    channel_logger = get_channel_logger(channel_name)
-                    channel_logger.warning(f"检测到ytarchive错误: {error_message}")
                     if current_proxy:
-                        channel_logger.warning(f"当前使用的代理: {current_proxy}")
-                    
-                    success = self.manager.restart_channel_with_new_proxy(channel_id)
-                    if success:
-                        if self.logger:
-                            self.logger.info(f"频道 {channel_name} ({channel_id}) 已使用新代理重启")
-                        channel_logger.info("已使用新代理重启录制")
-                    else:
                         if self.logger:
-                            self.logger.error(f"频道 {channel_name} ({channel_id}) 重启失败")
-                        channel_logger.error("重启失败")
+                            self.logger.warning(f"频道 {channel_name} ({channel_id}) 当前使用的代理: {current_proxy}")
+                        get_channel_logger(channel_name).warning(f"当前使用的代理: {current_proxy}")
+                    
+                    await self.manager.handle_channel_error(channel_id, error["category"], error_message)
                 
                 await asyncio.sleep(self.error_check_interval)
                 
@@ -472,7 +647,10 @@ class LiveStatusChecker:
 #---------------------------------------------
 # 加载配置并初始化频道管理器
 config = load_config()
-manager = ChannelManager(logger=main_logger)
+manager = ChannelManager(logger=main_logger, record_mode=config["record_mode"], engine=config["ytarchive_engine"])
+manager.stop_interrupt_timeout = config["stop_interrupt_timeout"]
+manager.stop_terminate_timeout = config["stop_terminate_timeout"]
+manager.log_buffer_size = config["log_buffer_size"]
 manager.initialize_channels(
     channels=config["channels"],
     ytarchive_path=config["ytarchive_path"],
@@ -492,6 +670,8 @@ app = FastAPI()
 async def startup_event():
     """FastAPI启动时的处理"""
     main_logger.info("服务已启动")
+    event_bus.bind_loop(asyncio.get_running_loop())
+    manager.bind_loop(asyncio.get_running_loop())
     global_auto_check = config.get("auto_check", False)
     if global_auto_check:
         main_logger.info("根据全局配置自动启动频道状态检查")
@@ -509,6 +689,15 @@ async def startup_event():
     # 启动cookie定时更新任务
     if cookie_manager.enabled:
         cookie_manager.start_update_scheduler()
+    
+    # 启动cookie目录监视任务
+    cookie_manager.start_watcher()
+    
+    # 启动HTTP客户端空闲回收任务
+    client_pool.start_cleanup_task()
+    
+    # 启动代理健康探测任务
+    proxy_manager.start_health_prober()
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -516,12 +705,26 @@ async def shutdown_event():
     checking_channels = status_checker.get_checking_channels()
     for channel_id in checking_channels:
         status_checker.stop_channel_check(channel_id)
+    status_checker.stop_scheduler()
     
     # 停止ytarchive错误检查
     status_checker.stop_error_check()
     
+    # 并发停止所有录制进程，给 ytarchive 留出合并文件的时间
+    await manager.stop_all_channels()
+    
     # 停止cookie定时更新任务
     cookie_manager.stop_update_scheduler()
+    cookie_manager.stop_watcher()
+    
+    # 停止代理健康探测任务
+    proxy_manager.stop_health_prober()
+    
+    # 关闭所有HTTP客户端
+    await client_pool.close()
+    
+    # 结束所有事件推送连接
+    event_bus.close()
     
     main_logger.info("服务关闭，已停止所有任务")
 
@@ -573,14 +776,21 @@ async def get_channel(channel_id: str):
         "id": channel_id,
         "name": channel_process.config.name,
         "running": status["running"],
+        "stopping": status.get("stopping", False),
         "checking": status_checker.is_checking(channel_id),
         "pid": channel_process.pid,
+        "video_id": channel_process.video_id if status["running"] else None,
         "is_live": status.get("recording_state") == "录制中",
         "recording_state": status.get("recording_state"),
         "video_title": status.get("video_title"),
         "quality": status.get("quality"),
         "start_time": status.get("start_time"),
         "file_size": status.get("file_size"),
+        "bytes_downloaded": status.get("bytes_downloaded"),
+        "last_progress_time": status.get("last_progress_time"),
+        "probe_stats": probe_selector.get_channel_stats(channel_id),
+        "upcoming_streams": get_upcoming_streams(channel_id),
+        "check_schedule": status_checker.get_check_schedule(channel_id),
         "config": {
             "proxy": channel_process.config.proxy,
             "output": channel_process.config.output,
@@ -637,7 +847,7 @@ async def delete_channel(channel_id: str):
 @app.post("/channels/{channel_id}/start")
 async def start_channel_check(channel_id: str):
     """启动频道状态检查"""
-    success = status_checker.start_channel_check(channel_id)
+    success = status_checker.start_channel_check(channel_id, immediate=True)
     if success:
         return {"status": "started", "channel_id": channel_id, "message": "频道状态检查已启动"}
     else:
@@ -653,11 +863,19 @@ async def stop_channel_check(channel_id: str):
         return {"status": "failed", "channel_id": channel_id, "message": "频道状态检查停止失败，可能未在运行"}
 
 @app.post("/channels/{channel_id}/startrecord")
-async def start_channel_record(channel_id: str):
-    """启动频道录制"""
-    success = manager.start_channel(channel_id)
+async def start_channel_record(channel_id: str, video_id: Optional[str] = None):
+    """启动频道录制
+    
+    Args:
+        video_id: 直播视频ID，按需录制模式下必须指定
+    """
+    if manager.is_ondemand() and not video_id:
+        return {"status": "failed", "channel_id": channel_id, "message": "按需录制模式下需要指定视频ID (video_id)"}
+    success = manager.start_channel(channel_id, video_id)
     if success:
         return {"status": "started", "channel_id": channel_id, "message": "频道录制已启动"}
+    elif manager.is_queued(channel_id):
+        return {"status": "queued", "channel_id": channel_id, "message": "代理录制数已满，频道录制已加入等待队列"}
     else:
         return {"status": "failed", "channel_id": channel_id, "message": "频道录制启动失败，可能已在录制"}
 
@@ -666,33 +884,89 @@ async def stop_channel_record(channel_id: str):
     """停止频道录制"""
     success = manager.stop_channel(channel_id)
     if success:
-        return {"status": "stopped", "channel_id": channel_id, "message": "频道录制已停止"}
+        return {"status": "stopping", "channel_id": channel_id, "message": "频道录制正在停止"}
     else:
         return {"status": "failed", "channel_id": channel_id, "message": "频道录制停止失败，可能未在录制"}
 
+#---------------------------------------------
+# 事件推送API端点
+#---------------------------------------------
+@app.get("/events")
+async def events_api(request: Request, channel_id: Optional[str] = None):
+    """以 Server-Sent Events 推送频道状态变化和 ytarchive 输出
+    
+    Args:
+        channel_id: 需要接收 ytarchive 输出的频道ID，状态事件总是推送所有频道
+    """
+    queue = event_bus.subscribe(channel_id)
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # 保持连接
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                event_type, data = event
+                yield f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        finally:
+            event_bus.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 #---------------------------------------------
 # 日志获取API端点
 #---------------------------------------------
 @app.get("/channels/{channel_id}/logs")
-async def get_channel_logs_api(channel_id: str, log_type: str = "ytarchive"):
+async def get_channel_logs_api(channel_id: str, log_type: str = "ytarchive", after: Optional[int] = None,
+                               offset: Optional[int] = None):
     """获取指定频道的日志
     
     Args:
         channel_id: 频道ID
         log_type: 日志类型，可选值：ytarchive, main
+        after: 仅对 ytarchive 日志有效，返回内存缓冲区中序号大于该值的行，-1 表示全部
+        offset: 日志文件的字节偏移，指定时只返回该位置之后新写入的行
     """
     channel = next((c for c in config["channels"] if c.id == channel_id), None)
     if not channel:
         return LogResponseModel(logs=["频道不存在"])
 
-    logs = get_channel_logs(channel.name, log_type)
-    return LogResponseModel(logs=logs)
+    if after is not None and log_type == "ytarchive":
+        result = manager.get_channel_logs_since(channel_id, after)
+        if result is not None:
+            logs, last_seq = result
+            return LogResponseModel(logs=logs, last_seq=last_seq)
+
+    try:
+        logs, new_offset = read_log_tail(get_channel_log_file(channel.name, log_type), offset=offset)
+    except Exception as e:
+        return LogResponseModel(logs=[f"读取日志文件出错: {str(e)}"])
+    return LogResponseModel(logs=logs, offset=new_offset)
 
 @app.get("/logs")
-async def get_main_logs_api():
-    """获取主程序的日志"""
-    logs = get_main_logs()
-    return LogResponseModel(logs=logs)
+async def get_main_logs_api(offset: Optional[int] = None):
+    """获取主程序的日志
+    
+    Args:
+        offset: 日志文件的字节偏移，指定时只返回该位置之后新写入的行
+    """
+    try:
+        logs, new_offset = read_log_tail(get_main_log_file(), offset=offset)
+    except Exception as e:
+        return LogResponseModel(logs=[f"读取日志文件出错: {str(e)}"])
+    return LogResponseModel(logs=logs, offset=new_offset)
 
 #---------------------------------------------
 # 配置和代理API端点
@@ -711,6 +985,8 @@ async def get_disabled_proxies():
         
         formatted_proxies.append({
             "proxy_url": proxy_url,
+            "state": proxy_manager.get_circuit_state(proxy_url),
+            "failures": proxy_manager.get_proxy_failures(proxy_url),
             "disabled_at": disabled_time,
             "expires_at": expiry_time,
             "remaining_time": remaining_time
@@ -718,6 +994,37 @@ async def get_disabled_proxies():
     
     return {"disabled_proxies": formatted_proxies}
 
+@app.get("/config/proxy/stats")
+async def get_proxy_stats():
+    """获取代理延迟和成功率统计"""
+    stats = proxy_manager.get_proxy_stats()
+    formatted_stats = []
+    
+    for proxy_url, proxy_stats in stats.items():
+        formatted_stats.append({
+            "proxy_url": proxy_url,
+            "latency": round(proxy_stats["latency"], 3),
+            "success_rate": round(proxy_stats["success_rate"], 3),
+            "samples": proxy_stats["samples"],
+            "last_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(proxy_stats["last_time"]))
+        })
+    
+    rate_limits = []
+    for proxy_url, limit in rate_limiter.get_status().items():
+        rate_limits.append({
+            "proxy_url": proxy_url or "直连",
+            "rate": round(limit["rate"], 3),
+            "paused_seconds": round(limit["paused"], 1),
+            "throttle_count": limit["throttle_count"],
+            "last_throttle_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(limit["last_throttle_time"])) if limit["last_throttle_time"] else None
+        })
+    
+    return {
+        "proxy_stats": formatted_stats,
+        "active_recordings": proxy_manager.get_active_recordings(),
+        "rate_limits": rate_limits
+    }
+
 @app.post("/config/proxy/clear_disabled")
 async def clear_disabled_proxies():
     """清除所有被禁用的代理"""
@@ -734,11 +1041,12 @@ async def test_proxy_connection(proxy_url: str):
     
     if result["status"] == "success":
         main_logger.info(f"代理 {proxy_url} 测试成功 - {result['message']}")
-        if proxy_url in proxy_manager.disabled_proxies:
-            proxy_manager.disabled_proxies.pop(proxy_url)
+        if proxy_manager.enable_proxy(proxy_url):
             main_logger.info(f"代理 {proxy_url} 已从禁用列表中移除")
+    elif result["status"] == "throttled":
+        main_logger.warning(f"代理 {proxy_url} 测试时被限流 - {result['message']}")
     else:
-        proxy_manager.mark_proxy_failed(proxy_url, f"手动测试失败: {result.get('message')}")
+        proxy_manager.mark_proxy_failed(proxy_url, f"手动测试失败: {result.get('message')}", force=True)
         main_logger.warning(f"代理 {proxy_url} 测试失败，已标记为禁用")
     
     return result
@@ -746,8 +1054,7 @@ async def test_proxy_connection(proxy_url: str):
 @app.post("/config/proxy/enable/{proxy_url:path}")
 async def enable_proxy(proxy_url: str):
     """手动启用特定代理"""
-    if proxy_url in proxy_manager.disabled_proxies:
-        proxy_manager.disabled_proxies.pop(proxy_url)
+    if proxy_manager.enable_proxy(proxy_url):
         main_logger.info(f"手动启用代理 {proxy_url}")
         return {"status": "success", "message": f"代理 {proxy_url} 已启用"}
     else:
@@ -756,8 +1063,8 @@ async def enable_proxy(proxy_url: str):
 @app.post("/config/proxy/disable/{proxy_url:path}")
 async def disable_proxy(proxy_url: str):
     """手动禁用特定代理"""
-    if proxy_url not in proxy_manager.disabled_proxies:
-        proxy_manager.mark_proxy_failed(proxy_url, "手动禁用")
+    if proxy_manager.get_circuit_state(proxy_url) == "closed":
+        proxy_manager.mark_proxy_failed(proxy_url, "手动禁用", force=True)
         main_logger.info(f"手动禁用代理 {proxy_url}")
         return {"status": "success", "message": f"代理 {proxy_url} 已禁用"}
     else:
@@ -776,7 +1083,9 @@ async def get_cookie_status():
                 "path": file_path,
                 "filename": os.path.basename(file_path),
                 "size": f"{file_size / 1024:.2f} KB",
-                "modified": mod_time
+                "modified": mod_time,
+                "health": cookie_manager.get_cookie_health(file_path),
+                "sessions": cookie_manager.get_cookie_usage(file_path)
             })
         except Exception as e:
             main_logger.error(f"获取cookie文件信息时出错: {e}")
@@ -790,7 +1099,9 @@ async def get_cookie_status():
         "enabled": cookie_manager.enabled,
         "cookies_path": cookie_manager.cookies_path or os.path.join(os.getcwd(), 'cookies'),
         "cookie_count": len(cookie_manager.cookie_files),
-        "cookie_files": cookie_files
+        "watcher_running": cookie_manager.is_watcher_running(),
+        "cookie_files": cookie_files,
+        "sessions": cookie_manager.get_cookie_sessions()
     }
 
 @app.post("/config/cookie/reload")
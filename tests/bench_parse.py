@@ -0,0 +1,63 @@
+"""
+browse 响应解析基准 - 对比整体解码（原先的 response.json()）与 parse_streams 的耗时和内存峰值
+
+用法: python tests/bench_parse.py [--items N] [--rounds N]
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from core.youtubeCheck import parse_streams
+from test_parse_streams import FIXTURES, legacy_parse
+
+
+def scale_fixture(name, items):
+    """将样本中直播标签页的视频列表扩充到 items 个，模拟完整的 browse 响应"""
+    data = json.loads((FIXTURES / f'{name}.json').read_bytes())
+    for tab in data["contents"]["singleColumnBrowseResultsRenderer"]["tabs"]:
+        tab_renderer = tab.get("tabRenderer", {})
+        contents = tab_renderer.get("content", {}).get("richGridRenderer", {}).get("contents")
+        if tab_renderer.get("title") == "直播" and contents:
+            videos, tail = contents[:-1], contents[-1:]
+            extra = [videos[-1]] * max(items - len(videos), 0)
+            contents[:] = videos + extra + tail
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def measure(func, content, rounds):
+    """返回 (平均耗时毫秒, 内存峰值KB)"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(content)
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+
+    tracemalloc.start()
+    func(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="browse 响应解析基准")
+    parser.add_argument('--items', type=int, default=30, help="直播标签页中的视频数量")
+    parser.add_argument('--rounds', type=int, default=200, help="计时轮数")
+    args = parser.parse_args()
+
+    for name in ['browse_live', 'browse_upcoming', 'browse_none', 'browse_content_first', 'browse_other_tabs']:
+        content = scale_fixture(name, args.items)
+        print(f"{name} ({len(content) / 1024:.1f} KB)")
+        for label, func in [("json.loads", legacy_parse), ("parse_streams", parse_streams)]:
+            elapsed, peak = measure(func, content, args.rounds)
+            print(f"  {label:<14} {elapsed:8.3f} ms  峰值 {peak:8.1f} KB")
+
+
+if __name__ == '__main__':
+    main()
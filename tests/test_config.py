@@ -0,0 +1,47 @@
+"""
+配置加载测试 - 确认仓库自带的 config.yaml 中的配置项能被读取到对应的管理器
+"""
+
+import shutil
+import sys
+from pathlib import Path
+
+from ruamel.yaml import YAML
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_shipped_config():
+    with open(ROOT / 'config.yaml', 'r', encoding='utf-8') as f:
+        return YAML().load(f)
+
+
+def test_shipped_cookie_config_is_loaded(tmp_path, monkeypatch):
+    # main 在导入时加载当前目录下的 config.yaml 并创建日志目录，在临时目录中导入
+    shutil.copy(ROOT / 'config.yaml', tmp_path / 'config.yaml')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(ROOT))
+    sys.modules.pop('main', None)
+    import main
+    from core.cookie import cookie_manager
+
+    shipped = load_shipped_config()['ytarchive']['cookie']
+    assert main.config["cookie_config"] == shipped
+
+    expected = {
+        'refreshConcurrency': cookie_manager.refresh_concurrency,
+        'refreshTimeout': cookie_manager.refresh_timeout,
+        'maxFailures': cookie_manager.max_failures,
+        'validateRequest': cookie_manager.validate_request,
+        'validateInterval': cookie_manager.validate_interval,
+        'rotateBefore': cookie_manager.rotate_before,
+        'ytdlpFallback': cookie_manager.ytdlp_fallback,
+        'watch': cookie_manager.watch_enabled,
+        'watchInterval': cookie_manager.watch_interval,
+        'selection': cookie_manager.selection,
+        'maxSessions': cookie_manager.max_sessions,
+    }
+    for key, value in expected.items():
+        assert key in shipped, key
+        assert shipped[key] == value, key
+    assert cookie_manager.enabled == shipped['enable']
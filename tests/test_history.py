@@ -0,0 +1,65 @@
+"""
+直播历史测试 - 开播记录和检查间隔
+"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import core.ytarchive as ytarchive
+from core.history import LiveHistory, WEEK_SECONDS
+from core.ytarchive import ChannelConfig, ChannelProcess
+
+CHANNEL_ID = "UCxxxxxxxxxxxxxxxxxxxxxx"
+# 2026-01-05 00:00 UTC，星期一
+MONDAY = 1767571200
+PROGRESS_LINE = "Video Fragments: 1; Audio Fragments: 1; Total Downloaded: 1.00MiB"
+
+
+def make_history(tmp_path, **config):
+    return LiveHistory({"historyFile": str(tmp_path / "live_history.json"), **config})
+
+
+def test_sparse_history_does_not_widen_interval(tmp_path):
+    history = make_history(tmp_path, minSamples=3)
+    history.record_live(CHANNEL_ID, "video1", MONDAY)
+    # 周三不是开播时段，样本不足时不超过默认间隔
+    wednesday = MONDAY + 2 * 86400
+    assert history.suggest_interval(CHANNEL_ID, 300, now=wednesday) == 300
+    # 开播时段仍然缩短间隔
+    assert history.suggest_interval(CHANNEL_ID, 300, now=MONDAY + 60) < 300
+
+    history.record_live(CHANNEL_ID, "video2", MONDAY + WEEK_SECONDS)
+    history.record_live(CHANNEL_ID, "video3", MONDAY + 2 * WEEK_SECONDS)
+    assert history.suggest_interval(CHANNEL_ID, 300, now=wednesday + 2 * WEEK_SECONDS) == 900
+
+
+def test_records_without_video_id_are_merged_into_one_stream(tmp_path):
+    history = make_history(tmp_path)
+    assert history.record_live(CHANNEL_ID, "video1", MONDAY)
+    # 同一场直播中 ytarchive 开始录制
+    assert not history.record_live(CHANNEL_ID, None, MONDAY + 60)
+    assert history.record_live(CHANNEL_ID, None, MONDAY + 86400)
+    assert not history.record_live(CHANNEL_ID, None, MONDAY + 86400 + 600)
+    assert history.get_channel_summary(CHANNEL_ID)["stream_count"] == 2
+
+
+def test_recording_transition_records_history(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    history = make_history(tmp_path)
+    monkeypatch.setattr(ytarchive, "live_history", history)
+    process = ChannelProcess(ChannelConfig(CHANNEL_ID, "test"), "ytarchive")
+    process.setup_logging()
+
+    process.handle_line("Retries: 1 (Last retry: 2026-01-05 00:00:00), Total time waited: 60 seconds")
+    assert history.get_channel_summary(CHANNEL_ID)["stream_count"] == 0
+    for _ in range(3):
+        process.handle_line(PROGRESS_LINE)
+    assert history.get_channel_summary(CHANNEL_ID)["stream_count"] == 1
+
+    # 重启后继续录制同一场直播不重复记录
+    process.status.reset()
+    process.handle_line(PROGRESS_LINE)
+    assert history.get_channel_summary(CHANNEL_ID)["stream_count"] == 1
@@ -0,0 +1,96 @@
+"""
+browse 响应解析测试 - 使用 tests/fixtures 下按 MWEB 客户端 browse 响应结构整理的样本
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+sys.path.insert(0, str(ROOT))
+
+from core.youtubeCheck import parse_streams
+
+
+def load_fixture(name):
+    return (FIXTURES / f'{name}.json').read_bytes()
+
+
+def legacy_parse(content):
+    """原先的解析方式：解码整个响应后按路径遍历直播标签页"""
+    result = json.loads(content)
+    live_streams = []
+    upcoming = []
+    tabs = result.get("contents", {}).get("singleColumnBrowseResultsRenderer", {}).get("tabs", [])
+    for tab in tabs:
+        tab_renderer = tab.get("tabRenderer", {})
+        if tab_renderer.get("title") != "直播":
+            continue
+        for item in tab_renderer.get("content", {}).get("richGridRenderer", {}).get("contents", []):
+            video = item.get("richItemRenderer", {}).get("content", {}).get("videoWithContextRenderer", {})
+            styles = {
+                overlay.get("thumbnailOverlayTimeStatusRenderer", {}).get("style")
+                for overlay in video.get("thumbnailOverlays", [])
+            }
+            if "LIVE" in styles:
+                live_streams.append(video.get("videoId"))
+            elif "UPCOMING" in styles or "upcomingEventData" in video:
+                upcoming.append(video.get("videoId"))
+    return live_streams, upcoming
+
+
+def test_live():
+    live_streams, upcoming = parse_streams(load_fixture('browse_live'))
+    assert live_streams == [{
+        "title": "正在直播的标题",
+        "video_id": "live0000001",
+        "thumbnail": "https://i.ytimg.com/vi/live0000001/hqdefault.jpg",
+        "viewers": "1,234",
+    }]
+    assert upcoming == []
+
+
+def test_upcoming():
+    live_streams, upcoming = parse_streams(load_fixture('browse_upcoming'))
+    assert live_streams == []
+    assert upcoming == [{
+        "title": "预约的直播",
+        "video_id": "upco0000001",
+        "thumbnail": "https://i.ytimg.com/vi/upco0000001/hqdefault.jpg",
+        "scheduled_start": 1767225600,
+    }]
+
+
+def test_none():
+    assert parse_streams(load_fixture('browse_none')) == ([], [])
+
+
+def test_content_before_title():
+    # tabRenderer 中 content 出现在 title 之前时也要能找到直播标签页内的视频
+    live_streams, upcoming = parse_streams(load_fixture('browse_content_first'))
+    assert [info["video_id"] for info in live_streams] == ["live0000001"]
+    assert [info["video_id"] for info in upcoming] == ["upco0000001"]
+
+
+def test_live_badges_outside_live_tab():
+    # 首页和其他标签页中的直播不属于直播标签页
+    live_streams, upcoming = parse_streams(load_fixture('browse_other_tabs'))
+    assert live_streams == []
+    assert [info["video_id"] for info in upcoming] == ["upco0000001"]
+
+
+def test_no_live_tab():
+    content = json.dumps({"contents": {"singleColumnBrowseResultsRenderer": {"tabs": [
+        {"tabRenderer": {"title": "首页", "selected": True}}]}}}).encode()
+    assert parse_streams(content) == ([], [])
+
+
+@pytest.mark.parametrize('name', ['browse_live', 'browse_upcoming', 'browse_none', 'browse_content_first', 'browse_other_tabs'])
+def test_matches_legacy_parse(name):
+    content = load_fixture(name)
+    live_streams, upcoming = parse_streams(content)
+    assert ([info["video_id"] for info in live_streams],
+            [info["video_id"] for info in upcoming]) == legacy_parse(content)
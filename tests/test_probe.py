@@ -0,0 +1,73 @@
+"""
+直播预检测试 - 使用 httpx.MockTransport 模拟 /live 页面的响应
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import core.probe as probe
+from core.probe import probe_live_page
+
+CHANNEL_ID = "UCxxxxxxxxxxxxxxxxxxxxxx"
+
+
+def run_probe(monkeypatch, handler):
+    """返回 (预检结果, 发出的请求, 请求后客户端中的cookie)"""
+    requests = []
+
+    def record(request):
+        requests.append(request)
+        return handler(request)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(record)) as client:
+            monkeypatch.setattr(probe.client_pool, "get_client", lambda proxy_url=None: client)
+            result = await probe_live_page(CHANNEL_ID)
+            return result, requests, dict(client.cookies)
+
+    return asyncio.run(run())
+
+
+def redirect_to(location):
+    return lambda request: httpx.Response(302, headers={"Location": location})
+
+
+def page_with_canonical(href):
+    html = f'<html><head><link rel="canonical" href="{href}"></head></html>'
+    return lambda request: httpx.Response(200, content=html.encode())
+
+
+def test_redirect_to_watch_is_live(monkeypatch):
+    result, _, _ = run_probe(monkeypatch, redirect_to("https://www.youtube.com/watch?v=live0000001"))
+    assert result is True
+
+
+@pytest.mark.parametrize('location', [
+    "https://consent.youtube.com/m?continue=https%3A%2F%2Fwww.youtube.com%2Fchannel%2FUCxxxxxxxxxxxxxxxxxxxxxx%2Flive",
+    "https://accounts.google.com/ServiceLogin?continue=https%3A%2F%2Fwww.youtube.com%2F",
+    "https://www.youtube.com/channel/UCxxxxxxxxxxxxxxxxxxxxxx",
+])
+def test_other_redirects_are_inconclusive(monkeypatch, location):
+    result, _, _ = run_probe(monkeypatch, redirect_to(location))
+    assert result is None
+
+
+def test_canonical_link(monkeypatch):
+    result, _, _ = run_probe(monkeypatch, page_with_canonical("https://www.youtube.com/watch?v=live0000001"))
+    assert result is True
+    result, _, _ = run_probe(monkeypatch, page_with_canonical(f"https://www.youtube.com/channel/{CHANNEL_ID}"))
+    assert result is False
+
+
+def test_consent_cookie_is_sent_as_header(monkeypatch):
+    _, requests, cookies = run_probe(monkeypatch, redirect_to("https://www.youtube.com/watch?v=live0000001"))
+    assert requests[0].headers["Cookie"] == "CONSENT=YES+1"
+    # 不写入共用客户端的 cookie
+    assert cookies == {}
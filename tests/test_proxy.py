@@ -0,0 +1,95 @@
+"""
+代理选择测试 - 换代理重启时不应再次选中刚失败的代理
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import core.ytarchive as ytarchive
+from core.proxy import ProxyManager
+from core.ytarchive import ChannelConfig, ChannelProcess
+
+PROXIES = ["http://a:1", "http://b:2", "http://c:3"]
+CHANNEL_ID = "UCxxxxxxxxxxxxxxxxxxxxxx"
+
+
+def make_manager(strategy):
+    manager = ProxyManager()
+    manager.set_config({
+        "yta": "pool",
+        "strategy": strategy,
+        "groups": {"pool": [{f"p{i}": url} for i, url in enumerate(PROXIES)]},
+    })
+    return manager
+
+
+@pytest.mark.parametrize('strategy', ['sticky', 'leastconn', 'roundrobin', 'weighted', 'p2c'])
+def test_exclude_skips_failed_proxy(strategy):
+    manager = make_manager(strategy)
+    for _ in range(20):
+        assert manager.get_yta_proxy(channel_key=CHANNEL_ID, exclude="http://a:1") != "http://a:1"
+
+
+def test_exclude_falls_back_when_no_other_proxy():
+    manager = make_manager("sticky")
+    for url in PROXIES[1:]:
+        manager.mark_proxy_failed(url, force=True)
+    assert manager.get_yta_proxy(channel_key=CHANNEL_ID, exclude="http://a:1") == "http://a:1"
+
+
+def test_build_command_avoids_excluded_proxy(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = make_manager("sticky")
+    monkeypatch.setattr(ytarchive, "proxy_manager", manager)
+    process = ChannelProcess(ChannelConfig(CHANNEL_ID, "test"), "ytarchive")
+
+    bound = manager.get_yta_proxy(channel_key=CHANNEL_ID)
+    process.excluded_proxy = bound
+    cmd = process.build_command()
+    assert cmd[cmd.index('--proxy') + 1] != bound
+    # 只在本次启动时避开
+    assert process.excluded_proxy is None
+    process.release_proxy()
+
+
+def test_sticky_moves_off_proxy_after_one_failure():
+    manager = make_manager("sticky")
+    bound = manager.get_yta_proxy(channel_key=CHANNEL_ID)
+    manager.acquire_recording(bound)
+    manager.mark_proxy_failed(bound, "ytarchive进程报错")
+    manager.release_recording(bound)
+    assert manager.get_circuit_state(bound) == "closed"
+    assert manager.get_yta_proxy(channel_key=CHANNEL_ID) != bound
+
+    # 代理恢复后频道回到原来绑定的代理
+    manager.mark_proxy_success(bound)
+    assert manager.get_yta_proxy(channel_key=CHANNEL_ID) == bound
+
+
+def test_sticky_keeps_failed_proxy_when_it_is_the_only_one():
+    manager = make_manager("sticky")
+    bound = manager.get_yta_proxy(channel_key=CHANNEL_ID)
+    for url in PROXIES:
+        if url != bound:
+            manager.mark_proxy_failed(url, force=True)
+    manager.mark_proxy_failed(bound)
+    assert manager.get_yta_proxy(channel_key=CHANNEL_ID) == bound
+
+
+def test_leastconn_moves_off_proxy_after_one_failure():
+    manager = make_manager("leastconn")
+    for url in PROXIES[1:]:
+        manager.acquire_recording(url)
+    failed = manager.get_yta_proxy(channel_key=CHANNEL_ID)
+    assert failed == "http://a:1"
+    manager.acquire_recording(failed)
+    manager.mark_proxy_failed(failed, "ytarchive进程报错")
+    manager.release_recording(failed)
+    # 失败代理的录制数回到0，仍不应再被选中
+    assert manager.get_active_recordings().get(failed) is None
+    assert manager.get_yta_proxy(channel_key=CHANNEL_ID) != failed
@@ -0,0 +1,157 @@
+"""
+ytarchive 进程管理测试 - 使用模拟 ytarchive 输出的脚本代替真实的 ytarchive
+"""
+
+import asyncio
+import os
+import stat
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import core.ytarchive as ytarchive
+from core.proxy import ProxyManager
+from core.ytarchive import ChannelConfig, ChannelManager, ChannelProcess, classify_error
+
+CHANNEL_ID = "UCxxxxxxxxxxxxxxxxxxxxxx"
+
+FAKE_YTARCHIVE = f"""#!{sys.executable}
+import sys, time
+print("Video Title: test", flush=True)
+try:
+    while True:
+        print("Video Fragments: 1; Audio Fragments: 1; Total Downloaded: 1.00MiB", flush=True)
+        time.sleep(0.1)
+except KeyboardInterrupt:
+    time.sleep(0.2)
+    print("Muxing final file...", flush=True)
+"""
+
+
+@pytest.fixture
+def fake_ytarchive(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "ytarchive"
+    path.write_text(FAKE_YTARCHIVE)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+@pytest.fixture
+def proxies(monkeypatch):
+    manager = ProxyManager()
+    manager.set_config({"yta": "pool", "strategy": "leastconn",
+                        "groups": {"pool": [{"a": "http://a:1"}, {"b": "http://b:2"}]}})
+    monkeypatch.setattr(ytarchive, "proxy_manager", manager)
+    return manager
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="模拟脚本依赖 shebang")
+def test_stop_async_waits_for_reader_before_restart(fake_ytarchive, proxies):
+    async def run():
+        process = ChannelProcess(ChannelConfig(CHANNEL_ID, "test"), fake_ytarchive)
+        release_proxy = process.release_proxy
+
+        def slow_release_proxy():
+            # 放大读取线程收尾与重启之间的竞争
+            if threading.current_thread() is process.thread:
+                time.sleep(0.5)
+            release_proxy()
+
+        process.release_proxy = slow_release_proxy
+        for _ in range(2):
+            process.start()
+            await asyncio.sleep(0.3)
+            assert proxies.get_active_recordings() == {process.recording_proxy: 1}
+            assert await process.stop_async(interrupt_timeout=5, terminate_timeout=5)
+            # 读取线程的收尾已完成，代理已释放
+            assert not process.thread.is_alive()
+            assert proxies.get_active_recordings() == {}
+
+        # 重启后的进程不会被上一次运行的收尾标记为已退出
+        process.start()
+        await asyncio.sleep(0.3)
+        assert process.running
+        assert sum(proxies.get_active_recordings().values()) == 1
+        await process.stop_async(interrupt_timeout=5, terminate_timeout=5)
+
+    asyncio.run(run())
+
+
+MEMBERS_LINE = "ERROR: This stream is members only. Join this channel to get access to members-only content"
+COOKIE_LINE = "ERROR: Sign in to confirm you're not a bot"
+
+
+@pytest.fixture
+def channel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = ChannelManager()
+    process = ChannelProcess(ChannelConfig(CHANNEL_ID, "test"), "ytarchive")
+    process.setup_logging()
+    process.running = True
+    process.cookie_file = str(tmp_path / "cookie.txt")
+    manager.channels[CHANNEL_ID] = process
+
+    calls = {"mark_cookie_failed": [], "restart": []}
+    monkeypatch.setattr(ytarchive.cookie_manager, "mark_cookie_failed",
+                        lambda cookie_file, *args: calls["mark_cookie_failed"].append(cookie_file))
+
+    async def restart(channel_id):
+        calls["restart"].append(channel_id)
+        return True
+
+    monkeypatch.setattr(manager, "restart_channel_with_new_cookie", restart)
+    return manager, process, calls
+
+
+def feed(manager, process, line):
+    """模拟一次新的运行中输出一行错误，返回各错误的处理结果"""
+    process.last_errors = {}
+    reported = []
+    process.on_error = lambda p, category, l: reported.append(category)
+    process.handle_line(line)
+
+    async def handle():
+        return [await manager.handle_channel_error(CHANNEL_ID, category, line) for category in reported]
+
+    return reported, asyncio.run(handle())
+
+
+def test_members_only_does_not_mark_cookie_failed(channel):
+    manager, process, calls = channel
+    assert classify_error(MEMBERS_LINE) == "members"
+    for _ in range(2):
+        reported, results = feed(manager, process, MEMBERS_LINE)
+        assert reported == ["members"]
+        assert results == [False]
+    assert calls == {"mark_cookie_failed": [], "restart": []}
+
+
+def test_cookie_restarts_are_limited(channel, monkeypatch):
+    manager, process, calls = channel
+    monkeypatch.setattr(ytarchive, "RESTART_LIMIT", 2)
+    monkeypatch.setattr(ytarchive, "RESTART_BACKOFF", 0.2)
+
+    start = time.monotonic()
+    assert feed(manager, process, COOKIE_LINE) == (["cookie"], [True])
+    assert time.monotonic() - start < 0.2
+    # 第二次重启前等待
+    assert feed(manager, process, COOKIE_LINE) == (["cookie"], [True])
+    assert time.monotonic() - start >= 0.2
+    # 达到上限后不再重启
+    assert feed(manager, process, COOKIE_LINE) == (["cookie"], [False])
+    assert calls["restart"] == [CHANNEL_ID, CHANNEL_ID]
+
+
+def test_restart_delay_backs_off_per_video():
+    manager = ChannelManager()
+    delays = [manager._restart_delay(CHANNEL_ID, "video1") for _ in range(ytarchive.RESTART_LIMIT + 1)]
+    assert delays == [0, ytarchive.RESTART_BACKOFF, ytarchive.RESTART_BACKOFF * 2, None]
+    # 其他视频单独计数
+    assert manager._restart_delay(CHANNEL_ID, "video2") == 0